@@ -33,7 +33,7 @@ from qtpy.QtWidgets import (
 
 from PartSegCore import state_store
 from PartSegCore.algorithm_describe_base import AlgorithmProperty
-from PartSegCore.analysis.batch_processing.batch_backend import CalculationManager
+from PartSegCore.analysis.batch_processing.batch_backend import CalculationManager, arrow_output_available
 from PartSegCore.analysis.calculation_plan import Calculation, MaskFile
 from PartSegCore.io_utils import SaveBase
 from PartSegCore.segmentation.algorithm_base import SegmentationLimitException
@@ -78,6 +78,26 @@ class SaveExcel(SaveBase):
         return []
 
 
+class SaveParquet(SaveExcel):
+    @classmethod
+    def get_short_name(cls):
+        return "parquet"
+
+    @classmethod
+    def get_name(cls) -> str:
+        return "Parquet (*.parquet)"
+
+
+class SaveFeather(SaveExcel):
+    @classmethod
+    def get_short_name(cls):
+        return "feather"
+
+    @classmethod
+    def get_name(cls) -> str:
+        return "Feather (*.feather)"
+
+
 class ProgressView(QWidget):
     """
     :type batch_manager: CalculationManager
@@ -305,11 +325,12 @@ class FileChoose(QWidget):
             self.files_widget.mask_list = []
 
     def chose_result_file(self):
-        dial = PSaveDialog(SaveExcel, system_widget=False, settings=self.settings, path=IO_SAVE_DIRECTORY)
+        save_register = [SaveExcel, SaveParquet, SaveFeather] if arrow_output_available() else SaveExcel
+        dial = PSaveDialog(save_register, system_widget=False, settings=self.settings, path=IO_SAVE_DIRECTORY)
         if dial.exec_():
             file_path = str(dial.selectedFiles()[0])
             if os.path.splitext(file_path)[1] == "":
-                file_path += ".xlsx"
+                file_path += dial.get_result().save_class.get_default_extension()
             self.result_file.setText(file_path)
             self.change_situation()
 
@@ -1,4 +1,5 @@
 import locale
+import multiprocessing
 import os
 from enum import Enum
 from typing import List, Tuple
@@ -14,6 +15,7 @@ from qtpy.QtWidgets import (
     QLabel,
     QMessageBox,
     QPushButton,
+    QSpinBox,
     QTableWidget,
     QTableWidgetItem,
     QVBoxLayout,
@@ -168,6 +170,13 @@ class MeasurementWidgetBase(QWidget):
         )
         self.units_choose = QEnumComboBox(enum_class=Units)
         self.units_choose.setCurrentEnum(self.settings.get("units_value", Units.nm))
+        self.workers_num = QSpinBox(self)
+        self.workers_num.setRange(1, multiprocessing.cpu_count())
+        self.workers_num.setValue(
+            min(self.settings.get_from_profile("measurement_workers", 1), multiprocessing.cpu_count())
+        )
+        self.workers_num.setToolTip("Number of threads used to calculate per component measurements")
+        self.workers_num.valueChanged.connect(self._workers_num_changed)
         self.settings.measurement_profiles_changed.connect(self.update_measurement_list)
         self.info_field = QTableWidget(self)
         self.info_field.setColumnCount(3)
@@ -191,6 +200,8 @@ class MeasurementWidgetBase(QWidget):
         self.butt_layout3 = QHBoxLayout()
         self.butt_layout3.addWidget(QLabel("Units:"))
         self.butt_layout3.addWidget(self.units_choose)
+        self.butt_layout3.addWidget(QLabel("Threads:"))
+        self.butt_layout3.addWidget(self.workers_num)
         self.butt_layout3.addWidget(QLabel("Measurement set:"))
         self.butt_layout3.addWidget(self.measurement_type, 2)
         v_butt_layout.addLayout(self.up_butt_layout)
@@ -205,6 +216,9 @@ class MeasurementWidgetBase(QWidget):
         self.previous_profile = None
         self.update_measurement_list()
 
+    def _workers_num_changed(self, value: int):
+        self.settings.set_in_profile("measurement_workers", value)
+
     def check_if_measurement_can_be_calculated(self, name):  # pragma: no cover
         raise NotImplementedError
 
@@ -385,6 +399,7 @@ class MeasurementWidget(MeasurementWidgetBase):
         dial = ExecuteFunctionDialog(
             compute_class.calculate,
             [self.settings.image, self.channels_chose.currentIndex(), self.settings.roi_info, units],
+            {"workers": self.workers_num.value()},
             text="Measurement calculation",
         )  # , exception_hook=exception_hook)
         dial.exec_()
@@ -0,0 +1,252 @@
+"""
+Command line interface for batch processing of calculation plans without GUI.
+
+Usage::
+
+    python -m PartSegCore.analysis.batch plans.json "data/**/*.tif" -o result.xlsx -j 4
+
+Plan is loaded from json file exported from PartSeg or from measurement excel file.
+Progress is printed on stdout and errors on stderr. Exit status is ``0`` if all files were calculated
+without errors, ``1`` if any error occurred and ``2`` for invalid arguments.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import unicodedata
+from typing import Iterable, List, Optional, Sequence, TextIO
+
+from PartSegCore.analysis.batch_processing.batch_backend import CalculationManager
+from PartSegCore.analysis.batch_processing.remote_backend import AUTHKEY_ENV, RemoteBatchManager
+from PartSegCore.analysis.calculation_plan import Calculation, CalculationPlan, MaskFile
+from PartSegCore.io_utils import LoadPlanExcel, LoadPlanJson
+from PartSegCore.universal_const import UNIT_SCALE, Units
+
+EXIT_SUCCESS = 0
+EXIT_CALCULATION_ERROR = 1
+
+
+def load_plan(plan_path: str, plan_name: Optional[str] = None) -> CalculationPlan:
+    """
+    Load calculation plan from file.
+
+    :param plan_path: path to json file with exported plans or to excel file with calculation result
+    :param plan_name: name of plan to be used. Could be omitted if file contains only one plan.
+    :raises ValueError: if plan cannot be selected
+    """
+    load_class = LoadPlanExcel if os.path.splitext(plan_path)[1].lower() in {".xlsx", ".xls"} else LoadPlanJson
+    plans, _ = load_class.load([plan_path])
+    plans = {name: plan for name, plan in plans.items() if isinstance(plan, CalculationPlan)}
+    if not plans:
+        raise ValueError(f"There is no calculation plan in {plan_path}")
+    if plan_name is None:
+        if len(plans) > 1:
+            raise ValueError(f"File {plan_path} contains multiple plans, select one of: {', '.join(plans)}")
+        return next(iter(plans.values()))
+    if plan_name not in plans:
+        raise ValueError(f"There is no plan {plan_name} in {plan_path}, available plans: {', '.join(plans)}")
+    return plans[plan_name]
+
+
+def collect_files(patterns: Iterable[str], file_list_path: Optional[str] = None) -> List[str]:
+    """
+    Collect files to be processed. Duplicates are removed, order of first occurrence is preserved.
+
+    :param patterns: paths or glob patterns (``**`` matches subdirectories)
+    :param file_list_path: path to text file with one path or pattern per line
+    """
+    patterns = list(patterns)
+    if file_list_path is not None:
+        with open(file_list_path, encoding="utf-8") as f_p:
+            patterns.extend(line.strip() for line in f_p if line.strip())
+    res = {}
+    for pattern in patterns:
+        matched = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for file_path in matched:
+            if os.path.isfile(file_path):
+                res.setdefault(os.path.abspath(file_path), None)
+    return list(res)
+
+
+def _units(val: str) -> Units:
+    try:
+        # enum member names are NFKC normalized, so micro sign is stored as greek mu
+        return Units[unicodedata.normalize("NFKC", val.replace("u", "µ"))]
+    except KeyError:
+        raise argparse.ArgumentTypeError(f"unknown unit {val}") from None
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m PartSegCore.analysis.batch",
+        description="Run PartSeg calculation plan over set of files without GUI",
+    )
+    parser.add_argument("plan", help="json file with exported calculation plans or excel file with results")
+    parser.add_argument("files", nargs="*", help="files or glob patterns to be processed")
+    parser.add_argument("--file-list", help="text file with one file path or glob pattern per line")
+    parser.add_argument("-o", "--output", required=True, help="path to measurement file (.xlsx, .csv, ...)")
+    parser.add_argument("--plan-name", help="name of plan to be used if file contains more than one plan")
+    parser.add_argument("--sheet-name", default="Sheet1", help="name of sheet in measurement file")
+    parser.add_argument(
+        "--voxel-size",
+        nargs=3,
+        type=float,
+        default=(1, 1, 1),
+        metavar=("Z", "Y", "X"),
+        help="voxel size used for files which do not contain this information in metadata",
+    )
+    parser.add_argument(
+        "--units", type=_units, default=Units.nm, help="unit of voxel size: mm, um (or µm), nm or pm, default nm"
+    )
+    parser.add_argument("--base-prefix", help="prefix for relative path of processed files, default common path")
+    parser.add_argument("--result-prefix", help="directory for files saved by plan, default directory of output")
+    parser.add_argument("--mask-mapping", action="append", default=[], help="mapping file for each file mask step")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument(
+        "--remote",
+        action="append",
+        default=[],
+        metavar="HOST:PORT",
+        help=f"address of worker daemon, could be repeated. Authentication key is read from {AUTHKEY_ENV}",
+    )
+    parser.add_argument("--memory-budget", type=float, help="memory budget for parallel calculation in MB")
+    parser.add_argument(
+        "--shared-memory-min-size",
+        type=int,
+        help="transfer results buffers bigger than this (in bytes) by shared memory",
+    )
+    parser.add_argument(
+        "--prefetch-depth",
+        type=int,
+        default=0,
+        help="number of files loaded by each worker in advance of currently processed one",
+    )
+    parser.add_argument("--prefetch-memory", type=float, help="memory limit of files loaded in advance in MB")
+    parser.add_argument("--journal", action="store_true", help="store journal to allow resume of calculation")
+    parser.add_argument("--resume", action="store_true", help="resume calculation from journal (implies --journal)")
+    parser.add_argument("--interval", type=float, default=0.1, help="interval (in seconds) of checking progress")
+    return parser
+
+
+def create_calculation(args: argparse.Namespace, plan: CalculationPlan, file_list: List[str]) -> Calculation:
+    """
+    Create :py:class:`.Calculation` from parsed arguments.
+
+    :raises ValueError: if mask mapping files do not match plan
+    """
+    mask_mappers = [x for x in plan.get_list_file_mask() if isinstance(x, MaskFile)]
+    if len(mask_mappers) != len(args.mask_mapping):
+        raise ValueError(f"Plan needs {len(mask_mappers)} mask mapping files, but {len(args.mask_mapping)} given")
+    for mapper, mapping_path in zip(mask_mappers, args.mask_mapping):
+        mapper.set_map_path(os.path.abspath(mapping_path))
+    output = os.path.abspath(args.output)
+    base_prefix = args.base_prefix
+    if base_prefix is None:
+        base_prefix = os.path.commonpath(file_list) if len(file_list) > 1 else os.path.dirname(file_list[0])
+        if os.path.isfile(base_prefix):
+            base_prefix = os.path.dirname(base_prefix)
+    scale = UNIT_SCALE[args.units.value]
+    return Calculation(
+        file_list,
+        base_prefix=os.path.abspath(base_prefix),
+        result_prefix=os.path.abspath(args.result_prefix or os.path.dirname(output)),
+        measurement_file_path=output,
+        sheet_name=args.sheet_name,
+        calculation_plan=plan,
+        voxel_size=tuple(x / scale for x in args.voxel_size),
+    )
+
+
+def run_calculation(
+    manager: CalculationManager,
+    interval: float = 0.1,
+    stdout: Optional[TextIO] = None,
+    stderr: Optional[TextIO] = None,
+) -> int:
+    """
+    Wait until all calculations added to manager are finished and results are written.
+
+    :return: number of errors
+    """
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    errors_num = 0
+    reported = -1
+    total = manager.calculation_size
+    while True:
+        res = manager.get_results()
+        for file_path, error in res.errors:
+            errors_num += 1
+            exception = error[0] if isinstance(error, tuple) else error
+            print(f"Error{f' in {file_path}' if file_path else ''}: {exception}", file=stderr, flush=True)
+        if res.global_counter != reported:
+            reported = res.global_counter
+            print(f"Processed {reported}/{total} files", file=stdout, flush=True)
+        if not manager.has_work:
+            break
+        time.sleep(interval)
+    manager.writer.finish()
+    for file_data in manager.writer.file_dict.values():
+        file_data.write_thread.join()
+    return errors_num
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = create_parser()
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("number of workers need to be positive")
+    try:
+        plan = load_plan(args.plan, args.plan_name)
+        file_list = collect_files(args.files, args.file_list)
+        if not file_list:
+            raise ValueError("There is no file to process")
+        calculation = create_calculation(args, plan, file_list)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+
+    executor = None
+    if args.remote:
+        try:
+            executor = RemoteBatchManager(args.remote)
+        except (ValueError, ConnectionError) as e:
+            parser.error(str(e))
+    memory_budget = int(args.memory_budget * 2**20) if args.memory_budget is not None else None
+    prefetch_memory = int(args.prefetch_memory * 2**20) if args.prefetch_memory is not None else None
+    manager = CalculationManager(
+        shared_memory_min_size=args.shared_memory_min_size,
+        memory_budget=memory_budget,
+        journal=args.journal or args.resume,
+        executor=executor,
+        prefetch_depth=args.prefetch_depth,
+        prefetch_memory=prefetch_memory,
+    )
+    manager.set_number_of_workers(args.workers)
+    try:
+        manager.add_calculation(calculation, resume=args.resume)
+    except ValueError as e:
+        manager.kill_jobs()
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_CALCULATION_ERROR
+    print(f"Calculate plan {plan.name} for {len(file_list)} files", flush=True)
+    try:
+        errors_num = run_calculation(manager, args.interval)
+    except KeyboardInterrupt:
+        manager.kill_jobs()
+        print("Calculation interrupted", file=sys.stderr)
+        return EXIT_CALCULATION_ERROR
+    finally:
+        for journal in manager.journal_dict.values():
+            journal.close()
+        if executor is not None:
+            executor.close()
+    if errors_num:
+        print(f"Calculation finished with {errors_num} errors", file=sys.stderr)
+        return EXIT_CALCULATION_ERROR
+    print(f"Results saved in {calculation.measurement_file_path}")
+    return EXIT_SUCCESS
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,18 +20,21 @@ Calculation hierarchy:
    }
 
 """
+import importlib.util
 import json
 import logging
 import os
+import pickle  # nosec
+import tempfile
 import threading
 import traceback
 import uuid
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 from enum import Enum
 from os import path
 from queue import Queue
 from traceback import StackSummary
-from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type, Union
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple, Type, Union
 
 import numpy as np
 import pandas as pd
@@ -72,8 +75,13 @@ from ...json_hooks import PartSegEncoder
 from ...project_info import AdditionalLayerDescription, HistoryElement
 from ...roi_info import ROIInfo
 from ...segmentation import RestartableAlgorithm
+from ...segmentation.time_lapse import segment_time_lapse
 from ...utils import iterate_names
-from .parallel_backend import BatchManager, SubprocessOrder
+from .batch_journal import BatchJournal, journal_path
+from .memory_scheduler import estimate_file_memory
+from .parallel_backend import BatchExecutor, BatchManager, SubprocessOrder
+from .plan_compiler import CompiledPlan, StepCache, compiled_plan_for
+from .prefetch import Prefetcher
 
 
 class ResponseData(NamedTuple):
@@ -108,7 +116,7 @@ def do_calculation(file_info: Tuple[int, str], calculation: BaseCalculation) ->
     :param calculation: calculation description
     """
     SimpleITK.ProcessObject_SetGlobalDefaultNumberOfThreads(1)
-    calc = CalculationProcess()
+    calc = CalculationProcess(prefetcher=_prefetcher)
     index, file_path = file_info
     try:
         return index, calc.do_calculation(FileCalculation(file_path, calculation))
@@ -116,14 +124,102 @@ def do_calculation(file_info: Tuple[int, str], calculation: BaseCalculation) ->
         return index, [prepare_error_data(e)]
 
 
+#: read-ahead of files used by :py:func:`do_calculation` in current process
+_prefetcher = Prefetcher()
+
+
+def prefetch_calculation(file_info: Tuple[int, str], calculation: BaseCalculation, memory_limit: Optional[int] = None):
+    """
+    Start loading of file (and masks from :py:class:`.MaskMapper`) in background,
+    so it is ready when :py:func:`do_calculation` is called for it.
+    Used by :py:class:`.BatchWorker` for tasks taken in advance.
+
+    :param file_info: index and path to file which will be processed
+    :param calculation: calculation description
+    :param memory_limit: limit of memory (in bytes) of prefetched and not used data
+    """
+    file_path = file_info[1]
+    operation = calculation.calculation_plan.execution_tree.operation
+    if not _prefetcher.prefetch(
+        ("file", file_path, operation),
+        estimate_file_memory(file_path),
+        memory_limit,
+        load_projects,
+        file_path,
+        operation,
+        calculation.voxel_size,
+    ):
+        return
+    for mask_mapper in calculation.calculation_plan.get_list_file_mask():
+        mask_path = mask_mapper.get_mask_path(file_path)
+        if mask_path and os.path.exists(mask_path):
+            _prefetcher.prefetch(
+                ("mask", mask_path), estimate_file_memory(mask_path), memory_limit, read_mask, mask_path
+            )
+
+
+do_calculation.prefetch = prefetch_calculation
+
+
+def load_projects(file_path: str, root_type: RootType, voxel_size) -> List[ProjectTuple]:
+    """
+    Load file which should be processed by calculation plan
+
+    :param file_path: path to file
+    :param root_type: type of root of calculation plan
+    :param voxel_size: default voxel size used if file does not contain it
+    """
+    ext = path.splitext(file_path)[1]
+    metadata = {"default_spacing": voxel_size}
+    if root_type == RootType.Image:
+        for load_class in load_dict.values():
+            if load_class.partial() or load_class.number_of_files() != 1:
+                continue
+            if ext in load_class.get_extensions():
+                projects = load_class.load([file_path], metadata=metadata)
+                break
+        else:  # pragma: no cover
+            raise ValueError("File type not supported")
+    elif root_type == RootType.Project:
+        projects = LoadProject.load([file_path], metadata=metadata)
+    else:  # root_type == RootType.Mask_project
+        try:
+            projects = LoadProject.load([file_path], metadata=metadata)
+        except (KeyError, WrongFileTypeException):
+            # TODO identify exceptions
+            projects = LoadMaskSegmentation.load([file_path], metadata=metadata)
+    if isinstance(projects, ProjectTuple):
+        projects = [projects]
+    return projects
+
+
+def read_mask(mask_path: str) -> np.ndarray:
+    """Read mask from tiff file as binary array"""
+    with tifffile.TiffFile(mask_path) as mask_file:
+        mask = mask_file.asarray()
+        mask = TiffImageReader.update_array_shape(mask, mask_file.series[0].axes)
+        if "C" in TiffImageReader.image_class.axis_order:
+            pos: List[Union[slice, int]] = [slice(None) for _ in range(mask.ndim)]
+            pos[TiffImageReader.image_class.axis_order.index("C")] = 0
+            mask = mask[tuple(pos)]
+    return (mask > 0).astype(np.uint8)
+
+
 class CalculationProcess:
     """
     Main class to calculate PartSeg calculation plan.
     To support other operations overwrite :py:meth:`recursive_calculation`
     call super function to support already defined operations.
+
+    ROI and masks calculated in more than one branch of plan (see :py:class:`.CompiledPlan`)
+    are calculated once per file and reused. Plan is compiled once per calculation
+    (see :py:func:`.compiled_plan_for`).
+
+    :param prefetcher: if provided then data loaded in advance (see :py:func:`prefetch_calculation`) are used
     """
 
-    def __init__(self):
+    def __init__(self, prefetcher: Optional[Prefetcher] = None):
+        self.prefetcher = prefetcher
         self.reused_mask = set()
         self.mask_dict = {}
         self.calculation = None
@@ -135,6 +231,8 @@ class CalculationProcess:
         self.history: List[HistoryElement] = []
         self.algorithm_parameters: dict = {}
         self.results: CalculationResultList = []
+        self.compiled_plan: Optional[CompiledPlan] = None
+        self.step_cache: Optional[StepCache] = None
 
     def do_calculation(self, calculation: FileCalculation) -> CalculationResultList:
         """
@@ -148,29 +246,11 @@ class CalculationProcess:
         self.mask_dict = {}
         self.measurement = []
         self.results = []
+        self.compiled_plan = compiled_plan_for(calculation.calculation)
         operation = calculation.calculation_plan.execution_tree.operation
-        ext = path.splitext(calculation.file_path)[1]
-        metadata = {"default_spacing": calculation.voxel_size}
-        if operation == RootType.Image:
-            for load_class in load_dict.values():
-                if load_class.partial() or load_class.number_of_files() != 1:
-                    continue
-                if ext in load_class.get_extensions():
-                    projects = load_class.load([calculation.file_path], metadata=metadata)
-                    break
-            else:  # pragma: no cover
-                raise ValueError("File type not supported")
-        elif operation == RootType.Project:
-            projects = LoadProject.load([calculation.file_path], metadata=metadata)
-        else:  # operation == RootType.Mask_project
-            try:
-                projects = LoadProject.load([calculation.file_path], metadata=metadata)
-            except (KeyError, WrongFileTypeException):
-                # TODO identify exceptions
-                projects = LoadMaskSegmentation.load([calculation.file_path], metadata=metadata)
-
-        if isinstance(projects, ProjectTuple):
-            projects = [projects]
+        projects = self._take_prefetched(("file", calculation.file_path, operation))
+        if projects is None:
+            projects = load_projects(calculation.file_path, operation, calculation.voxel_size)
         for project in projects:
             project: ProjectTuple
             self.image = project.image
@@ -184,6 +264,7 @@ class CalculationProcess:
                 self.history = project.history
                 self.algorithm_parameters = project.algorithm_parameters
 
+            self.step_cache = StepCache(self.compiled_plan)
             self.iterate_over(calculation.calculation_plan.execution_tree)
             for el in self.measurement:
                 el.set_filename(path.relpath(project.image.file_path, calculation.base_prefix))
@@ -191,8 +272,24 @@ class CalculationProcess:
                 ResponseData(path.relpath(project.image.file_path, calculation.base_prefix), self.measurement)
             )
             self.measurement = []
+        self.step_cache = None
         return self.results
 
+    def _take_prefetched(self, key) -> Optional[Any]:
+        if self.prefetcher is None:
+            return None
+        future = self.prefetcher.take(key)
+        return None if future is None else future.result()
+
+    def _get_cached(self, key: Optional[str]):
+        if key is None or self.step_cache is None:
+            return None
+        return self.step_cache.get(key)
+
+    def _put_cached(self, key: Optional[str], value):
+        if key is not None and self.step_cache is not None:
+            self.step_cache.put(key, value)
+
     def iterate_over(self, node: Union[CalculationTree, List[CalculationTree]]):
         """
         Execute calculation on node children or list oof nodes
@@ -206,48 +303,69 @@ class CalculationProcess:
         for el in node:
             self.recursive_calculation(el)
 
-    def step_load_mask(self, operation: MaskMapper, children: List[CalculationTree]):
+    def step_load_mask(self, operation: MaskMapper, children: List[CalculationTree], key: Optional[str] = None):
         """
         Load mask using mask mapper (mask can be defined with suffix, substitution, or file with mapping saved,
         then iterate over ``children`` nodes.
 
         :param MaskMapper operation: operation to perform
         :param List[CalculationTree] children: list of nodes to iterate over with applied mask
+        :param key: key of step if its result could be reused
         """
+        mask = self._get_cached(key)
+        if mask is None:
+            mask = self._load_mask(operation)
+            self._put_cached(key, mask)
+        old_mask = self.mask
+        self.mask = mask
+        self.iterate_over(children)
+        self.mask = old_mask
+
+    def _load_mask(self, operation: MaskMapper) -> np.ndarray:
         mask_path = operation.get_mask_path(self.calculation.file_path)
         if mask_path == "":  # pragma: no cover
             raise ValueError("Empty path to mask.")
         if not os.path.exists(mask_path):
             raise OSError(f"Mask file {mask_path} does not exists")
-        with tifffile.TiffFile(mask_path) as mask_file:
-            mask = mask_file.asarray()
-            mask = TiffImageReader.update_array_shape(mask, mask_file.series[0].axes)
-            if "C" in TiffImageReader.image_class.axis_order:
-                pos: List[Union[slice, int]] = [slice(None) for _ in range(mask.ndim)]
-                pos[TiffImageReader.image_class.axis_order.index("C")] = 0
-                mask = mask[tuple(pos)]
-
-        mask = (mask > 0).astype(np.uint8)
+        mask = self._take_prefetched(("mask", mask_path))
+        if mask is None:
+            mask = read_mask(mask_path)
         try:
             mask = self.image.fit_array_to_image(mask)[0]
             # TODO fix this time bug fix
         except ValueError:  # pragma: no cover
             raise ValueError("Mask do not fit to given image")
-        old_mask = self.mask
-        self.mask = mask
-        self.iterate_over(children)
-        self.mask = old_mask
+        return mask
 
-    def step_segmentation(self, operation: ROIExtractionProfile, children: List[CalculationTree]):
+    def step_segmentation(
+        self, operation: ROIExtractionProfile, children: List[CalculationTree], key: Optional[str] = None
+    ):
         """
         Perform segmentation and iterate over ``children`` nodes
 
         :param ROIExtractionProfile operation: Specification of segmentation operation
         :param List[CalculationTree] children: list of nodes to iterate over after perform segmentation
+        :param key: key of step if its result could be reused
         """
+        cached = self._get_cached(key)
+        if cached is None:
+            cached = self._calculate_segmentation(operation)
+            self._put_cached(key, cached)
+        backup_data = self.roi_info, self.additional_layers, self.algorithm_parameters
+        self.roi_info, self.additional_layers = cached
+        self.algorithm_parameters = {"algorithm_name": operation.algorithm, "values": operation.values}
+        self.iterate_over(children)
+        self.roi_info, self.additional_layers, self.algorithm_parameters = backup_data
+
+    def _calculate_segmentation(
+        self, operation: ROIExtractionProfile
+    ) -> Tuple[ROIInfo, Dict[str, AdditionalLayerDescription]]:
         segmentation_class = AnalysisAlgorithmSelection.get(operation.algorithm)
         if segmentation_class is None:  # pragma: no cover
             raise ValueError(f"Segmentation class {operation.algorithm} do not found")
+        if self.image.is_time and not segmentation_class.support_time():
+            result = segment_time_lapse(segmentation_class, operation.values, self.image, self.mask)
+            return result.roi_info, result.additional_layers
         segmentation_algorithm: RestartableAlgorithm = segmentation_class()
         segmentation_algorithm.set_image(self.image)
         segmentation_algorithm.set_mask(self.mask)
@@ -256,12 +374,10 @@ class CalculationProcess:
         else:
             segmentation_algorithm.set_parameters(**operation.values)
         result = segmentation_algorithm.calculation_run(report_empty_fun)
-        backup_data = self.roi_info, self.additional_layers, self.algorithm_parameters
-        self.roi_info = ROIInfo(result.roi, result.roi_annotation, result.alternative_representation)
-        self.additional_layers = result.additional_layers
-        self.algorithm_parameters = {"algorithm_name": operation.algorithm, "values": operation.values}
-        self.iterate_over(children)
-        self.roi_info, self.additional_layers, self.algorithm_parameters = backup_data
+        return (
+            ROIInfo(result.roi, result.roi_annotation, result.alternative_representation),
+            result.additional_layers,
+        )
 
     def step_mask_use(self, operation: MaskUse, children: List[CalculationTree]):
         """
@@ -316,20 +432,24 @@ class CalculationProcess:
         os.makedirs(save_dir, exist_ok=True)
         save_class.save(save_path, project_tuple, operation.values)
 
-    def step_mask_create(self, operation: MaskCreate, children: List[CalculationTree]):
+    def step_mask_create(self, operation: MaskCreate, children: List[CalculationTree], key: Optional[str] = None):
         """
         Create mask from current segmentation state using definition
 
         :param MaskCreate operation: mask create description.
         :param List[CalculationTree] children: list of nodes to iterate over after perform segmentation
+        :param key: key of step if its result could be reused
         """
-        mask = calculate_mask(
-            mask_description=operation.mask_property,
-            roi=self.roi_info.roi,
-            old_mask=self.mask,
-            spacing=self.image.spacing,
-            time_axis=self.image.time_pos,
-        )
+        mask = self._get_cached(key)
+        if mask is None:
+            mask = calculate_mask(
+                mask_description=operation.mask_property,
+                roi=self.roi_info.roi,
+                old_mask=self.mask,
+                spacing=self.image.spacing,
+                time_axis=self.image.time_pos,
+            )
+            self._put_cached(key, mask)
         if operation.name in self.reused_mask:
             self.mask_dict[operation.name] = mask
         history_element = HistoryElement.create(
@@ -380,10 +500,11 @@ class CalculationProcess:
 
         :param CalculationTree node: Node to be proceed
         """
+        key = self.compiled_plan.shared_key(node) if self.compiled_plan is not None else None
         if isinstance(node.operation, MaskMapper):
-            self.step_load_mask(node.operation, node.children)
+            self.step_load_mask(node.operation, node.children, key)
         elif isinstance(node.operation, ROIExtractionProfile):
-            self.step_segmentation(node.operation, node.children)
+            self.step_segmentation(node.operation, node.children, key)
         elif isinstance(node.operation, MaskUse):
             self.step_mask_use(node.operation, node.children)
         elif isinstance(node.operation, (MaskSum, MaskIntersection)):
@@ -391,7 +512,7 @@ class CalculationProcess:
         elif isinstance(node.operation, Save):
             self.step_save(node.operation)
         elif isinstance(node.operation, MaskCreate):
-            self.step_mask_create(node.operation, node.children)
+            self.step_mask_create(node.operation, node.children, key)
         elif isinstance(node.operation, Operations):  # pragma: no cover
             # backward compatibility
             self.iterate_over(node)
@@ -415,10 +536,41 @@ class CalculationManager:
     """
     This class manage batch processing in PartSeg.
 
+    :param shared_memory_min_size: if not None then result buffers (like numpy arrays) of at least
+        this size (in bytes) are transferred from workers by shared memory.
+    :param memory_budget: if not None then files are processed in parallel only
+        when their estimated memory usage (in bytes) fits in this budget.
+    :param journal: store results of each file in :py:class:`.BatchJournal` next to measurement file,
+        so interrupted calculation could be resumed (see :py:meth:`add_calculation`).
+    :param executor: executor of calculation tasks. If not provided then local :py:class:`.BatchManager`
+        is used. ``shared_memory_min_size`` is used only for local executor.
+    :param prefetch_depth: number of files loaded by each local worker in advance
+        of currently processed one (see :py:func:`prefetch_calculation`).
+    :param prefetch_memory: limit of memory (in bytes) of files loaded in advance by single local worker.
     """
 
-    def __init__(self):
-        self.batch_manager = BatchManager()
+    def __init__(
+        self,
+        shared_memory_min_size: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+        journal: bool = False,
+        executor: Optional[BatchExecutor] = None,
+        prefetch_depth: int = 0,
+        prefetch_memory: Optional[int] = None,
+    ):
+        if executor is None:
+            executor = BatchManager(
+                shared_memory_min_size=shared_memory_min_size,
+                memory_budget=memory_budget,
+                prefetch_depth=prefetch_depth,
+                prefetch_memory=prefetch_memory,
+            )
+        elif memory_budget is not None:
+            executor.set_memory_budget(memory_budget)
+        self.batch_manager: BatchExecutor = executor
+        self.journal = journal
+        self.journal_dict: Dict[str, BatchJournal] = {}
+        self._pending_errors: List[Tuple[str, ErrorInfo]] = []
         self.calculation_queue = Queue()
         self.calculation_dict: Dict[uuid.UUID, Calculation] = OrderedDict()
         self.calculation_sizes = []
@@ -447,19 +599,77 @@ class CalculationManager:
     def cancel_calculation(self, calculation: Calculation):
         self.batch_manager.cancel_work(calculation)
 
-    def add_calculation(self, calculation: Calculation):
+    def add_calculation(self, calculation: Calculation, resume: bool = False):
         """
         :param calculation: Calculation
+        :param resume: if journal is enabled, then files already calculated according to journal are not
+            calculated again. Theirs results are read from journal.
+        :raises ValueError: if resumed journal was created for different calculation plan
         """
+        done = self._open_journal(calculation, resume)
         self.calculation_dict[calculation.uuid] = calculation
         self.counter_dict[calculation.uuid] = 0
         size = len(calculation.file_list)
         self.calculation_sizes.append(size)
         self.calculation_size += size
-        self.batch_manager.add_work(
-            list(enumerate(calculation.file_list)), calculation.get_base_calculation(), do_calculation
-        )
+        file_list = [(i, file_path) for i, file_path in enumerate(calculation.file_list) if file_path not in done]
+        if file_list:
+            sizes = None
+            if self.batch_manager.memory_budget is not None:
+                sizes = [estimate_file_memory(file_path) for _, file_path in file_list]
+            self.batch_manager.add_work(file_list, calculation.get_base_calculation(), do_calculation, sizes)
         self.writer.add_data_part(calculation)
+        if done:
+            self._restore_results(calculation, done)
+
+    def _open_journal(self, calculation: Calculation, resume: bool) -> Dict[str, List[ResponseData]]:
+        if not self.journal:
+            return {}
+        if calculation.measurement_file_path not in self.journal_dict:
+            self.journal_dict[calculation.measurement_file_path] = BatchJournal(
+                journal_path(calculation.measurement_file_path)
+            )
+        journal = self.journal_dict[calculation.measurement_file_path]
+        if resume:
+            return journal.resume(calculation)
+        journal.start(calculation)
+        return {}
+
+    def _restore_results(self, calculation: Calculation, done: Dict[str, List[ResponseData]]):
+        for ind, file_path in enumerate(calculation.file_list):
+            if file_path not in done:
+                continue
+            for el in done[file_path]:
+                errors = self.writer.add_result(el, calculation, ind=ind)
+                self._pending_errors.extend((el.path_to_file, err) for err in errors)
+            self.calculation_done += 1
+            self.counter_dict[calculation.uuid] += 1
+        if self.counter_dict[calculation.uuid] == len(calculation.file_list):
+            errors = self.writer.calculation_finished(calculation)
+            self._pending_errors.extend(("", err) for err in errors)
+            self._close_journal(calculation)
+
+    def _record_in_journal(self, calculation: Calculation, ind: int, result_list: list):
+        if not self.journal or ind == -1:
+            return
+        journal = self.journal_dict[calculation.measurement_file_path]
+        errors = [el for el in result_list if not isinstance(el, ResponseData) and el != SubprocessOrder.cancel_job]
+        if errors:
+            journal.record_error(calculation, ind, "\n".join(str(el[0]) for el in errors))
+        elif result_list and all(isinstance(el, ResponseData) for el in result_list):
+            journal.record_result(calculation, ind, result_list)
+
+    def _close_journal(self, calculation: Calculation):
+        """Close journal of measurement file if no other unfinished calculation writes to it"""
+        path = calculation.measurement_file_path
+        if any(
+            other.measurement_file_path == path and self.counter_dict[uuid_id] < len(other.file_list)
+            for uuid_id, other in self.calculation_dict.items()
+        ):
+            return
+        journal = self.journal_dict.pop(path, None)
+        if journal is not None:
+            journal.close()
 
     @property
     def has_work(self) -> bool:
@@ -470,6 +680,18 @@ class CalculationManager:
 
     def kill_jobs(self):
         self.batch_manager.kill_jobs()
+        for journal in self.journal_dict.values():
+            journal.close()
+        self.journal_dict.clear()
+
+    def set_memory_budget(self, memory_budget: Optional[int]):
+        """
+        Set memory budget for files processed in parallel.
+        File footprints are estimated only for calculations added when budget is set.
+
+        :param memory_budget: budget in bytes, None to disable limit
+        """
+        self.batch_manager.set_memory_budget(memory_budget)
 
     def set_number_of_workers(self, val: int):
         """
@@ -488,11 +710,13 @@ class CalculationManager:
         :rtype: BatchResultDescription
         """
         responses: List[Tuple[uuid.UUID, WrappedResult]] = self.batch_manager.get_result()
-        new_errors: List[Tuple[str, ErrorInfo]] = []
+        new_errors: List[Tuple[str, ErrorInfo]] = self._pending_errors
+        self._pending_errors = []
         for uuid_id, (ind, result_list) in responses:
             self.calculation_done += 1
             self.counter_dict[uuid_id] += 1
             calculation = self.calculation_dict[uuid_id]
+            self._record_in_journal(calculation, ind, result_list)
             for el in result_list:
                 if isinstance(el, ResponseData):
                     errors = self.writer.add_result(el, calculation, ind=ind)
@@ -506,6 +730,8 @@ class CalculationManager:
                 if self.counter_dict[uuid_id] == len(calculation.file_list):
                     errors = self.writer.calculation_finished(calculation)
                     new_errors.extend(("", err) for err in errors)
+            if self.counter_dict[uuid_id] == len(calculation.file_list):
+                self._close_journal(calculation)
         return BatchResultDescription(new_errors, self.calculation_done, self.counter_dict.copy())
 
 
@@ -513,6 +739,17 @@ class FileType(Enum):
     excel_xlsx_file = 1
     excel_xls_file = 2
     text_file = 3
+    parquet_file = 4
+    feather_file = 5
+
+
+#: output file extensions for which each sheet is written as separate, typed Apache Arrow table
+ARROW_FILE_TYPES = {".parquet": FileType.parquet_file, ".feather": FileType.feather_file}
+
+
+def arrow_output_available() -> bool:
+    """Check if optional ``pyarrow`` package required for Parquet and Feather output is installed"""
+    return importlib.util.find_spec("pyarrow") is not None
 
 
 class SheetData:
@@ -528,8 +765,8 @@ class SheetData:
             self.columns = pd.MultiIndex.from_tuples(columns)
         else:
             self.columns = pd.MultiIndex.from_tuples([("name", "units")] + columns)
-        self.data_frame = pd.DataFrame([], columns=self.columns)
         self.row_list: List[Any] = []
+        self.rows_count = 0
 
     def add_data(self, data, ind):
         if len(data) != len(self.columns):
@@ -538,28 +775,71 @@ class SheetData:
                 f"{len(self.columns)} {data} for columns {self.columns.values}"
             )
         if ind is None:
-            ind = len(self.row_list)
+            ind = self.rows_count
         self.row_list.append((ind, data))
+        self.rows_count += 1
 
     def add_data_list(self, data, ind):
         if ind is None:
-            ind = len(self.row_list)
+            ind = self.rows_count
         for x in data:
             self.add_data(x, ind)
 
-    def get_data_to_write(self) -> Tuple[str, pd.DataFrame]:
+    def get_new_rows(self) -> List[Tuple[int, list]]:
         """
-        Get data for write
+        Get rows added since last call. Returned rows are removed from this object.
 
-        :return: sheet name and data to write
-        :rtype: Tuple[str, pd.DataFrame]
+        :return: list of pairs of element index and row
         """
-        sorted_row = [x[1] for x in sorted(self.row_list)]
-        df = pd.DataFrame(sorted_row, columns=self.columns)
-        df2 = pd.concat((self.data_frame, df), axis=0)
-        self.data_frame = df2.reset_index(drop=True)
-        self.row_list = []
-        return self.name, self.data_frame
+        rows, self.row_list = self.row_list, []
+        return rows
+
+    def create_data_frame(self, rows: List[Tuple[int, list]]) -> pd.DataFrame:
+        """
+        Create data frame with sheet columns from rows sorted by element index.
+
+        :param rows: list of pairs of element index and row
+        """
+        sorted_row = [x[1] for x in sorted(rows, key=lambda x: x[0])]
+        return pd.DataFrame(sorted_row, columns=self.columns)
+
+
+class ResultStore:
+    """
+    Append only intermediate store of batch result rows.
+    Each :py:meth:`append` pickles only new rows at the end of temporary file,
+    so the cost of saving partial results does not depend on amount of already stored data.
+    """
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix="PartSeg_batch_", suffix=".rows")
+        os.close(fd)
+
+    def append(self, chunk: List[Tuple[Hashable, List[Tuple[int, list]]]]):
+        """
+        Append rows to store.
+
+        :param chunk: list of pairs of sheet key and rows to append to this sheet
+        """
+        with open(self.path, "ab") as f_p:
+            pickle.dump(chunk, f_p, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def read(self) -> Dict[Hashable, List[Tuple[int, list]]]:
+        """read all stored rows grouped by sheet key"""
+        res = defaultdict(list)
+        with open(self.path, "rb") as f_p:
+            while True:
+                try:
+                    chunk = pickle.load(f_p)  # nosec
+                except EOFError:
+                    break
+                for key, rows in chunk:
+                    res[key].extend(rows)
+        return res
+
+    def close(self):
+        if path.exists(self.path):
+            os.remove(self.path)
 
 
 class FileData:
@@ -569,8 +849,11 @@ class FileData:
     This class run separate thread for writing purpose.
     This need additional synchronisation. but not freeze
 
+    During calculation new rows are only appended to intermediate :py:class:`ResultStore`.
+    Output file is created from it when calculation is finished (:py:meth:`write_result`).
+
     :param BaseCalculation calculation: calculation information
-    :param int write_threshold: every how many lines of data are written to disk
+    :param int write_threshold: every how many lines of data are moved to intermediate store
     :cvar component_str: separator for per component sheet information
     """
 
@@ -579,7 +862,7 @@ class FileData:
     def __init__(self, calculation: BaseCalculation, write_threshold: int = 40):
         """
         :param BaseCalculation calculation: calculation information
-        :param int write_threshold: every how many lines of data are written to disk
+        :param int write_threshold: every how many lines of data are moved to intermediate store
         """
         self.file_path = calculation.measurement_file_path
         ext = path.splitext(calculation.measurement_file_path)[1]
@@ -587,6 +870,10 @@ class FileData:
             self.file_type = FileType.excel_xlsx_file
         elif ext == ".xls":  # pragma: no cover
             self.file_type = FileType.excel_xls_file
+        elif ext in ARROW_FILE_TYPES:
+            if not arrow_output_available():
+                raise ImportError(f"Writing measurements to {ext} file require pyarrow package")
+            self.file_type = ARROW_FILE_TYPES[ext]
         else:  # pragma: no cover
             self.file_type = FileType.text_file
         self.writing = False
@@ -601,6 +888,7 @@ class FileData:
         self.write_threshold = write_threshold
         self.wrote_queue = Queue()
         self.error_queue = Queue()
+        self.result_store = ResultStore()
         self.write_thread = threading.Thread(target=self.wrote_data_to_file)
         self.write_thread.daemon = True
         self.write_thread.start()
@@ -725,16 +1013,65 @@ class FileData:
         self.new_count += 1
         self._error_info.append((file_path, str(error_description)))
 
+    def _iter_sheets(self):
+        for uuid_id, (main_sheet, component_sheets, _) in self.sheet_dict.items():
+            yield uuid_id, main_sheet
+            for sheet in component_sheets:
+                if sheet is not None:
+                    yield uuid_id, sheet
+
     def dump_data(self):
         """
-        Fire writing data to disc
+        Fire appending new rows to intermediate store
         """
         data = []
-        for main_sheet, component_sheets, _ in self.sheet_dict.values():
-            data.append(main_sheet.get_data_to_write())
-            data.extend(sheet.get_data_to_write() for sheet in component_sheets if sheet is not None)
-
-        self.wrote_queue.put((data, list(self.calculation_info.values()), self._error_info[:]))
+        for uuid_id, sheet in self._iter_sheets():
+            rows = sheet.get_new_rows()
+            if rows:
+                data.append(((uuid_id, sheet.name), rows))
+        if data:
+            self.wrote_queue.put(("append", data))
+
+    def write_result(self):
+        """
+        Fire writing output file with all data collected in intermediate store
+        """
+        self.dump_data()
+        sheets = [((uuid_id, sheet.name), sheet) for uuid_id, sheet in self._iter_sheets()]
+        self.wrote_queue.put(("write", (sheets, dict(self.calculation_info), self._error_info[:])))
+
+    def _write_result_file(
+        self,
+        sheets: List[Tuple[Tuple[uuid.UUID, str], SheetData]],
+        plans: Dict[uuid.UUID, CalculationPlan],
+        errors: List[Tuple[str, str]],
+    ):
+        stored_rows = self.result_store.read()
+        data_frames = [(sheet.name, sheet.create_data_frame(stored_rows.get(key, []))) for key, sheet in sheets]
+        if self.file_type in {FileType.parquet_file, FileType.feather_file}:
+            tables = [
+                (sheet_name, data_frame, plans.get(key[0]))
+                for (sheet_name, data_frame), (key, _) in zip(data_frames, sheets)
+            ]
+            self.write_to_arrow(self.file_path, tables, errors)
+            return
+        if self.file_type == FileType.text_file:
+            base_path, ext = path.splitext(self.file_path)
+            for sheet_name, data_frame in data_frames:
+                data_frame.to_csv(f"{base_path}_{sheet_name}{ext}")
+            return
+        file_path = self.file_path
+        i = 0
+        while i < 100:
+            i += 1
+            try:
+                self.write_to_excel(file_path, (data_frames, list(plans.values()), errors))
+                break
+            except OSError:
+                base, ext = path.splitext(self.file_path)
+                file_path = f"{base}({i}){ext}"
+        if i == 100:  # pragma: no cover
+            raise PermissionError(f"Fail to write result excel {self.file_path}")
 
     def wrote_data_to_file(self):
         """
@@ -747,28 +1084,17 @@ class FileData:
                 break
             self.writing = True
             try:
-                if self.file_type == FileType.text_file:
-                    base_path, ext = path.splitext(self.file_path)
-                    for sheet_name, data_frame in data[0]:
-                        data_frame.to_csv(f"{base_path}_{sheet_name}{ext}")
-                    continue
-                file_path = self.file_path
-                i = 0
-                while i < 100:
-                    i += 1
-                    try:
-                        self.write_to_excel(file_path, data)
-                        break
-                    except OSError:
-                        base, ext = path.splitext(self.file_path)
-                        file_path = f"{base}({i}){ext}"
-                if i == 100:  # pragma: no cover
-                    raise PermissionError(f"Fail to write result excel {self.file_path}")
+                order, arguments = data
+                if order == "append":
+                    self.result_store.append(arguments)
+                else:
+                    self._write_result_file(*arguments)
             except Exception as e:  # pragma: no cover   # pylint: disable=W0703
                 logging.error(f"[batch_backend] {e}")
                 self.error_queue.put(prepare_error_data(e))
             finally:
                 self.writing = False
+        self.result_store.close()
 
     @classmethod
     def write_to_excel(
@@ -798,6 +1124,56 @@ class FileData:
                 errors_data = pd.DataFrame(errors, columns=["File path", "error description"])
                 errors_data.to_excel(writer, "Errors")
 
+    @classmethod
+    def write_to_arrow(
+        cls,
+        file_path: str,
+        tables: List[Tuple[str, pd.DataFrame, Optional[CalculationPlan]]],
+        errors: List[Tuple[str, str]],
+    ):
+        """
+        Write each sheet as separate Parquet or Feather file (chosen base on `file_path` extension)
+        named ``{base}_{sheet_name}{ext}``. Errors are stored in ``{base}_Errors{ext}``.
+
+        :param str file_path: base path of output files
+        :param tables: list of sheet name, sheet data and calculation plan which produced it
+        :param errors: list of pairs of file path and error description
+        """
+        from pyarrow import feather, parquet
+
+        base_path, ext = path.splitext(file_path)
+        write_table = parquet.write_table if ext == ".parquet" else feather.write_feather
+        for sheet_name, data_frame, calculation_plan in tables:
+            write_table(
+                cls.create_arrow_table(data_frame, sheet_name, calculation_plan), f"{base_path}_{sheet_name}{ext}"
+            )
+        if errors:
+            errors_data = pd.DataFrame(errors, columns=["File path", "error description"])
+            write_table(cls.create_arrow_table(errors_data, "Errors"), f"{base_path}_Errors{ext}")
+
+    @staticmethod
+    def create_arrow_table(
+        data_frame: pd.DataFrame, sheet_name: str, calculation_plan: Optional[CalculationPlan] = None
+    ):
+        """
+        Convert sheet data to Apache Arrow table with typed columns.
+        Units of measurements, sheet name and calculation plan are stored in ``PartSeg`` schema metadata entry.
+        """
+        import pyarrow
+
+        data_frame = data_frame.copy()
+        if isinstance(data_frame.columns, pd.MultiIndex):
+            units = {name: unit for name, unit in data_frame.columns}
+            data_frame.columns = [name for name, _ in data_frame.columns]
+        else:
+            units = {}
+        table = pyarrow.Table.from_pandas(data_frame.infer_objects(), preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b"PartSeg"] = json.dumps(
+            {"sheet_name": sheet_name, "units": units, "calculation_plan": calculation_plan}, cls=PartSegEncoder
+        ).encode()
+        return table.replace_schema_metadata(metadata)
+
     @staticmethod
     def write_calculation_plan(writer: pd.ExcelWriter, calculation_plan: CalculationPlan):
         book: xlsxwriter.Workbook = writer.book
@@ -907,5 +1283,5 @@ class DataWriter:
         """
         if calculation.measurement_file_path not in self.file_dict:
             raise ValueError("Unknown measurement file")
-        self.file_dict[calculation.measurement_file_path].dump_data()
+        self.file_dict[calculation.measurement_file_path].write_result()
         return self.file_dict[calculation.measurement_file_path].get_errors()
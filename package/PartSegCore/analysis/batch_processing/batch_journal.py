@@ -0,0 +1,105 @@
+"""
+This module contains journal of batch calculation used to resume interrupted runs.
+
+Journal is SQLite database stored next to measurement file (see :py:func:`journal_path`).
+For each sheet it stores calculation plan and for each processed file its results or error description.
+Results are committed one by one, so they survive interruption of calculation.
+"""
+import json
+import pickle  # nosec
+import sqlite3
+from typing import Any, Dict, List
+
+from PartSegCore.analysis.calculation_plan import Calculation
+from PartSegCore.json_hooks import PartSegEncoder
+
+JOURNAL_SUFFIX = ".journal.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calculation (sheet_name TEXT PRIMARY KEY, plan TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS result (
+    sheet_name TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    ind INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    data BLOB,
+    PRIMARY KEY (sheet_name, file_path)
+);
+"""
+
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+
+def journal_path(measurement_file_path: str) -> str:
+    """Path of journal for given measurement file"""
+    return measurement_file_path + JOURNAL_SUFFIX
+
+
+class BatchJournal:
+    """
+    Journal of batch calculations which results are stored in one measurement file.
+
+    :param path: path to SQLite database
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(_SCHEMA)
+        self.connection.commit()
+
+    @staticmethod
+    def _plan_json(calculation: Calculation) -> str:
+        return json.dumps(calculation.calculation_plan, cls=PartSegEncoder)
+
+    def start(self, calculation: Calculation):
+        """Start new journal for calculation. Previous entries for its sheet are removed."""
+        with self.connection:
+            self.connection.execute("DELETE FROM result WHERE sheet_name = ?", (calculation.sheet_name,))
+            self.connection.execute(
+                "INSERT OR REPLACE INTO calculation (sheet_name, plan) VALUES (?, ?)",
+                (calculation.sheet_name, self._plan_json(calculation)),
+            )
+
+    def resume(self, calculation: Calculation) -> Dict[str, List[Any]]:
+        """
+        Continue journal of calculation.
+
+        :raises ValueError: if journal for sheet was created for different calculation plan
+        :return: mapping from path of already calculated files to theirs results
+        """
+        row = self.connection.execute(
+            "SELECT plan FROM calculation WHERE sheet_name = ?", (calculation.sheet_name,)
+        ).fetchone()
+        if row is None:
+            self.start(calculation)
+            return {}
+        if row[0] != self._plan_json(calculation):
+            raise ValueError(
+                f"Journal {self.path} for sheet {calculation.sheet_name} was created for different calculation plan"
+            )
+        cursor = self.connection.execute(
+            "SELECT file_path, data FROM result WHERE sheet_name = ? AND status = ?",
+            (calculation.sheet_name, STATUS_DONE),
+        )
+        return {file_path: pickle.loads(data) for file_path, data in cursor}  # nosec
+
+    def record_result(self, calculation: Calculation, ind: int, responses: List[Any]):
+        """Store results of successfully calculated file"""
+        self._record(calculation, ind, STATUS_DONE, pickle.dumps(responses, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def record_error(self, calculation: Calculation, ind: int, description: str):
+        """Store information that calculation of file failed. Such files are calculated again on resume."""
+        self._record(calculation, ind, STATUS_ERROR, description.encode())
+
+    def _record(self, calculation: Calculation, ind: int, status: str, data: bytes):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO result (sheet_name, file_path, ind, status, data) VALUES (?, ?, ?, ?, ?)",
+                (calculation.sheet_name, calculation.file_list[ind], ind, status, data),
+            )
+
+    def close(self):
+        self.connection.close()
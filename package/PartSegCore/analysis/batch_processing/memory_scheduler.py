@@ -0,0 +1,150 @@
+"""
+This module contains memory aware admission of batch tasks.
+
+Footprint of each file is estimated from its header (:py:func:`estimate_file_memory`).
+Peak memory of the first tasks of each work is measured in worker and used to calculate
+how many times peak memory is bigger than the file footprint (plan multiplier).
+:py:class:`MemoryScheduler` admits tasks only if total estimated memory of tasks in progress
+stays under configured budget. At least one task is always in progress,
+so too small budget reduces calculation to one file at a time.
+"""
+import os
+import tracemalloc
+import uuid
+from collections import OrderedDict, deque
+from contextlib import suppress
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import tifffile
+
+#: plan multiplier used before any task of work is measured
+DEFAULT_MULTIPLIER = 4.0
+#: number of first tasks of each work for which peak memory is measured
+CALIBRATION_TASKS = 3
+
+
+def estimate_file_memory(file_path: str) -> int:
+    """
+    Estimate memory footprint of image stored in file.
+    For TIFF files it is based on shape and dtype of first series. For other files size of file is used.
+
+    :param file_path: path to file
+    :return: estimated size in bytes
+    """
+    with suppress(Exception):
+        with tifffile.TiffFile(file_path) as tiff:
+            series = tiff.series[0]
+            return int(np.prod(series.shape, dtype=np.int64)) * series.dtype.itemsize
+    with suppress(OSError):
+        return os.path.getsize(file_path)
+    return 0
+
+
+def measure_peak_memory(fun: Callable[..., Any], *args) -> Tuple[Any, int]:
+    """
+    Call function and measure peak memory of allocations done during call using :py:mod:`tracemalloc`.
+    Memory allocated by libraries which does not report to :py:mod:`tracemalloc` is not counted.
+
+    :return: function result and peak memory in bytes
+    """
+    if tracemalloc.is_tracing():  # pragma: no cover
+        return fun(*args), 0
+    tracemalloc.start()
+    try:
+        return fun(*args), tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class MemoryScheduler:
+    """
+    Keep pending tasks and decide which of them could be started.
+
+    :param budget: memory budget in bytes. If None then all tasks are admitted immediately.
+    :param default_multiplier: plan multiplier used before first measurement
+    :param calibration_tasks: number of first tasks of each work which should be measured
+    """
+
+    def __init__(
+        self,
+        budget: Optional[int] = None,
+        default_multiplier: float = DEFAULT_MULTIPLIER,
+        calibration_tasks: int = CALIBRATION_TASKS,
+    ):
+        self.budget = budget
+        self.default_multiplier = default_multiplier
+        self.calibration_tasks = calibration_tasks
+        self.pending: Deque[Tuple[Hashable, uuid.UUID, Any, int]] = deque()
+        self.in_progress: Dict[Hashable, Tuple[uuid.UUID, int]] = OrderedDict()
+        self.multipliers: Dict[uuid.UUID, float] = {}
+        self._to_measure: Dict[uuid.UUID, int] = {}
+
+    @property
+    def used_memory(self) -> int:
+        """estimated memory of admitted, not finished tasks"""
+        return sum(self.estimate(work_uuid, size) for work_uuid, size in self.in_progress.values())
+
+    def estimate(self, work_uuid: uuid.UUID, size: int) -> int:
+        """estimated peak memory of task of given work with given file footprint"""
+        return int(size * self.multipliers.get(work_uuid, self.default_multiplier))
+
+    def add_task(self, task_id: Hashable, work_uuid: uuid.UUID, task: Any, size: int = 0):
+        """
+        Add task waiting for admission
+
+        :param task_id: unique identifier of task
+        :param work_uuid: identifier of work
+        :param task: task data returned by :py:meth:`admit`
+        :param size: estimated memory footprint of task input in bytes
+        """
+        self._to_measure.setdefault(work_uuid, self.calibration_tasks)
+        self.pending.append((task_id, work_uuid, task, size))
+
+    def admit(self) -> List[Tuple[Hashable, Any, bool]]:
+        """
+        Get tasks which could be started now. Tasks are admitted in order of adding.
+
+        :return: list of task identifier, task data and if peak memory of task should be measured
+        """
+        res = []
+        used = self.used_memory if self.budget is not None else 0
+        while self.pending:
+            task_id, work_uuid, task, size = self.pending[0]
+            estimated = self.estimate(work_uuid, size)
+            if self.budget is not None and self.in_progress and used + estimated > self.budget:
+                break
+            self.pending.popleft()
+            self.in_progress[task_id] = work_uuid, size
+            used += estimated
+            measure = self.budget is not None and self._to_measure[work_uuid] > 0
+            if measure:
+                self._to_measure[work_uuid] -= 1
+            res.append((task_id, task, measure))
+        return res
+
+    def task_finished(self, task_id: Hashable, peak_memory: Optional[int] = None):
+        """
+        Mark task as finished and update plan multiplier of its work if peak memory is provided.
+
+        :param task_id: task identifier
+        :param peak_memory: measured peak memory of task in bytes
+        """
+        if task_id not in self.in_progress:
+            return
+        work_uuid, size = self.in_progress.pop(task_id)
+        if peak_memory and size:
+            multiplier = peak_memory / size
+            if work_uuid in self.multipliers:
+                multiplier = max(multiplier, self.multipliers[work_uuid])
+            self.multipliers[work_uuid] = multiplier
+
+    def remove_work(self, work_uuid: uuid.UUID) -> List[Tuple[Hashable, Any]]:
+        """
+        Remove not admitted tasks of work.
+
+        :return: list of removed task identifiers and data
+        """
+        removed = [(task_id, task) for task_id, uuid_, task, _ in self.pending if uuid_ == work_uuid]
+        self.pending = deque(x for x in self.pending if x[1] != work_uuid)
+        return removed
@@ -1,12 +1,26 @@
 """
 This module contains utils for parallel batch calculation.
 Main class is :py:class:`BatchManager` which is used to manage
-parallel calculation
+parallel calculation on local machine. It implements :py:class:`BatchExecutor` interface,
+so it could be replaced by other executor (like :py:class:`.RemoteBatchManager`).
 
 Main workflow is to add work with :py:meth:`BatchManager.add_work`
 and consume results (:py:meth:`BatchManager.get_result`) until
 :py:attr:`BatchManager.has_work` is evaluating to true
 
+Communication use native :py:class:`multiprocessing.Queue`. Tasks are taken by workers from one shared queue.
+Global parameters of each work are sent once to every worker using its private order queue
+and are cached in worker process (no shared state).
+
+Optionally large buffers of results (like numpy arrays) are transferred using
+:py:mod:`multiprocessing.shared_memory` (see :py:class:`SharedMemoryPayload`).
+
+If memory budget is set, tasks are put in task queue only when
+:py:class:`.MemoryScheduler` admits them.
+
+Workers could take tasks in advance of current one (``prefetch_depth``), so work function
+could start loading their data in background (see :py:class:`BatchWorker`).
+
 .. graphviz::
 
    digraph foo {
@@ -14,23 +28,34 @@ and consume results (:py:meth:`BatchManager.get_result`) until
    }
 
 """
+import itertools
 import logging
 import multiprocessing
 import os
+import pickle  # nosec
 import sys
 import time
 import traceback
 import uuid
+from abc import ABC, abstractmethod
+from collections import deque
 from contextlib import suppress
 from enum import Enum
 from queue import Empty, Queue
 from threading import RLock, Timer
-from typing import Any, Callable, Dict, List, Tuple
+from typing import Any, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 __author__ = "Grzegorz Bokota"
 
+from PartSegCore.analysis.batch_processing.memory_scheduler import MemoryScheduler, measure_peak_memory
 from PartSegCore.plugins import register_if_need
 
+if sys.version_info >= (3, 8):
+    from multiprocessing import resource_tracker, shared_memory
+else:  # pragma: no cover
+    # shared memory and pickle protocol 5 are available since python 3.8
+    resource_tracker = shared_memory = None
+
 
 class SubprocessOrder(Enum):
     """
@@ -40,26 +65,193 @@ class SubprocessOrder(Enum):
     kill = 1
     wait = 2
     cancel_job = 3
+    add_job = 4
+
+
+class SharedMemoryPayload(NamedTuple):
+    """
+    Result pickled with protocol 5, which out-of-band buffers are stored in shared memory blocks.
+    Only pickle stream and names of blocks are sent through result queue.
+    Blocks are owned by receiver, which need to call :py:meth:`load` or :py:meth:`release`.
+    """
+
+    data: bytes
+    buffers: List[Tuple[str, int]]
+
+    @classmethod
+    def pack(cls, obj, min_size: int) -> "SharedMemoryPayload":
+        """
+        Pickle object and move its contiguous buffers of at least `min_size` bytes to shared memory.
 
+        :param obj: object to be packed
+        :param min_size: minimal size (in bytes) of buffer to be stored in shared memory
+        """
+        buffers = []
+
+        def buffer_callback(buffer: "pickle.PickleBuffer"):
+            if buffer.raw().nbytes < min_size:
+                return True  # serialize in-band
+            buffers.append(buffer)
+            return False
+
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+        names = []
+        try:
+            for buffer in buffers:
+                raw = buffer.raw()
+                shm = shared_memory.SharedMemory(create=True, size=max(raw.nbytes, 1))
+                names.append((shm.name, raw.nbytes))
+                # ownership is passed to receiver, so it should not be removed when this process ends
+                resource_tracker.unregister(shm._name, "shared_memory")  # pylint: disable=W0212
+                shm.buf[: raw.nbytes] = raw
+                shm.close()
+        except BaseException:
+            cls(data, names).release()
+            raise
+        return cls(data, names)
+
+    def load(self):
+        """Restore object and free shared memory"""
+        buffers = []
+        try:
+            for name, size in self.buffers:
+                shm = shared_memory.SharedMemory(name=name)
+                buffers.append(bytearray(shm.buf[:size]))
+                shm.close()
+                shm.unlink()
+        except BaseException:
+            self.release()
+            raise
+        return pickle.loads(self.data, buffers=buffers)  # nosec
+
+    def release(self):
+        """Free shared memory without restoring object"""
+        for name, _size in self.buffers:
+            with suppress(FileNotFoundError):
+                shm = shared_memory.SharedMemory(name=name)
+                shm.close()
+                shm.unlink()
+
+
+def shared_memory_supported() -> bool:
+    """
+    Check if shared memory transfer could be used. It requires python 3.8.
+    On Windows block is freed when creator close it.
+    """
+    return shared_memory is not None and os.name != "nt"
+
+
+class BatchExecutor(ABC):
+    """
+    Interface of executor of batch works used by :py:class:`.CalculationManager`.
 
-class BatchManager:
+    Work is set of tasks sharing global parameters and function.
+    For each task ``fun(task_data, global_parameters)`` is called and
+    exactly one result is returned by :py:meth:`get_result`.
+    """
+
+    @abstractmethod
+    def add_work(
+        self,
+        individual_parameters_list: List,
+        global_parameters,
+        fun: Callable[[Any, Any], Any],
+        sizes: Optional[List[int]] = None,
+    ) -> uuid.UUID:
+        """
+        Add work to be calculated.
+
+        :param individual_parameters_list: list of individual parameters for fun.
+        :param global_parameters: second argument of fun. If has field uuid then it is used as work uuid
+        :param fun: two argument function which will be used to run calculation.
+        :param sizes: estimated memory footprint of input of each task (in bytes)
+        :return: work uuid
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_result(self) -> List[Tuple[uuid.UUID, Any]]:
+        """
+        Get results calculated since last call, as pairs of work uuid and function result.
+        Results of canceled tasks are replaced with ``(-1, [SubprocessOrder.cancel_job])``
+        and errors with ``(-1, [(exception, traceback)])``.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def cancel_work(self, global_parameters):
+        """Cancel not finished tasks of work"""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def kill_jobs(self):
+        """Stop all calculations immediately"""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def set_number_of_process(self, num: int):
+        """Set number of tasks calculated in parallel"""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def set_memory_budget(self, memory_budget: Optional[int]):
+        """Set memory budget (in bytes) for tasks calculated in parallel, None to disable limit"""
+        raise NotImplementedError()
+
+    @property
+    @abstractmethod
+    def memory_budget(self) -> Optional[int]:
+        """Current memory budget. If it is not None, then task sizes should be passed to :py:meth:`add_work`"""
+        raise NotImplementedError()
+
+    @property
+    @abstractmethod
+    def has_work(self) -> bool:
+        """Check if executor has pending or processed work and if all results are consumed"""
+        raise NotImplementedError()
+
+
+class BatchManager(BatchExecutor):
     """
     This class is used for manage pending works.
     It use :py:class:`.BatchWorker` for running calculation.
 
+    :param shared_memory_min_size: if not None then buffers of results of at least this size (in bytes)
+        are transferred from workers using shared memory instead of result queue.
+    :param memory_budget: if not None then tasks are started only if
+        their total estimated memory (in bytes) fits in this budget
+    :param prefetch_depth: number of tasks taken by each worker in advance of current one,
+        see :py:class:`BatchWorker`
+    :param prefetch_memory: limit of memory (in bytes) of data prefetched by single worker, None for no limit
+
     :type task_queue: Queue
-    :type order_queue: Queue
     :type result_queue: Queue
     :type calculation_dict: dict
     :type process_list: list[multiprocessing.Process]
+    :type order_queues: dict[multiprocessing.Process, Queue]
     """
 
-    def __init__(self):
-        self.manager = multiprocessing.Manager()
-        self.task_queue = self.manager.Queue()
-        self.order_queue = self.manager.Queue()
-        self.result_queue = self.manager.Queue()
-        self.calculation_dict = self.manager.dict()
+    def __init__(
+        self,
+        shared_memory_min_size: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+        prefetch_depth: int = 0,
+        prefetch_memory: Optional[int] = None,
+    ):
+        if not shared_memory_supported():
+            shared_memory_min_size = None
+        self.shared_memory_min_size = shared_memory_min_size
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_memory = prefetch_memory
+        self._pending_results = []
+        self.scheduler = MemoryScheduler(memory_budget)
+        self._task_counter = itertools.count()
+        self.task_queue = multiprocessing.Queue()
+        self.result_queue = multiprocessing.Queue()
+        self.calculation_dict: Dict[uuid.UUID, Tuple[Any, Callable[[Any, Any], Any]]] = {}
+        self.canceled_works = set()
+        self.order_queues = {}
+        self.stopping_process = set()
         self.number_off_available_process = 1
         self.number_off_process = 0
         self.number_off_alive_process = 0
@@ -73,18 +265,61 @@ class BatchManager:
         Clean result queue and return it as list
 
         :return: List of results as tuple where first element is uuid of job and second is
-            function result or tuple with exception as first argument and second is traceback
+            function result or tuple with exception as first argument and second is traceback.
+            Results of canceled works are replaced with ``(-1, [SubprocessOrder.cancel_job])``
         """
-        res = []
-        while not self.result_queue.empty():
-            res.append(self.result_queue.get())
+        res, self._pending_results = self._pending_results, []
+        with suppress(Empty):
+            while True:
+                task_uuid, result, task_id, peak_memory = self.result_queue.get_nowait()
+                self.scheduler.task_finished(task_id, peak_memory)
+                res.append(self._unpack_result(task_uuid, result))
+        self._admit_tasks()
         self.work_task -= len(res)
         if self.work_task == 0:
             logging.debug("computation finished")
-            Timer(0.1, self._change_process_num, args=[-self.number_off_available_process]).start()
+            Timer(0.1, self._stop_idle_process).start()
         return res
 
-    def add_work(self, individual_parameters_list: List, global_parameters, fun: Callable[[Any, Any], Any]) -> str:
+    def _stop_idle_process(self):
+        # new work could be added before timer fires
+        with self.locker:
+            if self.work_task == 0 and self.number_off_process > 0:
+                self._change_process_num(-self.number_off_process)
+
+    def _unpack_result(self, task_uuid: uuid.UUID, result) -> Tuple[uuid.UUID, Any]:
+        if task_uuid in self.canceled_works:
+            if isinstance(result, SharedMemoryPayload):
+                result.release()
+            return task_uuid, (-1, [SubprocessOrder.cancel_job])
+        if isinstance(result, SharedMemoryPayload):
+            result = result.load()
+        return task_uuid, result
+
+    def _admit_tasks(self):
+        for task_id, (el, task_uuid), measure in self.scheduler.admit():
+            self.task_queue.put((el, task_uuid, task_id, measure))
+
+    def set_memory_budget(self, memory_budget: Optional[int]):
+        """
+        Set memory budget for running tasks
+
+        :param memory_budget: budget in bytes, None to disable limit
+        """
+        self.scheduler.budget = memory_budget
+        self._admit_tasks()
+
+    @property
+    def memory_budget(self) -> Optional[int]:
+        return self.scheduler.budget
+
+    def add_work(
+        self,
+        individual_parameters_list: List,
+        global_parameters,
+        fun: Callable[[Any, Any], Any],
+        sizes: Optional[List[int]] = None,
+    ) -> uuid.UUID:
         """
         This function add next works to internal structures.
         Number of works is length of ``individual_parameters_list``
@@ -94,28 +329,56 @@ class BatchManager:
         :param global_parameters: second argument of fun. If has field uuid then it is used as work uuid
         :param fun: two argument function which will be used to run calculation.
             First argument is task specific, second is const for whole work.
+        :param sizes: estimated memory footprint of input of each task (in bytes), used when memory budget is set
         :return: work uuid
         """
-        self.calculation_dict[global_parameters.uuid] = global_parameters, fun
-        self.work_task += len(individual_parameters_list)
         if hasattr(global_parameters, "uuid"):
             task_uuid = global_parameters.uuid
         else:
             task_uuid = uuid.uuid4()
-        for el in individual_parameters_list:
-            self.task_queue.put((el, task_uuid))
-        if self.number_off_available_process > self.number_off_process:
-            for _ in range(self.number_off_available_process - self.number_off_process):
-                self._spawn_process()
+        if sizes is None:
+            sizes = [0] * len(individual_parameters_list)
+        with self.locker:
+            self.work_task += len(individual_parameters_list)
+            # parameters of already known work are not sent to workers again
+            if task_uuid not in self.calculation_dict:
+                self.calculation_dict[task_uuid] = global_parameters, fun
+                self.canceled_works.discard(task_uuid)
+                self._send_order((SubprocessOrder.add_job, (task_uuid, (global_parameters, fun))))
+            for el, size in zip(individual_parameters_list, sizes):
+                self.scheduler.add_task(next(self._task_counter), task_uuid, (el, task_uuid), size)
+            self._admit_tasks()
+            if self.number_off_available_process > self.number_off_process:
+                for _ in range(self.number_off_available_process - self.number_off_process):
+                    self._spawn_process()
         self.in_work = True
         return task_uuid
 
+    def _send_order(self, order, process_list: Optional[Iterable[multiprocessing.Process]] = None):
+        if process_list is None:
+            process_list = self.process_list
+        for process in process_list:
+            self.order_queues[process].put(order)
+
     def _spawn_process(self):
         with self.locker:
+            order_queue = multiprocessing.Queue()
             process = multiprocessing.Process(
-                target=spawn_worker, args=(self.task_queue, self.order_queue, self.result_queue, self.calculation_dict)
+                target=spawn_worker,
+                args=(
+                    self.task_queue,
+                    order_queue,
+                    self.result_queue,
+                    dict(self.calculation_dict),
+                    set(self.canceled_works),
+                    self.shared_memory_min_size,
+                    self.prefetch_depth,
+                    self.prefetch_memory,
+                ),
+                daemon=True,
             )
             process.start()
+            self.order_queues[process] = order_queue
             self.process_list.append(process)
             self.number_off_alive_process += 1
             self.number_off_process += 1
@@ -126,8 +389,39 @@ class BatchManager:
         return self.work_task > 0 or (not self.result_queue.empty())
 
     def kill_jobs(self):
-        for p in self.process_list:
-            p.terminate()
+        """
+        Terminate all workers. Not finished tasks are reported as canceled.
+        Queues could be corrupted by terminated workers, so they are replaced by new ones.
+        """
+        with self.locker:
+            for p in self.process_list:
+                p.terminate()
+            for p in self.process_list:
+                p.join()
+            # free shared memory of not consumed results
+            with suppress(Empty):
+                while True:
+                    task_uuid, result, task_id, _ = self.result_queue.get_nowait()
+                    self.scheduler.task_finished(task_id)
+                    if isinstance(result, SharedMemoryPayload):
+                        result.release()
+                    self._pending_results.append((task_uuid, (-1, [SubprocessOrder.cancel_job])))
+            for task_id, (task_uuid, _) in list(self.scheduler.in_progress.items()):
+                self.scheduler.task_finished(task_id)
+                self._pending_results.append((task_uuid, (-1, [SubprocessOrder.cancel_job])))
+            for task_uuid in {x[1] for x in self.scheduler.pending}:
+                for _ in self.scheduler.remove_work(task_uuid):
+                    self._pending_results.append((task_uuid, (-1, [SubprocessOrder.cancel_job])))
+            for queue in [self.task_queue, self.result_queue, *self.order_queues.values()]:
+                queue.cancel_join_thread()
+                queue.close()
+            self.task_queue = multiprocessing.Queue()
+            self.result_queue = multiprocessing.Queue()
+            self.order_queues = {}
+            self.process_list = []
+            self.stopping_process = set()
+            self.number_off_process = 0
+            self.number_off_alive_process = 0
 
     def set_number_of_process(self, num: int):
         """
@@ -147,16 +441,23 @@ class BatchManager:
             for _ in range(process_diff):
                 self._spawn_process()
         else:
-            for _ in range(-process_diff):
-                logging.debug("[set_number_of_process] process kill")
-                self.order_queue.put(SubprocessOrder.kill)
             with self.locker:
+                to_stop = [p for p in reversed(self.process_list) if p not in self.stopping_process][:-process_diff]
+                for process in to_stop:
+                    logging.debug("[set_number_of_process] process kill")
+                    self._send_order(SubprocessOrder.kill, [process])
+                    self.stopping_process.add(process)
                 self.number_off_process += process_diff
             self.join_all()
 
     def cancel_work(self, global_parameters):
-        with suppress(KeyError):
-            del self.calculation_dict[global_parameters.uuid]
+        with self.locker:
+            if self.calculation_dict.pop(global_parameters.uuid, None) is None:
+                return
+            self.canceled_works.add(global_parameters.uuid)
+            self._send_order((SubprocessOrder.cancel_job, global_parameters.uuid))
+            for _ in self.scheduler.remove_work(global_parameters.uuid):
+                self._pending_results.append((global_parameters.uuid, (-1, [SubprocessOrder.cancel_job])))
 
     def join_all(self):
         logging.debug(f"Join begin {len(self.process_list)} {self.number_off_process}")
@@ -171,6 +472,10 @@ class BatchManager:
                         to_remove.append(p)
                 for p in to_remove:
                     self.process_list.remove(p)
+                    self.stopping_process.discard(p)
+                    order_queue = self.order_queues.pop(p)
+                    order_queue.cancel_join_thread()
+                    order_queue.close()
                 self.number_off_alive_process -= len(to_remove)
                 logging.debug(f"Process list end {self.process_list}")
             # FIXME self.number_off_alive_process,  self.number_off_process negative values
@@ -194,9 +499,16 @@ class BatchWorker:
     Worker spawned by :py:class:`BatchManager` instance
 
     :param task_queue: Queue with task data
-    :param order_queue: Queue with additional orders (like kill)
+    :param order_queue: Queue with additional orders (like kill) for this worker
     :param result_queue: Queue to put result
-    :param calculation_dict: to store global parameters of task
+    :param calculation_dict: to store global parameters of task. Updated base on orders.
+    :param canceled_tasks: identifiers of canceled works
+    :param shared_memory_min_size: if not None then minimal size of result buffer to be put in shared memory
+    :param prefetch_depth: number of tasks taken from :py:attr:`task_queue` in advance of current one.
+        If work function has ``prefetch`` attribute then it is called as
+        ``fun.prefetch(task_data, global_parameters, prefetch_memory)`` for each of them before
+        calculation of current task, so it could start loading of data in background.
+    :param prefetch_memory: limit of memory (in bytes) of prefetched data, passed to ``prefetch`` function
     """
 
     def __init__(
@@ -205,73 +517,191 @@ class BatchWorker:
         order_queue: Queue,
         result_queue: Queue,
         calculation_dict: Dict[uuid.UUID, Tuple[Any, Callable[[Any, Any], Any]]],
+        canceled_tasks: Optional[Iterable[uuid.UUID]] = None,
+        shared_memory_min_size: Optional[int] = None,
+        prefetch_depth: int = 0,
+        prefetch_memory: Optional[int] = None,
     ):
         self.task_queue = task_queue
         self.order_queue = order_queue
         self.result_queue = result_queue
         self.calculation_dict = calculation_dict
-        self.canceled_tasks = set()
+        self.canceled_tasks = set(canceled_tasks or ())
+        self.shared_memory_min_size = shared_memory_min_size
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_memory = prefetch_memory
+        self.prefetched: Deque[Tuple[Any, uuid.UUID, int, bool]] = deque()
 
-    def calculate_task(self, val: Tuple[Any, uuid.UUID]):
+    def calculate_task(self, val: Tuple[Any, uuid.UUID, int, bool]):
         """
         Calculate single task.
-        ``val`` is tuple with two elements (task_data, uuid).
+        ``val`` is tuple with four elements (task_data, uuid, task_id, measure_memory).
         function and global parameters are obtained from :py:attr:`.calculation_dict`
+        Result is put in :py:attr:`result_queue` as tuple (uuid, result, task_id, peak_memory).
         """
-        data, task_uuid = val
+        data, task_uuid, task_id, measure_memory = val
         calc = self.calculation_dict.get(task_uuid)
         if calc is None:
-            self.result_queue.put((task_uuid, (-1, [SubprocessOrder.cancel_job])))
+            self.result_queue.put((task_uuid, (-1, [SubprocessOrder.cancel_job]), task_id, None))
+            return
         global_data, fun = calc
         try:
-            res = fun(data, global_data)
-            self.result_queue.put((task_uuid, res))
+            if measure_memory:
+                res, peak_memory = measure_peak_memory(fun, data, global_data)
+            else:
+                res, peak_memory = fun(data, global_data), None
+            if self.shared_memory_min_size is not None:
+                res = SharedMemoryPayload.pack(res, self.shared_memory_min_size)
+            self.result_queue.put((task_uuid, res, task_id, peak_memory))
         except Exception as e:  # pragma: no cover # pylint: disable=W0703
             traceback.print_exc()
             exc_type, _exc_obj, exc_tb = sys.exc_info()
             f_name = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
             print(exc_type, f_name, exc_tb.tb_lineno, file=sys.stderr)
-            self.result_queue.put((task_uuid, (-1, [(e, traceback.extract_tb(e.__traceback__))])))
+            self.result_queue.put((task_uuid, (-1, [(e, traceback.extract_tb(e.__traceback__))]), task_id, None))
+
+    def process_order(self, order) -> bool:
+        """
+        Apply order from :py:attr:`order_queue`
+
+        :return: False if worker should finish
+        """
+        logging.debug(f"Order message: {order}")
+        if order == SubprocessOrder.kill:
+            return False
+        order_type, data = order
+        if order_type == SubprocessOrder.add_job:
+            task_uuid, calc = data
+            self.calculation_dict[task_uuid] = calc
+            self.canceled_tasks.discard(task_uuid)
+        elif order_type == SubprocessOrder.cancel_job:
+            self.calculation_dict.pop(data, None)
+            self.canceled_tasks.add(data)
+        return True
+
+    def process_pending_orders(self) -> bool:
+        """
+        Apply all orders waiting in :py:attr:`order_queue` without blocking
+
+        :return: False if worker should finish
+        """
+        with suppress(Empty):
+            while True:
+                if not self.process_order(self.order_queue.get_nowait()):
+                    return False
+        return True
+
+    def wait_for_calculation(self, task_uuid: uuid.UUID) -> bool:
+        """
+        Block until global parameters of work are received or work is canceled.
+        Orders and tasks are sent by different queues, so task could be received first.
+
+        :return: False if worker should finish
+        """
+        while task_uuid not in self.calculation_dict and task_uuid not in self.canceled_tasks:
+            if not self.process_order(self.order_queue.get()):
+                return False
+        return True
+
+    def next_task(self, timeout: float = 0.1) -> Tuple[Any, uuid.UUID, int, bool]:
+        """
+        Get next task to calculate. Tasks taken in advance are returned first.
+
+        :raise Empty: if there is no task
+        """
+        if self.prefetched:
+            return self.prefetched.popleft()
+        return self.task_queue.get(timeout=timeout)
+
+    def read_ahead(self):
+        """Take up to :py:attr:`prefetch_depth` tasks in advance and start prefetching of their data"""
+        with suppress(Empty):
+            while len(self.prefetched) < self.prefetch_depth:
+                task = self.task_queue.get_nowait()
+                self.prefetched.append(task)
+                self.prefetch_task(task)
+
+    def prefetch_task(self, task: Tuple[Any, uuid.UUID, int, bool]):
+        """Call ``prefetch`` function of work, if work function has one"""
+        data, task_uuid = task[:2]
+        calc = self.calculation_dict.get(task_uuid)
+        if calc is None:
+            return
+        global_data, fun = calc
+        prefetch = getattr(fun, "prefetch", None)
+        if prefetch is None:
+            return
+        try:
+            prefetch(data, global_data, self.prefetch_memory)
+        except Exception as ex:  # pragma: no cover # pylint: disable=W0703
+            logging.warning(f"Prefetch failed {ex}")
+
+    def return_prefetched(self):
+        """Put tasks taken in advance back to :py:attr:`task_queue`, so other workers can calculate them"""
+        while self.prefetched:
+            self.task_queue.put(self.prefetched.popleft())
 
     def run(self):
         """Worker main loop"""
         logging.debug(f"Process started {os.getpid()}")
-        while True:
-            if not self.order_queue.empty():
-                with suppress(Empty):
-                    order = self.order_queue.get_nowait()
-                    logging.debug(f"Order message: {order}")
-                    if order == SubprocessOrder.kill:
-                        break
-            if not self.task_queue.empty():
-                try:
-                    task = self.task_queue.get_nowait()
-                    self.calculate_task(task)
-                except Empty:  # pragma: no cover
-                    time.sleep(0.1)
-                    continue
-                except (MemoryError, OSError):  # pragma: no cover
-                    pass
-                except Exception as ex:  # pragma: no cover # pylint: disable=W0703
-                    logging.warning(f"Unsupported exception {ex}")
-            else:
-                time.sleep(0.1)
+        # parent_process is available since python 3.8
+        parent = getattr(multiprocessing, "parent_process", lambda: None)()
+        while self.process_pending_orders():
+            try:
+                task = self.next_task()
+            except Empty:
+                if parent is not None and not parent.is_alive():  # pragma: no cover
+                    break
+                continue
+            if not self.wait_for_calculation(task[1]):
+                self.task_queue.put(task)
+                break
+            self.read_ahead()
+            try:
+                self.calculate_task(task)
+            except (MemoryError, OSError):  # pragma: no cover
+                pass
+            except Exception as ex:  # pragma: no cover # pylint: disable=W0703
+                logging.warning(f"Unsupported exception {ex}")
+        self.return_prefetched()
         logging.info(f"Process {os.getpid()} ended")
 
 
-def spawn_worker(task_queue: Queue, order_queue: Queue, result_queue: Queue, calculation_dict: Dict[uuid.UUID, Any]):
+def spawn_worker(
+    task_queue: Queue,
+    order_queue: Queue,
+    result_queue: Queue,
+    calculation_dict: Dict[uuid.UUID, Any],
+    canceled_tasks: Optional[Iterable[uuid.UUID]] = None,
+    shared_memory_min_size: Optional[int] = None,
+    prefetch_depth: int = 0,
+    prefetch_memory: Optional[int] = None,
+):
     """
     Function for spawning worker. Designed as argument for :py:meth:`multiprocessing.Process`.
 
     :param task_queue: Queue with tasks
     :param order_queue: Queue with additional orders (like kill)
     :param result_queue: Queue for calculation result
-    :param calculation_dict: dict with global parameters
+    :param calculation_dict: dict with global parameters of already added works
+    :param canceled_tasks: identifiers of already canceled works
+    :param shared_memory_min_size: minimal size of result buffer to be transferred by shared memory
+    :param prefetch_depth: number of tasks taken in advance
+    :param prefetch_memory: limit of memory of prefetched data
     """
     register_if_need()
     with suppress(ImportError):
         from PartSeg.plugins import register_if_need as register
 
         register()
-    worker = BatchWorker(task_queue, order_queue, result_queue, calculation_dict)
+    worker = BatchWorker(
+        task_queue,
+        order_queue,
+        result_queue,
+        calculation_dict,
+        canceled_tasks,
+        shared_memory_min_size,
+        prefetch_depth,
+        prefetch_memory,
+    )
     worker.run()
@@ -0,0 +1,159 @@
+"""
+This module contains compiler of calculation plan which finds steps repeated in different branches of plan.
+
+Each step producing ROI or mask gets key calculated from its operation and keys of its inputs
+(current mask, current ROI, named masks). For given file steps with equal keys produce the same data,
+so :py:class:`.CalculationProcess` calculates them once and reuses result in other branches
+(see :py:class:`StepCache`). Keys depend only on plan, so they are calculated once for all files
+of calculation (see :py:func:`compiled_plan_for`).
+"""
+import hashlib
+import json
+import weakref
+from collections import Counter
+from threading import Lock
+from typing import Any, Dict, Iterable, Optional
+
+from PartSegCore.algorithm_describe_base import ROIExtractionProfile
+from PartSegCore.analysis.calculation_plan import (
+    BaseCalculation,
+    CalculationPlan,
+    CalculationTree,
+    MaskCreate,
+    MaskIntersection,
+    MaskMapper,
+    MaskSum,
+    MaskUse,
+    Operations,
+)
+from PartSegCore.json_hooks import PartSegEncoder
+
+#: key of state (mask, ROI) at beginning of calculation
+ROOT_KEY = "root"
+
+
+def operation_key(operation: Any) -> str:
+    """
+    Serialize part of operation which has influence on its result.
+    Names of segmentation profiles and masks are skipped.
+    """
+    if isinstance(operation, ROIExtractionProfile):
+        operation = {"algorithm": operation.algorithm, "values": operation.values}
+    elif isinstance(operation, MaskCreate):
+        operation = operation.mask_property
+    return json.dumps(operation, cls=PartSegEncoder, sort_keys=True)
+
+
+def node_key(*parts: str) -> str:
+    """Combine parts of key into one"""
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+class CompiledPlan:
+    """
+    Keys of steps of calculation plan producing ROI or mask.
+
+    :param plan: calculation plan
+    """
+
+    def __init__(self, plan: CalculationPlan):
+        self.keys: Dict[int, str] = {}
+        self.counts: Counter = Counter()
+        self._reused_mask = plan.get_reused_mask()
+        self._named_mask: Dict[str, str] = {}
+        self._visit(plan.execution_tree.children, ROOT_KEY, ROOT_KEY)
+
+    def _add(self, node: CalculationTree, key: str):
+        self.keys[id(node)] = key
+        self.counts[key] += 1
+
+    def _visit(self, nodes: Iterable[CalculationTree], mask_key: str, roi_key: str):
+        for node in nodes:
+            operation = node.operation
+            if isinstance(operation, MaskMapper):
+                key = node_key("mask_file", operation_key(operation))
+                self._add(node, key)
+                self._visit(node.children, key, roi_key)
+            elif isinstance(operation, ROIExtractionProfile):
+                key = node_key("roi", operation_key(operation), mask_key)
+                self._add(node, key)
+                self._visit(node.children, mask_key, key)
+            elif isinstance(operation, MaskCreate):
+                key = node_key("mask", operation_key(operation), roi_key, mask_key)
+                self._add(node, key)
+                if operation.name in self._reused_mask:
+                    self._named_mask[operation.name] = key
+                self._visit(node.children, key, roi_key)
+            elif isinstance(operation, MaskUse):
+                self._visit(node.children, self._get_named_mask(operation.name), roi_key)
+            elif isinstance(operation, (MaskSum, MaskIntersection)):
+                key = node_key(
+                    type(operation).__name__,
+                    self._get_named_mask(operation.mask1),
+                    self._get_named_mask(operation.mask2),
+                )
+                self._visit(node.children, key, roi_key)
+            elif isinstance(operation, Operations):  # pragma: no cover
+                self._visit(node.children, mask_key, roi_key)
+
+    def _get_named_mask(self, name: str) -> str:
+        return self._named_mask.get(name, node_key("mask_use", name))
+
+    def shared_key(self, node: CalculationTree) -> Optional[str]:
+        """
+        Key of step if its result could be reused by other step of plan, otherwise None.
+        """
+        key = self.keys.get(id(node))
+        if key is not None and self.counts[key] > 1:
+            return key
+        return None
+
+
+_compiled_plans: "weakref.WeakKeyDictionary[BaseCalculation, CompiledPlan]" = weakref.WeakKeyDictionary()
+_compiled_plans_lock = Lock()
+
+
+def compiled_plan_for(calculation: BaseCalculation) -> CompiledPlan:
+    """
+    Get compiled plan of calculation. Plan is compiled on first call for given calculation object
+    and reused for next files of calculation, until calculation is garbage collected.
+    """
+    with _compiled_plans_lock:
+        if calculation not in _compiled_plans:
+            _compiled_plans[calculation] = CompiledPlan(calculation.calculation_plan)
+        return _compiled_plans[calculation]
+
+
+class StepCache:
+    """
+    Results of repeated steps of plan calculated for single file.
+    Result is dropped after it is used by last step with the same key.
+
+    :param compiled_plan: compiled plan of calculation
+    """
+
+    def __init__(self, compiled_plan: CompiledPlan):
+        self.compiled_plan = compiled_plan
+        self._data: Dict[str, Any] = {}
+        self._remaining: Dict[str, int] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get result of step or None if it is not calculated yet"""
+        if key not in self._data:
+            return None
+        value = self._data[key]
+        self._remaining[key] -= 1
+        if self._remaining[key] <= 0:
+            del self._data[key]
+            del self._remaining[key]
+        return value
+
+    def put(self, key: str, value: Any):
+        """Store result of step for other steps with the same key"""
+        remaining = self.compiled_plan.counts[key] - 1
+        if remaining > 0:
+            self._data[key] = value
+            self._remaining[key] = remaining
+
+    def __len__(self):
+        return len(self._data)
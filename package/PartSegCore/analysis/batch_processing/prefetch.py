@@ -0,0 +1,94 @@
+"""
+This module contains read-ahead of input data of batch tasks.
+
+:py:class:`.BatchWorker` could take tasks in advance of currently calculated one
+and call ``prefetch`` function of work for them. For batch calculation it is
+:py:func:`.prefetch_calculation` which uses :py:class:`Prefetcher` to load image
+(and masks) of next files in background thread while current file is processed.
+"""
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class Prefetcher:
+    """
+    Load data in background threads. Data are identified by keys and are expected to be
+    taken (:py:meth:`take`) in order of scheduling (:py:meth:`prefetch`).
+    Data scheduled before taken one, which were not taken, are dropped.
+
+    :param workers: number of background threads
+    """
+
+    def __init__(self, workers: int = 1):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._data: "OrderedDict[Hashable, Tuple[Future, int]]" = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def memory(self) -> int:
+        """Estimated memory (in bytes) of scheduled and not taken data"""
+        with self._lock:
+            return sum(size for _, size in self._data.values())
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def prefetch(self, key: Hashable, size: int, memory_limit: Optional[int], fun: Callable[..., Any], *args) -> bool:
+        """
+        Schedule loading of data in background.
+
+        :param key: identifier of data
+        :param size: estimated memory footprint of data (in bytes)
+        :param memory_limit: if not None then data are not scheduled when total
+            memory of not taken data would exceed this limit
+        :param fun: function used to load data, called with ``args``
+        :return: if data are scheduled or already present
+        """
+        if key in self._data:
+            return True
+        if memory_limit is not None and self.memory + size > memory_limit:
+            logging.debug(f"Prefetch of {key} skipped because of memory limit")
+            return False
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="prefetch")
+        future = self._executor.submit(fun, *args)
+        with self._lock:
+            self._data[key] = future, size
+        return True
+
+    def take(self, key: Hashable) -> Optional[Future]:
+        """
+        Take data scheduled with given key. Data scheduled before it are dropped.
+
+        :param key: identifier of data
+        :return: future with data or None if data was not scheduled
+        """
+        with self._lock:
+            if key not in self._data:
+                return None
+            while True:
+                data_key, (future, _) = self._data.popitem(last=False)
+                if data_key == key:
+                    return future
+                future.cancel()
+
+    def clear(self):
+        """Drop all scheduled data"""
+        with self._lock:
+            for future, _ in self._data.values():
+                future.cancel()
+            self._data.clear()
+
+    def close(self):
+        """Drop all data and stop background threads"""
+        self.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,498 @@
+"""
+This module contains executor which distributes batch tasks between worker daemons on other machines.
+
+Worker daemon (:py:class:`RemoteWorkerServer`) is started on each machine with::
+
+    PARTSEG_BATCH_AUTHKEY=secret python -m PartSegCore.analysis.batch_processing.remote_backend --port 6100 -j 4
+
+and :py:class:`RemoteBatchManager` connected to all daemons is passed as ``executor``
+to :py:class:`.CalculationManager`. Daemon calculates tasks using local :py:class:`.BatchManager`.
+Processed files need to be available under the same path on all machines (for example on shared drive).
+
+Communication use :py:mod:`multiprocessing.connection` over TCP. Messages are pickled,
+so daemon should be reachable only from trusted network. Both sides need the same authentication key
+which is used for HMAC based handshake.
+
+Manager sends to each daemon at most ``tasks_per_worker`` tasks per its worker.
+If connection with daemon is lost, then its unfinished tasks are sent to other daemons.
+
+.. graphviz::
+
+   digraph foo {
+      "RemoteBatchManager" -> "RemoteWorkerServer"[arrowhead="crow"];
+      "RemoteWorkerServer" -> "BatchManager";
+   }
+
+"""
+import argparse
+import itertools
+import logging
+import os
+import pickle  # nosec
+import sys
+import traceback
+import uuid
+from collections import deque
+from contextlib import suppress
+from enum import Enum
+from multiprocessing.connection import AuthenticationError, Client, Connection, Listener
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import Any, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+
+from PartSegCore.analysis.batch_processing.parallel_backend import BatchExecutor, BatchManager, SubprocessOrder
+
+#: default port of worker daemon
+DEFAULT_PORT = 6100
+#: environment variable with authentication key
+AUTHKEY_ENV = "PARTSEG_BATCH_AUTHKEY"
+
+Address = Tuple[str, int]
+
+
+class RemoteOrder(Enum):
+    """
+    Types of messages exchanged between :py:class:`RemoteBatchManager` and :py:class:`RemoteWorkerServer`
+    """
+
+    hello = 1
+    add_job = 2
+    task = 3
+    result = 4
+    cancel_job = 5
+    memory_budget = 6
+    close = 7
+
+
+class RemoteWork(NamedTuple):
+    """Global parameters of work calculated on worker daemon"""
+
+    uuid: uuid.UUID
+    global_parameters: Any
+
+
+class RemoteTaskResult(NamedTuple):
+    """Result of task marked with its identifier"""
+
+    task_id: int
+    result: Any
+
+
+class RemoteTask:
+    """
+    Wrapper of work function used by worker daemon. It marks result with task identifier,
+    so manager knows which task was finished.
+
+    :param fun: two argument function of work
+    """
+
+    def __init__(self, fun: Callable[[Any, Any], Any]):
+        self.fun = fun
+
+    def __call__(self, data: Tuple[int, Any], work: RemoteWork) -> RemoteTaskResult:
+        task_id, task_data = data
+        try:
+            return RemoteTaskResult(task_id, self.fun(task_data, work.global_parameters))
+        except Exception as e:  # pylint: disable=W0703
+            return RemoteTaskResult(task_id, (-1, [(e, traceback.extract_tb(e.__traceback__))]))
+
+    def prefetch(self, data: Tuple[int, Any], work: RemoteWork, memory_limit: Optional[int]):
+        """Forward prefetch of task data to work function, if it supports it"""
+        prefetch = getattr(self.fun, "prefetch", None)
+        if prefetch is not None:
+            prefetch(data[1], work.global_parameters, memory_limit)
+
+
+def get_authkey(authkey: Optional[Union[str, bytes]] = None) -> bytes:
+    """
+    Get authentication key. If not provided then it is read from :py:data:`AUTHKEY_ENV` environment variable.
+
+    :raises ValueError: if key is empty
+    """
+    if authkey is None:
+        authkey = os.environ.get(AUTHKEY_ENV, "")
+    if isinstance(authkey, str):
+        authkey = authkey.encode()
+    if not authkey:
+        raise ValueError(f"Authentication key is required, set {AUTHKEY_ENV} environment variable")
+    return authkey
+
+
+def parse_address(address: Union[str, Address]) -> Address:
+    """
+    Parse address in ``host:port`` or ``host`` format. If port is omitted :py:data:`DEFAULT_PORT` is used.
+    """
+    if isinstance(address, tuple):
+        return address
+    host, _, port = address.rpartition(":")
+    if not host:
+        return port, DEFAULT_PORT
+    try:
+        return host.strip("[]"), int(port)
+    except ValueError:
+        raise ValueError(f"Invalid address {address}") from None
+
+
+class RemoteNode:
+    """
+    Connection to single worker daemon. Messages from daemon are read in separate thread
+    and put in queue as pair of node and message. ``None`` message means that connection was lost.
+
+    :param address: address of worker daemon
+    :param authkey: authentication key
+    :param message_queue: queue for received messages
+    """
+
+    def __init__(self, address: Address, authkey: bytes, message_queue: Queue):
+        self.address = address
+        self.connection: Connection = Client(address, authkey=authkey)
+        order, self.number_of_workers = self.connection.recv()
+        if order != RemoteOrder.hello:  # pragma: no cover
+            self.connection.close()
+            raise ConnectionError(f"Unexpected message from {address}")
+        self.in_progress: Dict[int, Tuple[uuid.UUID, Any, int]] = {}
+        self.known_works: Set[uuid.UUID] = set()
+        self.alive = True
+        self._lock = Lock()
+        self._message_queue = message_queue
+        self._thread = Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        try:
+            while True:
+                self._message_queue.put((self, self.connection.recv()))
+        except (EOFError, OSError):
+            self._message_queue.put((self, None))
+
+    def send(self, message) -> bool:
+        """
+        Send message to daemon
+
+        :return: False if connection is lost
+        """
+        with self._lock:
+            if not self.alive:
+                return False
+            try:
+                self.connection.send(message)
+            except (OSError, ValueError):
+                self.alive = False
+        return self.alive
+
+    def close(self):
+        with self._lock:
+            if self.alive:
+                with suppress(OSError, ValueError):
+                    self.connection.send(RemoteOrder.close)
+            self.alive = False
+            self.connection.close()
+
+
+class RemoteBatchManager(BatchExecutor):
+    """
+    Executor which distributes tasks between worker daemons (:py:class:`RemoteWorkerServer`).
+
+    :param addresses: addresses of worker daemons as ``host:port`` strings or tuples
+    :param authkey: authentication key, if not provided then read from :py:data:`AUTHKEY_ENV`
+    :param tasks_per_worker: maximum number of tasks sent to daemon for each of its workers
+    :raises ConnectionError: if connection to all daemons failed
+    """
+
+    def __init__(
+        self,
+        addresses: Iterable[Union[str, Address]],
+        authkey: Optional[Union[str, bytes]] = None,
+        tasks_per_worker: int = 2,
+    ):
+        authkey = get_authkey(authkey)
+        self.tasks_per_worker = tasks_per_worker
+        self.message_queue = Queue()
+        self.nodes: List[RemoteNode] = []
+        for address in addresses:
+            address = parse_address(address)
+            try:
+                self.nodes.append(RemoteNode(address, authkey, self.message_queue))
+            except (OSError, EOFError, AuthenticationError) as e:
+                logging.warning(f"Cannot connect to worker daemon {address}: {e}")
+        if not self.nodes:
+            raise ConnectionError("Cannot connect to any worker daemon")
+        self.calculation_dict: Dict[uuid.UUID, Tuple[Any, Callable[[Any, Any], Any]]] = {}
+        self.canceled_works = set()
+        self.pending: Deque[Tuple[int, uuid.UUID, Any, int]] = deque()
+        self._pending_results = []
+        self._task_counter = itertools.count()
+        self._memory_budget = None
+        self.work_task = 0
+
+    @property
+    def alive_nodes(self) -> List[RemoteNode]:
+        return [node for node in self.nodes if node.alive]
+
+    def add_work(
+        self,
+        individual_parameters_list: List,
+        global_parameters,
+        fun: Callable[[Any, Any], Any],
+        sizes: Optional[List[int]] = None,
+    ) -> uuid.UUID:
+        task_uuid = global_parameters.uuid if hasattr(global_parameters, "uuid") else uuid.uuid4()
+        self.calculation_dict[task_uuid] = global_parameters, fun
+        self.canceled_works.discard(task_uuid)
+        if sizes is None:
+            sizes = [0] * len(individual_parameters_list)
+        for el, size in zip(individual_parameters_list, sizes):
+            self.pending.append((next(self._task_counter), task_uuid, el, size))
+        self.work_task += len(individual_parameters_list)
+        self._dispatch()
+        return task_uuid
+
+    def _dispatch(self):
+        while self.pending:
+            nodes = [node for node in self.alive_nodes if self._free_slots(node) > 0]
+            if not nodes:
+                if not self.alive_nodes:
+                    self._fail_pending()
+                return
+            node = max(nodes, key=self._free_slots)
+            task_id, task_uuid, data, size = self.pending.popleft()
+            node.in_progress[task_id] = task_uuid, data, size
+            if task_uuid not in node.known_works:
+                node.known_works.add(task_uuid)
+                node.send((RemoteOrder.add_job, (task_uuid, self.calculation_dict[task_uuid])))
+            if not node.send((RemoteOrder.task, (task_id, task_uuid, data, size))):
+                self._node_lost(node)
+
+    def _free_slots(self, node: RemoteNode) -> int:
+        return node.number_of_workers * self.tasks_per_worker - len(node.in_progress)
+
+    def _node_lost(self, node: RemoteNode):
+        if node.in_progress:
+            logging.warning(f"Connection with worker daemon {node.address} lost, {len(node.in_progress)} tasks resent")
+        node.close()
+        for task_id, (task_uuid, data, size) in sorted(node.in_progress.items(), reverse=True):
+            if task_uuid in self.canceled_works:
+                self._pending_results.append((task_uuid, (-1, [SubprocessOrder.cancel_job])))
+            else:
+                self.pending.appendleft((task_id, task_uuid, data, size))
+        node.in_progress.clear()
+
+    def _fail_pending(self):
+        error = ConnectionError("Connection with all worker daemons lost")
+        while self.pending:
+            _task_id, task_uuid, _data, _size = self.pending.popleft()
+            self._pending_results.append((task_uuid, (-1, [(error, traceback.StackSummary())])))
+
+    def get_result(self) -> List[Tuple[uuid.UUID, Any]]:
+        res, self._pending_results = self._pending_results, []
+        with suppress(Empty):
+            while True:
+                node, message = self.message_queue.get_nowait()
+                if message is None:
+                    self._node_lost(node)
+                    continue
+                task_uuid, task_id, result = message[1]
+                if task_id is None:
+                    # canceled task, daemon does not know its identifier
+                    task_id = next((k for k, v in node.in_progress.items() if v[0] == task_uuid), None)
+                if node.in_progress.pop(task_id, None) is None:
+                    continue  # result of task already resent to other daemon
+                if task_uuid in self.canceled_works:
+                    result = (-1, [SubprocessOrder.cancel_job])
+                res.append((task_uuid, result))
+        self._dispatch()
+        res.extend(self._pending_results)
+        self._pending_results = []
+        self.work_task -= len(res)
+        return res
+
+    def cancel_work(self, global_parameters):
+        task_uuid = global_parameters.uuid
+        if self.calculation_dict.pop(task_uuid, None) is None:
+            return
+        self.canceled_works.add(task_uuid)
+        for task in [x for x in self.pending if x[1] == task_uuid]:
+            self.pending.remove(task)
+            self._pending_results.append((task_uuid, (-1, [SubprocessOrder.cancel_job])))
+        for node in self.alive_nodes:
+            if task_uuid in node.known_works:
+                node.send((RemoteOrder.cancel_job, task_uuid))
+
+    def kill_jobs(self):
+        """Close connections with daemons. Unfinished tasks are reported as canceled."""
+        for node in self.nodes:
+            for task_uuid, _data, _size in node.in_progress.values():
+                self._pending_results.append((task_uuid, (-1, [SubprocessOrder.cancel_job])))
+            node.in_progress.clear()
+            node.close()
+        while self.pending:
+            self._pending_results.append((self.pending.popleft()[1], (-1, [SubprocessOrder.cancel_job])))
+
+    def close(self):
+        """Close connections with daemons"""
+        for node in self.nodes:
+            node.close()
+
+    def set_number_of_process(self, num: int):
+        """Number of workers is set when worker daemon is started, so this call is ignored."""
+
+    def set_memory_budget(self, memory_budget: Optional[int]):
+        """Set memory budget (in bytes) of each worker daemon"""
+        self._memory_budget = memory_budget
+        for node in self.alive_nodes:
+            node.send((RemoteOrder.memory_budget, memory_budget))
+
+    @property
+    def memory_budget(self) -> Optional[int]:
+        return self._memory_budget
+
+    @property
+    def has_work(self) -> bool:
+        return self.work_task > 0
+
+
+class RemoteWorkerServer:
+    """
+    Worker daemon which calculates tasks received from :py:class:`RemoteBatchManager`.
+    Connections are served one by one, tasks are calculated by local :py:class:`.BatchManager`.
+
+    :param address: address to listen on, port 0 means any free port
+    :param authkey: authentication key, if not provided then read from :py:data:`AUTHKEY_ENV`
+    :param workers: number of worker processes
+    :param shared_memory_min_size: passed to :py:class:`.BatchManager`
+    :param memory_budget: passed to :py:class:`.BatchManager`
+    :param prefetch_depth: passed to :py:class:`.BatchManager`
+    :param prefetch_memory: passed to :py:class:`.BatchManager`
+    """
+
+    def __init__(
+        self,
+        address: Address = ("", DEFAULT_PORT),
+        authkey: Optional[Union[str, bytes]] = None,
+        workers: int = 1,
+        shared_memory_min_size: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+        prefetch_depth: int = 0,
+        prefetch_memory: Optional[int] = None,
+    ):
+        self.listener = Listener(address, authkey=get_authkey(authkey))
+        self.workers = workers
+        self.shared_memory_min_size = shared_memory_min_size
+        self.memory_budget = memory_budget
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_memory = prefetch_memory
+
+    @property
+    def address(self) -> Address:
+        return self.listener.address
+
+    def serve_forever(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError) as e:
+                logging.warning(f"Rejected connection: {e}")
+                continue
+            with connection:
+                self.serve_connection(connection)
+
+    def serve_connection(self, connection: Connection):
+        """Calculate tasks received by connection until it is closed"""
+        manager = BatchManager(
+            shared_memory_min_size=self.shared_memory_min_size,
+            memory_budget=self.memory_budget,
+            prefetch_depth=self.prefetch_depth,
+            prefetch_memory=self.prefetch_memory,
+        )
+        manager.set_number_of_process(self.workers)
+        works: Dict[uuid.UUID, Tuple[RemoteWork, RemoteTask]] = {}
+        try:
+            connection.send((RemoteOrder.hello, self.workers))
+            while True:
+                if connection.poll(0.05):
+                    while connection.poll():
+                        if not self.process_message(manager, works, connection.recv()):
+                            return
+                if manager.has_work:
+                    for task_uuid, result in manager.get_result():
+                        self.send_result(connection, task_uuid, result)
+        except (EOFError, OSError):
+            logging.info("Connection closed")
+        finally:
+            manager.kill_jobs()
+
+    @staticmethod
+    def process_message(manager: BatchManager, works: Dict[uuid.UUID, Tuple[RemoteWork, RemoteTask]], message) -> bool:
+        """
+        Apply message received from :py:class:`RemoteBatchManager`
+
+        :return: False if connection should be finished
+        """
+        if message == RemoteOrder.close:
+            return False
+        order, data = message
+        if order == RemoteOrder.add_job:
+            task_uuid, (global_parameters, fun) = data
+            works[task_uuid] = RemoteWork(task_uuid, global_parameters), RemoteTask(fun)
+        elif order == RemoteOrder.task:
+            task_id, task_uuid, task_data, size = data
+            work, fun = works[task_uuid]
+            manager.add_work([(task_id, task_data)], work, fun, [size])
+        elif order == RemoteOrder.cancel_job:
+            manager.cancel_work(RemoteWork(data, None))
+        elif order == RemoteOrder.memory_budget:
+            manager.set_memory_budget(data)
+        return True
+
+    @staticmethod
+    def send_result(connection: Connection, task_uuid: uuid.UUID, result):
+        task_id = None
+        if isinstance(result, RemoteTaskResult):
+            task_id, result = result
+        try:
+            connection.send((RemoteOrder.result, (task_uuid, task_id, result)))
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            # result contains object which cannot be pickled (like some exceptions)
+            error = RuntimeError(f"Cannot send result: {e}")
+            connection.send((RemoteOrder.result, (task_uuid, task_id, (-1, [(error, traceback.StackSummary())]))))
+
+    def close(self):
+        self.listener.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m PartSegCore.analysis.batch_processing.remote_backend",
+        description=f"PartSeg batch worker daemon. Authentication key is read from {AUTHKEY_ENV}.",
+    )
+    parser.add_argument("--host", default="", help="address to listen on, default all interfaces")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--memory-budget", type=float, help="memory budget for parallel calculation in MB")
+    parser.add_argument("--shared-memory-min-size", type=int)
+    parser.add_argument("--prefetch-depth", type=int, default=0, help="number of files loaded in advance by worker")
+    parser.add_argument("--prefetch-memory", type=float, help="memory limit of files loaded in advance in MB")
+    args = parser.parse_args(argv)
+    try:
+        server = RemoteWorkerServer(
+            (args.host, args.port),
+            workers=args.workers,
+            shared_memory_min_size=args.shared_memory_min_size,
+            memory_budget=int(args.memory_budget * 2**20) if args.memory_budget is not None else None,
+            prefetch_depth=args.prefetch_depth,
+            prefetch_memory=int(args.prefetch_memory * 2**20) if args.prefetch_memory is not None else None,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Listen on {server.address[0] or '*'}:{server.address[1]} with {args.workers} workers", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
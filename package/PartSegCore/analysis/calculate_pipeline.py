@@ -11,6 +11,7 @@ from PartSegCore.project_info import HistoryElement
 from PartSegCore.roi_info import ROIInfo
 from PartSegCore.segmentation import RestartableAlgorithm
 from PartSegCore.segmentation.algorithm_base import AdditionalLayerDescription, ROIExtractionResult
+from PartSegCore.segmentation.time_lapse import segment_time_lapse
 from PartSegImage import Image
 
 
@@ -51,9 +52,21 @@ def calculate_pipeline(image: Image, mask: typing.Optional[np.ndarray], pipeline
 
 
 def calculate_segmentation_step(
-    profile: ROIExtractionProfile, image: Image, mask: typing.Optional[np.ndarray]
+    profile: ROIExtractionProfile, image: Image, mask: typing.Optional[np.ndarray], workers: int = 1
 ) -> typing.Tuple[ROIExtractionResult, str]:
-    algorithm: RestartableAlgorithm = AnalysisAlgorithmSelection[profile.algorithm]()
+    """
+    Calculate segmentation described by profile.
+    Time-lapse images are segmented time point by time point if algorithm does not support time data
+    (see :py:func:`.segment_time_lapse`).
+
+    :param workers: number of time points segmented in parallel
+    :return: segmentation result and algorithm info text
+    """
+    algorithm_class = AnalysisAlgorithmSelection[profile.algorithm]
+    if image.is_time and not algorithm_class.support_time():
+        result = segment_time_lapse(algorithm_class, profile.values, image, mask, workers=workers)
+        return result, result.info_text
+    algorithm: RestartableAlgorithm = algorithm_class()
     algorithm.set_image(image)
     algorithm.set_mask(mask)
     parameters = profile.values
@@ -376,6 +376,19 @@ class MeasurementMethodBase(AlgorithmDescribeBase, ABC):
         """
         raise NotImplementedError()
 
+    @classmethod
+    def calculate_components_property(cls, components: np.ndarray, **kwargs) -> Optional[np.ndarray]:
+        """
+        Optional function for calculating measurement for all components in one pass over data.
+        It is used for per component measurements instead of calling :py:meth:`calculate_property`
+        separately for each component. Get same arguments as :py:meth:`calculate_property`
+        (with arrays not clipped to component)
+
+        :param components: numbers of components for which measurement should be calculated
+        :return: array with measurement value for each component or None if not supported
+        """
+        return None
+
     @classmethod
     def get_starting_leaf(cls) -> Leaf:
         """This leaf is put on default list"""
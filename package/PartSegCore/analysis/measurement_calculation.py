@@ -1,6 +1,9 @@
+import os
+import threading
 import warnings
 from collections import OrderedDict
-from contextlib import suppress
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, suppress
 from enum import Enum
 from functools import reduce
 from math import pi
@@ -9,8 +12,10 @@ from typing import (
     Callable,
     Dict,
     Generator,
+    Hashable,
     Iterator,
     List,
+    Mapping,
     MutableMapping,
     NamedTuple,
     Optional,
@@ -25,7 +30,10 @@ import pandas as pd
 import SimpleITK
 from mahotas.features import haralick
 from nme import register_class, rename_key
+from pydantic import BaseModel as PydanticBaseModel
 from pydantic import Field
+from scipy import ndimage
+from scipy.spatial import ConvexHull, cKDTree
 from scipy.spatial.distance import cdist
 from sympy import Rational, symbols
 
@@ -35,12 +43,17 @@ from PartSegImage import Channel, Image
 
 from .. import autofit as af
 from ..algorithm_describe_base import Register, ROIExtractionProfile
-from ..mask_partition_utils import BorderRim, MaskDistanceSplit
+from ..mask_partition_utils import BorderRim, MaskDistanceSplit, distance_from_background
 from ..roi_info import ROIInfo
 from ..universal_const import UNIT_SCALE, Units
 from .calculate_pipeline import calculate_segmentation_step
 from .measurement_base import AreaType, Leaf, MeasurementEntry, MeasurementMethodBase, Node, PerComponent
 
+try:
+    from scipy.spatial import QhullError
+except ImportError:  # pragma: no cover
+    from scipy.spatial.qhull import QhullError
+
 # TODO change image to channel in signature of measurement calculate_property
 
 NO_COMPONENT = -1
@@ -265,6 +278,188 @@ class MeasurementResult(MutableMapping[str, MeasurementResultType]):
         return res
 
 
+class MeasurementCacheKey(NamedTuple):
+    """Structured, hashable key of cached measurement calculation"""
+
+    method: str
+    parameters: Hashable
+    area: Optional[AreaType]
+    per_component: Optional[PerComponent]
+    channel: Any
+    component: int
+
+
+class MeasurementCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    max_size: int
+    current_size: int
+
+
+def canonical_parameters(value: Any) -> Hashable:
+    """
+    Convert measurement parameters to hashable representation which could be used as part of cache key.
+    Models and dicts are converted to tuples of sorted items, sequences to tuples.
+    """
+    if isinstance(value, PydanticBaseModel):
+        return (type(value).__qualname__, tuple((k, canonical_parameters(v)) for k, v in value))
+    if isinstance(value, Mapping):
+        return tuple(sorted(((str(k), canonical_parameters(v)) for k, v in value.items()), key=lambda x: x[0]))
+    if isinstance(value, (list, tuple)):
+        return tuple(canonical_parameters(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return value.dtype.str, value.shape, value.tobytes()
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def measurement_cache_key(
+    fun: Union[Callable, MeasurementMethodBase],
+    arguments: Any,
+    area: Optional[AreaType],
+    per_component: Optional[PerComponent],
+    channel: Any,
+    components_num: int,
+) -> MeasurementCacheKey:
+    """
+    Calculate key for properly cache measurements result.
+
+    :param fun: method for which key should be calculated
+    :param arguments: its additional arguments
+    :param area: type of area
+    :param per_component: If it is per component
+    :param channel: channel number on which calculation is performed
+    :param components_num: number of component or NO_COMPONENT
+    :return: unique key for such set of arguments
+    """
+    fun_name = f"{fun.__module__}.{fun.__qualname__}" if hasattr(fun, "__module__") else fun.__qualname__
+    return MeasurementCacheKey(
+        fun_name, canonical_parameters(arguments), area, per_component, channel, int(components_num)
+    )
+
+
+def hash_fun_call_name(
+    fun: Union[Callable, MeasurementMethodBase],
+    arguments: Dict,
+    area: AreaType,
+    per_component: PerComponent,
+    channel: Channel,
+    components_num: int,
+) -> str:
+    """
+    Calculate string for properly cache measurements result.
+    Deprecated, measurement cache uses keys from :py:func:`measurement_cache_key`.
+
+    :param fun: method for which hash string should be calculated
+    :param arguments: its additional arguments
+    :param area: type of rea
+    :param per_component: If it is per component
+    :param channel: channel number on which calculation is performed
+    :return: unique string for such set of arguments
+    """
+    warnings.warn(
+        "hash_fun_call_name is deprecated and its result is not used by measurement cache. "
+        "Please use measurement_cache_key instead",
+        category=FutureWarning,
+        stacklevel=2,
+    )
+    if hasattr(fun, "__module__"):
+        fun_name = f"{fun.__module__}.{fun.__name__}"
+    else:
+        fun_name = fun.__name__
+    return f"{fun_name}: {arguments} # {area} & {per_component} * {channel} ^ {components_num}"
+
+
+class MeasurementCache(MutableMapping):
+    """
+    Bounded cache of intermediate measurement results shared between measurements of one
+    :py:meth:`MeasurementProfile.calculate` call. When ``max_size`` is exceeded then least recently used
+    entries are removed. Use :py:meth:`get_or_calculate` to collect hit and miss statistics.
+
+    :param max_size: maximum number of cached entries
+    """
+
+    def __init__(self, max_size: int = 4096):
+        if max_size < 1:
+            raise ValueError("max_size need to be positive")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = self._data[key]
+            self._data.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_or_calculate(self, key: Hashable, fun: Callable[[], Any]) -> Any:
+        """
+        Get value from cache or calculate it with ``fun`` and store.
+        Value is calculated outside of lock, so in multithreading usage it may be calculated more than once.
+
+        :param key: key of value, see :py:func:`measurement_cache_key`
+        :param fun: function without arguments used to calculate value on cache miss
+        """
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                return self[key]
+            self.misses += 1
+        value = fun()
+        self[key] = value
+        return value
+
+    def cache_info(self) -> MeasurementCacheInfo:
+        with self._lock:
+            return MeasurementCacheInfo(self.hits, self.misses, self.max_size, len(self._data))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def cache_get_or_calculate(cache: Optional[MutableMapping], key: Hashable, fun: Callable[[], Any]) -> Any:
+    """
+    Helper function to use :py:meth:`MeasurementCache.get_or_calculate` also on plain mappings.
+    If cache is None then value is always calculated.
+    """
+    if cache is None:
+        return fun()
+    if isinstance(cache, MeasurementCache):
+        return cache.get_or_calculate(key, fun)
+    if key not in cache:
+        cache[key] = fun()
+    return cache[key]
+
+
 class MeasurementProfile(BaseModel):
     name: str
     chosen_fields: List[MeasurementEntry]
@@ -366,6 +561,7 @@ class MeasurementProfile(BaseModel):
             kw["channel_num"] = -1
 
         kw["_area"] = node.area
+        kw["_area_type"] = area_type
         kw["_per_component"] = node.per_component
         kw["_cache"] = True  # TODO remove cache argument
         kw["area_array"] = kw[area_type_dict[area_type]]
@@ -395,7 +591,7 @@ class MeasurementProfile(BaseModel):
         im_bounds = list(bounds)
         image: Image = kw["image"]
         im_bounds.insert(image.time_pos, slice(None))
-        kw2["image"] = image.cut_image(tuple(im_bounds))
+        kw2["image"] = image.cut_image(tuple(im_bounds), frame=0, view=True)
         for name in ["channel", "segmentation", "roi", "mask"] + [f"channel_{num}" for num in self.get_channels_num()]:
             if kw[name] is not None:
                 kw2[name] = kw[name][bounds]
@@ -414,43 +610,50 @@ class MeasurementProfile(BaseModel):
             return method.calculate_property(**kw)
         # TODO use cache for per component calculate
         # kw["_cache"] = False
-        val = []
         if method.area_type(node.area) == AreaType.ROI and node.per_component != PerComponent.Per_Mask_component:
             components = segmentation_mask_map.roi_components
         else:
             components = segmentation_mask_map.mask_components
-        for i in components:
-            kw2 = self._clip_arrays(kw, node, method, i)
-            val.append(method.calculate_property(**kw2))
-        val = np.array(val)
+        val = method.calculate_components_property(components=np.asarray(components), **kw)
+        if val is None:
+            val = np.array(
+                self._map_components(
+                    lambda i: method.calculate_property(**self._clip_arrays(kw, node, method, i)),
+                    components,
+                    kw.get("_executor"),
+                )
+            )
         if node.per_component == PerComponent.Mean:
             val = np.mean(val) if val.size else 0
         return val
 
+    @staticmethod
+    def _map_components(fun: Callable[[int], Any], components, executor: Optional[ThreadPoolExecutor]) -> list:
+        """Apply function to each component. Order of results is same as order of components."""
+        if executor is None or len(components) < 2:
+            return [fun(i) for i in components]
+        return list(executor.map(fun, components))
+
     def _calculate_leaf(
-        self, node: Leaf, segmentation_mask_map: ComponentsInfo, help_dict: dict, kwargs: dict
+        self, node: Leaf, segmentation_mask_map: ComponentsInfo, help_dict: MutableMapping, kwargs: dict
     ) -> Tuple[Union[float, np.ndarray], symbols, AreaType]:
         method: MeasurementMethodBase = MEASUREMENT_DICT[node.name]
 
-        hash_str = hash_fun_call_name(
-            method, node.parameters, node.area, node.per_component, node.channel, NO_COMPONENT
-        )
+        key = measurement_cache_key(method, node.parameters, node.area, node.per_component, node.channel, NO_COMPONENT)
         area_type = method.area_type(node.area)
         if node.per_component == PerComponent.Per_Mask_component:
             area_type = AreaType.Mask
-        if hash_str in help_dict:
-            val = help_dict[hash_str]
-        else:
-            kwargs["help_dict"] = help_dict
-            val = self._calculate_leaf_value(node, segmentation_mask_map, kwargs)
-            help_dict[hash_str] = val
+        kwargs["help_dict"] = help_dict
+        val = cache_get_or_calculate(
+            help_dict, key, lambda: self._calculate_leaf_value(node, segmentation_mask_map, kwargs)
+        )
         unit: symbols = method.get_units(3) if kwargs["image"].is_stack else method.get_units(2)
         if node.power != 1:
             return pow(val, node.power), pow(unit, Rational(node.power)), area_type
         return val, unit, area_type
 
     def _calculate_node(
-        self, node: Node, segmentation_mask_map: ComponentsInfo, help_dict: dict, kwargs: dict
+        self, node: Node, segmentation_mask_map: ComponentsInfo, help_dict: MutableMapping, kwargs: dict
     ) -> Tuple[Union[float, np.ndarray], symbols, AreaType]:
         if node.op != "/":
             raise ValueError(f"Wrong measurement: {node}")
@@ -483,14 +686,15 @@ class MeasurementProfile(BaseModel):
         # TODO check this
 
     def calculate_tree(
-        self, node: Union[Node, Leaf], segmentation_mask_map: ComponentsInfo, help_dict: dict, kwargs: dict
+        self, node: Union[Node, Leaf], segmentation_mask_map: ComponentsInfo, help_dict: MutableMapping, kwargs: dict
     ) -> Tuple[Union[float, np.ndarray], symbols, AreaType]:
         """
         Main function for calculation tree of measurements. It is executed recursively
 
         :param node: measurement to calculate
         :param segmentation_mask_map: map from mask segmentation components to mask components. Needed for division
-        :param help_dict: dict to cache calculation result. It reduce recalculations of same measurements.
+        :param help_dict: cache of calculation results, see :py:class:`MeasurementCache`.
+            It reduce recalculations of same measurements.
         :param kwargs: additional info needed by measurements
         :return: measurement value
         """
@@ -554,6 +758,8 @@ class MeasurementProfile(BaseModel):
         range_changed: Callable[[int, int], Any] = empty_fun,
         step_changed: Callable[[int], Any] = empty_fun,
         time: int = 0,
+        cache: Optional[MeasurementCache] = None,
+        workers: Optional[int] = 1,
     ) -> MeasurementResult:
         """
         Calculate measurements on given set of parameters
@@ -564,6 +770,11 @@ class MeasurementProfile(BaseModel):
         :param range_changed: callback function to set information about steps range
         :param step_changed: callback function fo set information about steps done
         :param time: which data point should be measured
+        :param cache: cache for intermediate results. If not provided new one is created.
+            Pass own instance to control its size or to inspect its statistics.
+            Cache is cleared at the beginning of calculation.
+        :param workers: number of threads used to calculate per component measurements.
+            If None then number of cpu is used. Order of results does not depend on this value.
         :return: measurements
         """
 
@@ -578,6 +789,8 @@ class MeasurementProfile(BaseModel):
                 result_units=result_units,
                 segmentation_mask_map=segmentation_mask_map,
                 time=time,
+                cache=cache,
+                workers=workers,
             ),
             start=1,
         ):
@@ -594,6 +807,8 @@ class MeasurementProfile(BaseModel):
         result_units: Units,
         segmentation_mask_map: ComponentsInfo,
         time: int = 0,
+        cache: Optional[MeasurementCache] = None,
+        workers: Optional[int] = 1,
     ) -> Generator[MeasurementResultInputType, None, None]:
         """
         Calculate measurements on given set of parameters
@@ -603,6 +818,10 @@ class MeasurementProfile(BaseModel):
         :param result_units: units which should be used to present results.
         :param segmentation_mask_map: information which component of roi belongs to which mask component.
         :param time: which data point should be measured
+        :param cache: cache for intermediate results. If not provided new one is created.
+            Cache is cleared at the beginning of calculation.
+        :param workers: number of threads used to calculate per component measurements.
+            If None then number of cpu is used.
         :return: measurements
         """
 
@@ -614,7 +833,12 @@ class MeasurementProfile(BaseModel):
         if self._need_mask and image.mask is None:
             raise ValueError("measurement need mask")
         channel = image.get_channel(channel_num).astype(float)
-        cache_dict = {}
+        if cache is None:
+            cache_dict = MeasurementCache()
+        else:
+            # keys do not identify image and ROI, so results of previous calculation could not be reused
+            cache.clear()
+            cache_dict = cache
         result_scalar = UNIT_SCALE[result_units.value]
         if isinstance(roi, np.ndarray):
             roi = ROIInfo(roi).fit_to_image(image)
@@ -649,15 +873,20 @@ class MeasurementProfile(BaseModel):
             mm[kw["segmentation"] > 0] = 0
             kw["mask_without_segmentation"] = mm
 
-        for entry in self.chosen_fields:
-            name = self.name_prefix + entry.name
-            yield name, self._calc_single_field(entry, segmentation_mask_map, cache_dict, kw, result_units)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        with ExitStack() as stack:
+            if workers > 1:
+                kw["_executor"] = stack.enter_context(ThreadPoolExecutor(max_workers=workers))
+            for entry in self.chosen_fields:
+                name = self.name_prefix + entry.name
+                yield name, self._calc_single_field(entry, segmentation_mask_map, cache_dict, kw, result_units)
 
     def _calc_single_field(
         self,
         entry: MeasurementEntry,
         segmentation_mask_map: ComponentsInfo,
-        cache_dict: dict,
+        cache_dict: MutableMapping,
         additional_args: dict,
         result_units,
     ):
@@ -701,45 +930,176 @@ def calculate_main_axis(area_array: np.ndarray, channel: np.ndarray, voxel_size)
 
 
 def get_main_axis_length(
-    index: int, area_array: np.ndarray, channel: np.ndarray, voxel_size, result_scalar, _cache=False, **kwargs
+    index: int, area_array: np.ndarray, channel: np.ndarray, voxel_size, result_scalar, channel_num=None, **kwargs
 ):
-    if _cache and "_area" in kwargs and "_per_component" in kwargs and "channel_num" in kwargs:
-        help_dict: Dict = kwargs["help_dict"]
-        _area: AreaType = kwargs["_area"]
-        _per_component: PerComponent = kwargs["_per_component"]
-        hash_name = hash_fun_call_name(
-            calculate_main_axis, {}, _area, _per_component, kwargs["channel_num"], kwargs["_component_num"]
+    geometry = get_area_geometry(area_array, **kwargs)
+    return geometry.main_axis(channel, channel_num, [x * result_scalar for x in voxel_size])[index]
+
+
+class AreaGeometry:
+    """
+    Lazily calculated geometric properties of area (border, center, principal axes),
+    which are used by many measurements. Use :py:func:`get_area_geometry` to get instance
+    shared by all measurements calculated on same area.
+
+    :param area_array: array with area
+    """
+
+    def __init__(self, area_array: np.ndarray):
+        self.area_array = area_array
+        self._cache = {}
+
+    def _get(self, key, fun: Callable[[], Any]):
+        if key not in self._cache:
+            self._cache[key] = fun()
+        return self._cache[key]
+
+    @property
+    def border(self) -> np.ndarray:
+        """border of area calculated with :py:func:`get_border`"""
+        return self._get("border", lambda: get_border(self.area_array))
+
+    @property
+    def border_coordinates(self) -> np.ndarray:
+        """array of size (points_num, number of dimensions) with coordinates of border voxels"""
+        return self._get("border_coordinates", lambda: np.transpose(np.nonzero(self.border)))
+
+    def border_positions(self, scale: Sequence[float]) -> np.ndarray:
+        """
+        positions of centers of border voxels in physical units
+
+        :param scale: size of voxel for each axis of area array
+        """
+        return self._get(
+            ("border_positions", tuple(scale)), lambda: (self.border_coordinates + 0.5) * np.array(scale, dtype=float)
         )
-        if hash_name not in help_dict:
-            help_dict[hash_name] = calculate_main_axis(area_array, channel, [x * result_scalar for x in voxel_size])
-        return help_dict[hash_name][index]
 
-    return calculate_main_axis(area_array, channel, [x * result_scalar for x in voxel_size])[index]
+    def border_tree(self, scale: Sequence[float]) -> cKDTree:
+        """spatial index of :py:meth:`border_positions` for nearest neighbour queries"""
+        return self._get(("border_tree", tuple(scale)), lambda: cKDTree(self.border_positions(scale)))
 
+    def distance_from_background(self, voxel_size) -> np.ndarray:
+        """distance of area voxels from background, see :py:func:`.distance_from_background`"""
+        return self._get(
+            ("distance_from_background", tuple(voxel_size)),
+            lambda: distance_from_background(self.area_array, voxel_size),
+        )
 
-def hash_fun_call_name(
-    fun: Union[Callable, MeasurementMethodBase],
-    arguments: Dict,
-    area: AreaType,
-    per_component: PerComponent,
-    channel: Channel,
-    components_num: int,
-) -> str:
+    def geometrical_center(self, voxel_size) -> np.ndarray:
+        """center of area in physical units"""
+        return self._get(
+            ("geometrical_center", tuple(voxel_size)),
+            lambda: af.density_mass_center(self.area_array > 0, voxel_size),
+        )
+
+    def main_axis(self, channel: np.ndarray, channel_num, voxel_size) -> np.ndarray:
+        """lengths of principal axes of area weighted by channel, see :py:func:`calculate_main_axis`"""
+        return self._get(
+            ("main_axis", channel_num, tuple(voxel_size)),
+            lambda: calculate_main_axis(self.area_array, channel, voxel_size),
+        )
+
+
+def get_area_geometry(
+    area_array: np.ndarray,
+    help_dict: Optional[dict] = None,
+    _area_type: Optional[AreaType] = None,
+    _per_component: Optional[PerComponent] = None,
+    _component_num: int = NO_COMPONENT,
+    _cache: bool = False,
+    _array_name: str = "area_array",
+    **_,
+) -> AreaGeometry:
     """
-    Calculate string for properly cache measurements result.
+    Get :py:class:`AreaGeometry` for given area. If information about area is available
+    (measurement is calculated by :py:class:`MeasurementProfile`), then geometry is cached in help_dict
+    and shared between all measurements calculated on the same area and component.
 
-    :param fun: method for which hash string should be calculated
-    :param arguments: its additional arguments
-    :param area: type of rea
-    :param per_component: If it is per component
-    :param channel: channel number on which calculation is performed
-    :return: unique string for such set of arguments
+    :param area_array: array with area
+    :param help_dict: measurement calculation cache
+    :param _array_name: name of argument from which area_array is taken, to distinguish area and mask
     """
-    if hasattr(fun, "__module__"):
-        fun_name = f"{fun.__module__}.{fun.__name__}"
-    else:
-        fun_name = fun.__name__
-    return f"{fun_name}: {arguments} # {area} & {per_component} * {channel} ^ {components_num}"
+    if not _cache or help_dict is None or _area_type is None or _per_component is None:
+        return AreaGeometry(area_array)
+    key = measurement_cache_key(
+        AreaGeometry,
+        {"array": _array_name, "shape": area_array.shape},
+        _area_type,
+        _per_component,
+        Channel(-1),
+        _component_num,
+    )
+    return cache_get_or_calculate(help_dict, key, lambda: AreaGeometry(area_array))
+
+
+def get_mask_geometry(mask: np.ndarray, **kwargs) -> AreaGeometry:
+    """
+    Get :py:class:`AreaGeometry` of mask. Mask is not clipped per component when measurement
+    is calculated on mask area, so then its geometry is shared between all components.
+
+    :param mask: mask array
+    :param kwargs: measurement arguments used to identify geometry in cache, see :py:func:`get_area_geometry`
+    """
+    component_num = kwargs.get("_component_num", NO_COMPONENT) if kwargs.get("_area") == AreaType.ROI else NO_COMPONENT
+    return get_area_geometry(mask, _array_name="mask", **{**kwargs, "_component_num": component_num})
+
+
+def components_labels(area_array: np.ndarray, mask: Optional[np.ndarray], _per_component, **_) -> np.ndarray:
+    """
+    Get array in which each voxel of area is labeled with number of component to which it belongs.
+    Components are labeled in same way like in :py:meth:`MeasurementProfile._clip_arrays`.
+    """
+    if _per_component == PerComponent.Per_Mask_component:
+        return np.where(area_array > 0, mask, 0)
+    return area_array
+
+
+def _components_voxels(labels: np.ndarray, components: np.ndarray) -> np.ndarray:
+    minlength = int(np.max(components)) + 1 if components.size else 0
+    return np.bincount(labels.ravel(), minlength=minlength)[components]
+
+
+def _components_channel(labels: np.ndarray, channel: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """Fit channel to labels shape. Return None if it is not possible"""
+    if channel is None or channel.size != labels.size:
+        return None
+    return channel.reshape(labels.shape)
+
+
+def _components_sum(labels: np.ndarray, channel: np.ndarray, components: np.ndarray) -> np.ndarray:
+    minlength = int(np.max(components)) + 1 if components.size else 0
+    return np.bincount(labels.ravel(), weights=channel.ravel(), minlength=minlength)[components]
+
+
+def _components_values(labels: np.ndarray, channel: np.ndarray, components: np.ndarray) -> List[np.ndarray]:
+    """
+    Group channel values by components with one sort of labeled voxels.
+    Values for each component are in same order like in ``channel[labels == num]``.
+    """
+    positions = np.flatnonzero(labels)
+    labels_flat = labels.ravel()[positions]
+    order = np.argsort(labels_flat, kind="stable")
+    labels_flat = labels_flat[order]
+    values = channel.ravel()[positions[order]]
+    starts = np.searchsorted(labels_flat, components, side="left")
+    ends = np.searchsorted(labels_flat, components, side="right")
+    return [values[start:end] for start, end in zip(starts, ends)]
+
+
+def _components_reduction(reduce_fun, components: np.ndarray, channel: np.ndarray, **kwargs) -> Optional[np.ndarray]:
+    """
+    Apply reduction from :py:mod:`scipy.ndimage` (like :py:func:`scipy.ndimage.maximum`) for all components at once.
+    Value for empty components is 0.
+    """
+    labels = components_labels(**kwargs)
+    channel = _components_channel(labels, channel)
+    if channel is None:
+        return None
+    if components.size == 0:
+        return np.array([])
+    res = np.asarray(reduce_fun(channel, labels, components), dtype=float)
+    res[_components_voxels(labels, components) == 0] = 0
+    return res
 
 
 class Volume(MeasurementMethodBase):
@@ -749,6 +1109,10 @@ class Volume(MeasurementMethodBase):
     def calculate_property(cls, area_array, voxel_size, result_scalar, **_):  # pylint: disable=W0221
         return np.count_nonzero(area_array) * pixel_volume(voxel_size, result_scalar)
 
+    @classmethod
+    def calculate_components_property(cls, components, voxel_size, result_scalar, **kwargs):
+        return _components_voxels(components_labels(**kwargs), components) * pixel_volume(voxel_size, result_scalar)
+
     @classmethod
     def get_units(cls, ndim):
         return symbols("{}") ** ndim
@@ -761,6 +1125,10 @@ class Voxels(MeasurementMethodBase):
     def calculate_property(cls, area_array, **_):  # pylint: disable=W0221
         return np.count_nonzero(area_array)
 
+    @classmethod
+    def calculate_components_property(cls, components, **kwargs):
+        return _components_voxels(components_labels(**kwargs), components)
+
     @classmethod
     def get_units(cls, ndim):
         return symbols("1")
@@ -820,25 +1188,98 @@ def iterative_double_normal(points_positions: np.ndarray):
     return delta, dn
 
 
-class Diameter(MeasurementMethodBase):
+DIAMETER_CHUNK_SIZE = 2**22
+
+
+def convex_hull_vertices(points_positions: np.ndarray) -> np.ndarray:
+    """
+    Reduce set of points to vertices of its convex hull. Farthest pair of points lies on convex hull.
+    Dimensions in which all points have same coordinate are ignored. If hull cannot be calculated
+    (for example, all points are collinear), then all points are returned.
+
+    :param points_positions: points array of size (points_num, number of dimensions)
+    :return: array of hull vertices with only varying dimensions
+    """
+    points_positions = points_positions[:, np.ptp(points_positions, axis=0) > 0]
+    if points_positions.shape[1] < 2 or points_positions.shape[0] <= points_positions.shape[1] + 1:
+        return points_positions
+    try:
+        return points_positions[ConvexHull(points_positions).vertices]
+    except QhullError:
+        return points_positions
+
+
+def _farthest_pair_distance_sq(points_positions: np.ndarray) -> float:
     """
-    Class for calculate diameter of ROI in fast way.
-    From Malandain, G., & Boissonnat, J. (2002). Computing the diameter of a point set,
-    12(6), 489–509. https://doi.org/10.1142/S0218195902001006
+    Exact square of farthest pair distance. Lower bound ``delta`` from :py:func:`iterative_double_normal`
+    is refined only with points outside of ball spanned on its double normal,
+    because two points inside this ball cannot be farther than ``sqrt(delta)``.
+    """
+    if points_positions.shape[0] < 2:
+        return 0
+    if points_positions.shape[1] == 1:
+        return np.ptp(points_positions) ** 2
+    delta, (first, second) = iterative_double_normal(points_positions)
+    mid_point = (points_positions[first] + points_positions[second]) / 2
+    candidates = points_positions[np.sum((points_positions - mid_point) ** 2, axis=1) > delta / 4]
+    step = max(1, DIAMETER_CHUNK_SIZE // points_positions.shape[0])
+    for i in range(0, candidates.shape[0], step):
+        delta = max(delta, np.max(cdist(candidates[i : i + step], points_positions, "sqeuclidean")))
+    return delta
+
+
+def hull_diameter(points_positions: np.ndarray, relative_error: float = 0) -> float:
+    """
+    Calculate diameter of set of points. Set is reduced to vertices of convex hull
+    and then farthest pair is searched on them.
 
+    :param points_positions: points array of size (points_num, number of dimensions)
+    :param relative_error: if positive, then points are snapped to grid before hull calculation.
+        Size of grid is chosen in such way that difference between result and exact diameter
+        is not bigger than ``relative_error * diameter``.
+    :return: diameter of set of points
+    """
+    if points_positions.shape[0] < 2:
+        return 0
+    if relative_error > 0:
+        extent = np.max(np.ptp(points_positions, axis=0))
+        if extent == 0:
+            return 0
+        # snap moves each point by at most cell_size * sqrt(ndim) / 2 and extent <= diameter
+        cell_size = relative_error * extent / np.sqrt(points_positions.shape[1])
+        points_positions = np.unique(np.round(points_positions / cell_size), axis=0) * cell_size
+    return np.sqrt(_farthest_pair_distance_sq(convex_hull_vertices(points_positions)))
+
+
+class DiameterParameters(BaseModel):
+    relative_error: float = Field(
+        0,
+        ge=0,
+        le=0.5,
+        title="Max relative error",
+        description="Allow approximation of diameter with given relative error. 0 means exact value",
+    )
+
+
+class Diameter(MeasurementMethodBase):
+    """
+    Class for calculate diameter of ROI in fast way. Border of ROI is reduced to vertices of its
+    convex hull and then farthest pair of them is searched (see :py:func:`hull_diameter`).
     """
 
     text_info = "Diameter", "Diameter of area"
+    __argument_class__ = DiameterParameters
 
     @staticmethod
-    def calculate_property(area_array, voxel_size, result_scalar, **_):  # pylint: disable=W0221
-        pos = np.transpose(np.nonzero(get_border(area_array))).astype(float)
+    def calculate_property(
+        area_array, voxel_size, result_scalar, relative_error: float = 0, **kwargs
+    ):  # pylint: disable=W0221
+        pos = get_area_geometry(area_array, **kwargs).border_coordinates.astype(float)
         if pos.size == 0:
             return 0
         for i, val in enumerate((x * result_scalar for x in reversed(voxel_size)), start=1):
             pos[:, -i] *= val
-        diam_sq = iterative_double_normal(pos)[0]
-        return np.sqrt(diam_sq)
+        return hull_diameter(pos, relative_error)
 
     @classmethod
     def get_units(cls, ndim):
@@ -884,6 +1325,14 @@ class PixelBrightnessSum(MeasurementMethodBase):
     def get_units(cls, ndim):
         return symbols("Pixel_brightness")
 
+    @classmethod
+    def calculate_components_property(cls, components, channel, **kwargs):
+        labels = components_labels(**kwargs)
+        channel = _components_channel(labels, channel)
+        if channel is None:
+            return None
+        return _components_sum(labels, channel, components)
+
     @classmethod
     def need_channel(cls):
         return True
@@ -912,6 +1361,10 @@ class MaximumPixelBrightness(MeasurementMethodBase):
             return np.max(channel[area_array > 0])
         return 0
 
+    @classmethod
+    def calculate_components_property(cls, components, **kwargs):
+        return _components_reduction(ndimage.maximum, components, **kwargs)
+
     @classmethod
     def get_units(cls, ndim):
         return symbols("Pixel_brightness")
@@ -932,6 +1385,10 @@ class MinimumPixelBrightness(MeasurementMethodBase):
             return np.min(channel[area_array > 0])
         return 0
 
+    @classmethod
+    def calculate_components_property(cls, components, **kwargs):
+        return _components_reduction(ndimage.minimum, components, **kwargs)
+
     @classmethod
     def get_units(cls, ndim):
         return symbols("Pixel_brightness")
@@ -952,6 +1409,15 @@ class MeanPixelBrightness(MeasurementMethodBase):
             return np.mean(channel[area_array > 0])
         return 0
 
+    @classmethod
+    def calculate_components_property(cls, components, channel, **kwargs):
+        labels = components_labels(**kwargs)
+        channel = _components_channel(labels, channel)
+        if channel is None:
+            return None
+        count = _components_voxels(labels, components)
+        return _components_sum(labels, channel, components) / np.maximum(count, 1)
+
     @classmethod
     def get_units(cls, ndim):
         return symbols("Pixel_brightness")
@@ -972,6 +1438,10 @@ class MedianPixelBrightness(MeasurementMethodBase):
             return np.median(channel[area_array > 0])
         return 0
 
+    @classmethod
+    def calculate_components_property(cls, components, **kwargs):
+        return _components_reduction(ndimage.median, components, **kwargs)
+
     @classmethod
     def get_units(cls, ndim):
         return symbols("Pixel_brightness")
@@ -995,6 +1465,14 @@ class StandardDeviationOfPixelBrightness(MeasurementMethodBase):
             return np.std(channel[area_array > 0])
         return 0
 
+    @classmethod
+    def calculate_components_property(cls, components, channel, **kwargs):
+        labels = components_labels(**kwargs)
+        channel = _components_channel(labels, channel)
+        if channel is None:
+            return None
+        return np.array([np.std(x) if x.size else 0 for x in _components_values(labels, channel, components)])
+
     @classmethod
     def get_units(cls, ndim):
         return symbols("Pixel_brightness")
@@ -1083,24 +1561,14 @@ class Compactness(MeasurementMethodBase):
     def calculate_property(**kwargs):  # pylint: disable=W0221
         if kwargs.get("_cache", False) and "help_dict" in kwargs and "_area" in kwargs and "_per_component" in kwargs:
             help_dict = kwargs["help_dict"]
-            border_hash_str = hash_fun_call_name(
+            border_key = measurement_cache_key(
                 Surface, {}, kwargs["_area"], kwargs["_per_component"], Channel(-1), kwargs["_component_num"]
             )
-            if border_hash_str not in help_dict:
-                border_surface = Surface.calculate_property(**kwargs)
-                help_dict[border_hash_str] = border_surface
-            else:
-                border_surface = help_dict[border_hash_str]
-
-            volume_hash_str = hash_fun_call_name(
+            border_surface = cache_get_or_calculate(help_dict, border_key, lambda: Surface.calculate_property(**kwargs))
+            volume_key = measurement_cache_key(
                 Volume, {}, kwargs["_area"], kwargs["_per_component"], Channel(-1), kwargs["_component_num"]
             )
-
-            if volume_hash_str not in help_dict:
-                volume = Volume.calculate_property(**kwargs)
-                help_dict[volume_hash_str] = volume
-            else:
-                volume = help_dict[volume_hash_str]
+            volume = cache_get_or_calculate(help_dict, volume_key, lambda: Volume.calculate_property(**kwargs))
         else:
             border_surface = Surface.calculate_property(**kwargs)
             volume = Volume.calculate_property(**kwargs)
@@ -1123,23 +1591,14 @@ class Sphericity(MeasurementMethodBase):
         else:
             help_dict = {}
             kwargs.update({"_area": AreaType.ROI, "_per_component": PerComponent.No, "_component_num": NO_COMPONENT})
-        volume_hash_str = hash_fun_call_name(
+        volume_key = measurement_cache_key(
             Volume, {}, kwargs["_area"], kwargs["_per_component"], Channel(-1), kwargs["_component_num"]
         )
-        if volume_hash_str not in help_dict:
-            volume = Volume.calculate_property(**kwargs)
-            help_dict[volume_hash_str] = volume
-        else:
-            volume = help_dict[volume_hash_str]
-
-        diameter_hash_str = hash_fun_call_name(
+        volume = cache_get_or_calculate(help_dict, volume_key, lambda: Volume.calculate_property(**kwargs))
+        diameter_key = measurement_cache_key(
             Diameter, {}, kwargs["_area"], kwargs["_per_component"], Channel(-1), kwargs["_component_num"]
         )
-        if diameter_hash_str not in help_dict:
-            diameter_val = Diameter.calculate_property(**kwargs)
-            help_dict[diameter_hash_str] = diameter_val
-        else:
-            diameter_val = help_dict[diameter_hash_str]
+        diameter_val = cache_get_or_calculate(help_dict, diameter_key, lambda: Diameter.calculate_property(**kwargs))
         radius = diameter_val / 2
         if kwargs["area_array"].shape[0] > 1:
             return volume / (4 / 3 * pi * (radius**3))
@@ -1162,6 +1621,23 @@ class Surface(MeasurementMethodBase):
         return symbols("{}") ** 2
 
 
+def rim_mask(mask: Optional[np.ndarray], voxel_size, **kwargs) -> Optional[np.ndarray]:
+    """
+    Calculate :py:meth:`.BorderRim.border_mask` of mask. Distance map of mask is cached, so
+    rims of different width are obtained by thresholding the same map.
+    """
+    if mask is None:
+        return None
+    distance_map = get_mask_geometry(mask, **kwargs).distance_from_background(voxel_size)
+    return BorderRim.border_mask(mask=mask, voxel_size=voxel_size, distance_map=distance_map, **kwargs)
+
+
+def split_mask(mask: Optional[np.ndarray], voxel_size, **kwargs) -> np.ndarray:
+    """Calculate :py:meth:`.MaskDistanceSplit.split` of mask using cached distance map of mask"""
+    distance_map = get_mask_geometry(mask, **kwargs).distance_from_background(voxel_size)
+    return MaskDistanceSplit.split(mask=mask, voxel_size=voxel_size, distance_map=distance_map, **kwargs)
+
+
 class RimVolume(MeasurementMethodBase):
     text_info = "rim volume", "Calculate volumes for elements in radius (in physical units) from mask"
     __argument_class__ = BorderRim.__argument_class__
@@ -1172,7 +1648,7 @@ class RimVolume(MeasurementMethodBase):
 
     @staticmethod
     def calculate_property(area_array, voxel_size, result_scalar, **kwargs):  # pylint: disable=W0221
-        border_mask_array = BorderRim.border_mask(voxel_size=voxel_size, result_scalar=result_scalar, **kwargs)
+        border_mask_array = rim_mask(voxel_size=voxel_size, **kwargs)
         if border_mask_array is None:
             return None
         final_mask = np.array((border_mask_array > 0) * (area_array > 0))
@@ -1204,7 +1680,7 @@ class RimPixelBrightnessSum(MeasurementMethodBase):
             if channel.shape[0] != 1:  # pragma: no cover
                 raise ValueError("This measurements do not support time data")
             channel = channel[0]
-        border_mask_array = BorderRim.border_mask(**kwargs)
+        border_mask_array = rim_mask(**kwargs)
         if border_mask_array is None:
             return None
         final_mask = np.array((border_mask_array > 0) * (area_array > 0))
@@ -1241,23 +1717,54 @@ class DistanceMaskROIParameters(BaseModel):
     distance_to_roi: DistancePoint = Field(DistancePoint.Border, title="Distance to ROI")
 
 
+def border_scale(ndim: int, voxel_size: Sequence[float], result_scalar: float) -> Tuple[float, ...]:
+    """
+    Scale of each axis of array with ``ndim`` dimensions. Spacing is applied to last axes, other axes are not scaled.
+    """
+    return (1.0,) * (ndim - len(voxel_size)) + tuple(x * result_scalar for x in voxel_size[-ndim:])
+
+
+def new_roi_geometry(
+    profile: ROIExtractionProfile,
+    new_roi: np.ndarray,
+    help_dict: Optional[MutableMapping] = None,
+    _area: Optional[AreaType] = None,
+    _per_component: Optional[PerComponent] = None,
+    **_,
+) -> AreaGeometry:
+    """
+    Get :py:class:`AreaGeometry` of ROI calculated with given profile. It is shared by all measurements
+    and all components, so spatial index of its border is built only once per calculation.
+    """
+    key = measurement_cache_key(
+        AreaGeometry, {"profile": profile, "shape": new_roi.shape}, _area, _per_component, Channel(-1), NO_COMPONENT
+    )
+    return cache_get_or_calculate(help_dict, key, lambda: AreaGeometry(new_roi))
+
+
 class DistanceMaskROI(MeasurementMethodBase):
     text_info = "ROI distance", "Calculate distance between ROI and mask"
     __argument_class__ = DistanceMaskROIParameters
 
     @staticmethod
-    def calculate_points(channel, area_array, voxel_size, result_scalar, point_type: DistancePoint) -> np.ndarray:
+    def calculate_points(
+        channel,
+        area_array,
+        voxel_size,
+        result_scalar,
+        point_type: DistancePoint,
+        geometry: Optional[AreaGeometry] = None,
+    ) -> np.ndarray:
+        if geometry is None:
+            geometry = AreaGeometry(area_array)
         if point_type == DistancePoint.Border:
-            area_pos = np.transpose(np.nonzero(get_border(area_array))).astype(float)
-            area_pos += 0.5
-            for i, val in enumerate((x * result_scalar for x in reversed(voxel_size)), start=1):
-                area_pos[:, -i] *= val
+            area_pos = geometry.border_positions(border_scale(area_array.ndim, voxel_size, result_scalar))
         elif point_type == DistancePoint.Mass_center:
             im = np.copy(channel)
             im[area_array == 0] = 0
             area_pos = np.array([af.density_mass_center(im, voxel_size) * result_scalar])
         else:
-            area_pos = np.array([af.density_mass_center(area_array > 0, voxel_size) * result_scalar])
+            area_pos = np.array([geometry.geometrical_center(voxel_size) * result_scalar])
         return area_pos
 
     @classmethod
@@ -1279,15 +1786,17 @@ class DistanceMaskROI(MeasurementMethodBase):
             channel = channel[0]
         if not (np.any(mask) and np.any(area_array)):
             return 0
-        mask_pos = cls.calculate_points(channel, mask, voxel_size, result_scalar, distance_from_mask)
-        seg_pos = cls.calculate_points(channel, area_array, voxel_size, result_scalar, distance_to_roi)
+        mask_geometry = kwargs.get("_mask_geometry")
+        if mask_geometry is None:
+            mask_geometry = get_mask_geometry(mask, **kwargs)
+        mask_pos = cls.calculate_points(channel, mask, voxel_size, result_scalar, distance_from_mask, mask_geometry)
+        seg_pos = cls.calculate_points(
+            channel, area_array, voxel_size, result_scalar, distance_to_roi, get_area_geometry(area_array, **kwargs)
+        )
         if 1 in {mask_pos.shape[0], seg_pos.shape[0]}:
             return np.min(cdist(mask_pos, seg_pos))
-
-        min_val = np.inf
-        for i in range(seg_pos.shape[0]):
-            min_val = min(min_val, np.min(cdist(mask_pos, np.array([seg_pos[i]]))))
-        return min_val
+        tree = mask_geometry.border_tree(border_scale(mask.ndim, voxel_size, result_scalar))
+        return np.min(tree.query(seg_pos)[0])
 
     @classmethod
     def get_starting_leaf(cls):
@@ -1347,19 +1856,18 @@ class DistanceROIROI(DistanceMaskROI):
                 raise ValueError("This measurements do not support time data")
             channel = channel[0]
         try:
-            hash_name = hash_fun_call_name(
+            # data are not clipped (need_full_data), so new ROI is same for all components
+            key = measurement_cache_key(
                 calculate_segmentation_step,
                 profile,
                 kwargs["_area"],
                 kwargs["_per_component"],
                 Channel(-1),
-                kwargs["_component_num"],
+                NO_COMPONENT,
+            )
+            result = cache_get_or_calculate(
+                kwargs["help_dict"], key, lambda: calculate_segmentation_step(profile, image, mask)[0]
             )
-            if hash_name in kwargs["help_dict"]:
-                result = kwargs["help_dict"][hash_name]
-            else:
-                result, _ = calculate_segmentation_step(profile, image, mask)
-                kwargs["help_dict"][hash_name] = result
         except KeyError:
             result, _ = calculate_segmentation_step(profile, image, mask)
 
@@ -1374,6 +1882,7 @@ class DistanceROIROI(DistanceMaskROI):
             result_scalar,
             distance_from_mask=distance_from_new_roi,
             distance_to_roi=distance_to_roi,
+            _mask_geometry=new_roi_geometry(profile, result.roi, **kwargs),
         )
 
     @staticmethod
@@ -1416,39 +1925,41 @@ class ROINeighbourhoodROI(DistanceMaskROI):
         **kwargs,
     ):  # pylint: disable=W0221
         try:
-            hash_name = hash_fun_call_name(
+            # data are not clipped (need_full_data), so new ROI is same for all components
+            key = measurement_cache_key(
                 calculate_segmentation_step,
                 profile,
                 kwargs["_area"],
                 kwargs["_per_component"],
                 Channel(-1),
-                kwargs["_component_num"],
+                NO_COMPONENT,
+            )
+            result = cache_get_or_calculate(
+                kwargs["help_dict"], key, lambda: calculate_segmentation_step(profile, image, mask)[0]
             )
-            if hash_name in kwargs["help_dict"]:
-                result = kwargs["help_dict"][hash_name]
-            else:
-                result, _ = calculate_segmentation_step(profile, image, mask)
-                kwargs["help_dict"][hash_name] = result
         except KeyError:
             result, _ = calculate_segmentation_step(profile, image, mask)
-        area_array = image.fit_array_to_image(area_array)
-        units_scalar = UNIT_SCALE[units.value]
-        final_radius = [int((distance / units_scalar) / x) for x in reversed(voxel_size)]
-
-        dilated = SimpleITK.GetArrayFromImage(
-            SimpleITK.BinaryDilate(
-                SimpleITK.GetImageFromArray((area_array > 0).astype(np.uint8).squeeze()), final_radius
-            )
-        )
-        dilated = dilated.reshape(area_array.shape)
-        roi = image.fit_array_to_image(result.roi)
-
-        components = set(np.unique(roi[dilated > 0]))
-        if 0 in components:
-            components.remove(0)
-
+        area_array = cls._spatial_array(image.fit_array_to_image(area_array), len(voxel_size))
+        roi = cls._spatial_array(image.fit_array_to_image(result.roi), len(voxel_size))
+        components = set(np.unique(roi[area_array > 0]))
+        components.discard(0)
+        if not np.any(area_array) or not np.any(roi):
+            return len(components)
+        scale = border_scale(roi.ndim, voxel_size, 1)
+        roi_geometry = new_roi_geometry(profile, roi, **kwargs)
+        roi_border = roi_geometry.border_positions(scale)
+        roi_labels = roi_geometry.border[tuple(roi_geometry.border_coordinates.T)]
+        area_tree = get_area_geometry(area_array, **kwargs).border_tree(scale)
+        dist, _ = area_tree.query(roi_border, distance_upper_bound=distance / UNIT_SCALE[units.value] * (1 + 1e-9))
+        components.update(np.unique(roi_labels[np.isfinite(dist)]))
         return len(components)
 
+    @staticmethod
+    def _spatial_array(array: np.ndarray, ndim: int) -> np.ndarray:
+        if np.prod(array.shape[:-ndim]) != 1:
+            raise ValueError("This measurements do not support time data")
+        return array.reshape(array.shape[-ndim:])
+
     @staticmethod
     def need_full_data():
         return True
@@ -1467,7 +1978,7 @@ class SplitOnPartVolume(MeasurementMethodBase):
 
     @staticmethod
     def calculate_property(part_selection, area_array, voxel_size, result_scalar, **kwargs):  # pylint: disable=W0221
-        masked = MaskDistanceSplit.split(voxel_size=voxel_size, **kwargs)
+        masked = split_mask(voxel_size=voxel_size, **kwargs)
         mask = masked == part_selection
         return np.count_nonzero(mask * area_array) * pixel_volume(voxel_size, result_scalar)
 
@@ -1493,7 +2004,7 @@ class SplitOnPartPixelBrightnessSum(MeasurementMethodBase):
 
     @staticmethod
     def calculate_property(part_selection, channel, area_array, **kwargs):  # pylint: disable=W0221
-        masked = MaskDistanceSplit.split(**kwargs)
+        masked = split_mask(**kwargs)
         mask = np.array(masked == part_selection)
         if channel.ndim - mask.ndim == 1:
             channel = channel[0]
@@ -1577,12 +2088,11 @@ class Haralick(MeasurementMethodBase):
             help_dict: Dict = kwargs["help_dict"]
             _area: AreaType = kwargs["_area"]
             _per_component: PerComponent = kwargs["_per_component"]
-            hash_name = hash_fun_call_name(
+            key = measurement_cache_key(
                 Haralick, {"distance": distance}, _area, _per_component, kwargs["channel_num"], kwargs["_component_num"]
             )
-            if hash_name not in help_dict:
-                help_dict[hash_name] = cls.calculate_haralick(channel, area_array, distance)
-            return help_dict[hash_name][feature.index()]
+            res = cache_get_or_calculate(help_dict, key, lambda: cls.calculate_haralick(channel, area_array, distance))
+            return res[feature.index()]
 
         res = cls.calculate_haralick(channel, area_array, distance)
         return res[feature.index()]
@@ -1606,6 +2116,10 @@ class ComponentBoundingBox(MeasurementMethodBase):
     def calculate_property(bounds_info, _component_num, **kwargs):  # pylint: disable=W0221
         return str(bounds_info[_component_num])
 
+    @classmethod
+    def calculate_components_property(cls, components, bounds_info, **kwargs):
+        return np.array([str(bounds_info[num]) for num in components])
+
     @classmethod
     def get_starting_leaf(cls):
         return super().get_starting_leaf().replace_(area=AreaType.ROI, per_component=PerComponent.Yes)
@@ -1,5 +1,8 @@
+import itertools
+import math
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Iterable, List, Union
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import SimpleITK as sitk
@@ -31,7 +34,36 @@ class NoiseFilterType(Enum):
         return self.name
 
 
-def _generic_image_operation(image, radius, fun, layer):
+class TilingParameters(NamedTuple):
+    """
+    Parameters of tiled execution of filters (see :py:func:`set_tiling`).
+    Tiles are extended by halo calculated from filter radius, so result is the same as for whole image.
+    """
+
+    tile_size: int = 256  #: size of tile along each filtered axis (in pixels)
+    workers: int = 1  #: number of threads used to filter tiles
+    min_size: int = 2**28  #: images smaller than this (in bytes) are filtered at once
+
+
+_tiling: Optional[TilingParameters] = TilingParameters()
+
+
+def set_tiling(tiling: Optional[TilingParameters]):
+    """
+    Set parameters of tiled execution of :py:func:`gaussian`, :py:func:`median` and :py:func:`bilateral`.
+
+    :param tiling: parameters of tiling, None disables tiled execution
+    """
+    global _tiling  # pylint: disable=W0603
+    _tiling = tiling
+
+
+def get_tiling() -> Optional[TilingParameters]:
+    """Current parameters of tiled execution"""
+    return _tiling
+
+
+def _generic_image_operation(image, radius, fun, layer, halo: Optional[Sequence[int]] = None):
     if image.ndim == 3 and image.shape[0] == 1:
         layer = True
     if image.ndim == 2:
@@ -40,11 +72,67 @@ def _generic_image_operation(image, radius, fun, layer):
         image = image.astype(np.uint8)
     if isinstance(radius, (list, tuple)):
         radius = list(reversed(radius))
+    if halo is not None and _tiling is not None and image.nbytes >= _tiling.min_size:
+        return _tiled_image_operation(image, radius, fun, layer, halo, _tiling)
     if not layer and image.ndim <= 3:
         return sitk.GetArrayFromImage(fun(sitk.GetImageFromArray(image), radius))
     return _generic_image_operations_recurse(np.copy(image), radius, fun, layer)
 
 
+def _tile_ranges(size: int, tile_size: int, halo: int) -> List[Tuple[slice, slice, slice]]:
+    """Ranges of tiles along one axis as (tile with halo, tile in output, tile in filtered tile with halo)"""
+    res = []
+    for start in range(0, size, tile_size):
+        stop = min(start + tile_size, size)
+        begin, end = max(start - halo, 0), min(stop + halo, size)
+        res.append((slice(begin, end), slice(start, stop), slice(start - begin, stop - begin)))
+    return res
+
+
+def _tiled_image_operation(image, radius, fun, layer, halo: Sequence[int], tiling: TilingParameters):
+    """
+    Apply filter to image tile by tile. Tiles are extended by ``halo`` (last axes, numpy order).
+    Axes not filtered together (time, layers in layer mode) are processed separately.
+    Result has the same type as result of :py:func:`_generic_image_operation` without tiling.
+    """
+    filtered_ndim = 2 if layer else min(image.ndim, 3)
+    leading_shape = image.shape[: image.ndim - filtered_ndim]
+    halo = list(halo)[-filtered_ndim:]
+    axes_ranges = [
+        _tile_ranges(size, tiling.tile_size, halo_size) for size, halo_size in zip(image.shape[-filtered_ndim:], halo)
+    ]
+    tiles = list(itertools.product(np.ndindex(*leading_shape), itertools.product(*axes_ranges)))
+
+    def filter_tile(tile):
+        leading_index, ranges = tile
+        source = np.ascontiguousarray(image[leading_index + tuple(x[0] for x in ranges)])
+        res = sitk.GetArrayFromImage(fun(sitk.GetImageFromArray(source), radius))
+        return res[tuple(x[2] for x in ranges)]
+
+    first = filter_tile(tiles[0])
+    # in layer mode result is written in copy of image, so it keeps image type
+    result = np.empty(image.shape, dtype=image.dtype if layer or image.ndim > 3 else first.dtype)
+
+    def write_tile(tile, data=None):
+        leading_index, ranges = tile
+        result[leading_index + tuple(x[1] for x in ranges)] = filter_tile(tile) if data is None else data
+
+    write_tile(tiles[0], first)
+    if tiling.workers > 1:
+        with ThreadPoolExecutor(tiling.workers) as executor:
+            list(executor.map(write_tile, tiles[1:]))
+    else:
+        for tile in tiles[1:]:
+            write_tile(tile)
+    return result
+
+
+def _halo(radius, ndim: int, fun) -> List[int]:
+    if not isinstance(radius, Iterable):
+        radius = [radius] * ndim
+    return [math.ceil(fun(x)) for x in radius]
+
+
 def _generic_image_operations_recurse(image, radius, fun, layer):
     if (not layer and image.ndim == 3) or image.ndim == 2:
         return sitk.GetArrayFromImage(fun(sitk.GetImageFromArray(image), radius))
@@ -63,7 +151,9 @@ def gaussian(image: np.ndarray, radius: float, layer=True):
     :param bool layer: if operation should be run on each layer separately
     :return:
     """
-    return _generic_image_operation(image, radius, sitk.DiscreteGaussian, layer)
+    # radius of DiscreteGaussian kernel is below 3 sigma and is limited to 32 pixels
+    halo = _halo(radius, image.ndim, lambda x: min(3 * math.sqrt(x) + 1, 32))
+    return _generic_image_operation(image, radius, sitk.DiscreteGaussian, layer, halo)
 
 
 def bilateral(image: np.ndarray, radius: float, layer=True):
@@ -75,7 +165,9 @@ def bilateral(image: np.ndarray, radius: float, layer=True):
     :param bool layer: if operation should be run on each layer separately
     :return:
     """
-    return _generic_image_operation(image, radius, sitk.Bilateral, layer)
+    # domain kernel radius of bilateral filter is 2.5 * sigma
+    halo = _halo(radius, image.ndim, lambda x: 2.5 * x + 1)
+    return _generic_image_operation(image, radius, sitk.Bilateral, layer, halo)
 
 
 def median(image: np.ndarray, radius: Union[int, List[int]], layer=True):
@@ -89,7 +181,7 @@ def median(image: np.ndarray, radius: Union[int, List[int]], layer=True):
     """
     if not isinstance(radius, Iterable):
         radius = [radius] * min(image.ndim, 2 if layer else 3)
-    return _generic_image_operation(image, radius, sitk.Median, layer)
+    return _generic_image_operation(image, radius, sitk.Median, layer, _halo(radius, image.ndim, float))
 
 
 def dilate(image, radius, layer=True):
@@ -11,7 +11,6 @@ Both class from this module are designed for spherical mask, but may be useful a
 import typing
 
 import numpy as np
-import SimpleITK
 from pydantic import Field
 from scipy.ndimage import distance_transform_edt
 
@@ -21,6 +20,19 @@ from PartSegCore.utils import BaseModel
 from .universal_const import UNIT_SCALE, Units
 
 
+def distance_from_background(mask: np.ndarray, voxel_size) -> np.ndarray:
+    """
+    Calculate euclidean distance of each voxel of mask from background (0 labeled voxels) with respect of voxel size.
+    It could be calculated once and reused for many rims or splits of the same mask.
+
+    :param mask: 2d or 3d numpy array
+    :param voxel_size: image spacing, if shorter than number of mask dimensions, then first axes are not scaled
+    :return: array of distances
+    """
+    voxel_size = (1,) * (mask.ndim - len(voxel_size)) + tuple(voxel_size)[-mask.ndim :]
+    return distance_transform_edt(mask, sampling=voxel_size)
+
+
 class BorderRimParameters(BaseModel):
     distance: float = Field(500, ge=0, le=10**6)
     units: Units = Units.nm
@@ -46,7 +58,14 @@ class BorderRim(AlgorithmDescribeBase):
         return "Border Rim"
 
     @staticmethod
-    def border_mask(mask: np.ndarray, distance: float, units: Units, voxel_size, **_) -> typing.Optional[np.ndarray]:
+    def border_mask(
+        mask: np.ndarray,
+        distance: float,
+        units: Units,
+        voxel_size,
+        distance_map: typing.Optional[np.ndarray] = None,
+        **_,
+    ) -> typing.Optional[np.ndarray]:
         """
         This is function which implement calculation.
 
@@ -54,21 +73,21 @@ class BorderRim(AlgorithmDescribeBase):
         :param distance: distance from border which will be marked.
         :param units: in which unit distance is given
         :param voxel_size: Image spacing in absolute units
+        :param distance_map: precalculated result of :py:func:`distance_from_background` for this mask
         :param _: ignored arguments
         :return: border rim marked with 1
         """
         if mask is None:
             return None
-        units_scalar = UNIT_SCALE[units.value]
-        final_radius = [int((distance / units_scalar) / x) for x in reversed(voxel_size)]
         mask = np.array(mask > 0)
-        mask = mask.astype(np.uint8)
-        eroded = SimpleITK.GetArrayFromImage(
-            SimpleITK.BinaryErode(SimpleITK.GetImageFromArray(mask.squeeze()), final_radius)
-        )
-        eroded = eroded.reshape(mask.shape)
-        mask[eroded > 0] = 0
-        return mask
+        if np.all(mask):
+            # voxels outside image are not background
+            return np.zeros(mask.shape, dtype=np.uint8)
+        if distance_map is None:
+            distance_map = distance_from_background(mask, voxel_size)
+        units_scalar = UNIT_SCALE[units.value]
+        # small tolerance to not lose voxels exactly in given distance because of float rounding
+        return (mask * (distance_map <= distance / units_scalar * (1 + 1e-9))).astype(np.uint8)
 
 
 class MaskDistanceSplitParameters(BaseModel):
@@ -114,7 +133,14 @@ class MaskDistanceSplit(AlgorithmDescribeBase):
         return "Mask Distance Split"
 
     @staticmethod
-    def split(mask: np.ndarray, num_of_parts: int, equal_volume: bool, voxel_size, **_):
+    def split(
+        mask: np.ndarray,
+        num_of_parts: int,
+        equal_volume: bool,
+        voxel_size,
+        distance_map: typing.Optional[np.ndarray] = None,
+        **_,
+    ):
         """
         This is function which implement calculation.
 
@@ -122,11 +148,10 @@ class MaskDistanceSplit(AlgorithmDescribeBase):
         :param num_of_parts: num of parts on which mask should be split
         :param equal_volume: if split should be on equal volume or equal thick
         :param voxel_size: image voxel size
+        :param distance_map: precalculated result of :py:func:`distance_from_background` for this mask
         :return: mask region labelled starting from 1 near border
         """
-        if len(voxel_size) == 2 and mask.ndim == 3:
-            voxel_size = (1,) + voxel_size
-        distance_arr = distance_transform_edt(mask, sampling=voxel_size)
+        distance_arr = distance_from_background(mask, voxel_size) if distance_map is None else distance_map
         if equal_volume:
             # TODO add more bins, fix tests for more bins
             hist, bins = np.histogram(distance_arr[distance_arr > 0], bins=10 * num_of_parts)
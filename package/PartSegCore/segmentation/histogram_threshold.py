@@ -0,0 +1,508 @@
+"""
+This module contains NumPy implementation of histogram based threshold methods
+(Otsu, Li, Yen, Triangle, ...) used by :py:class:`.SitkThreshold`.
+Entropy based methods (MaximumEntropy, RenyiEntropy) always use SimpleITK filters.
+
+Histogram of channel (limited to mask) is calculated once and stored in :py:data:`HISTOGRAM_CACHE`,
+so change of threshold method or number of bins only recalculates threshold from histogram
+instead of processing whole channel again. Histogram bins and threshold methods follow
+ITK implementation used by SimpleITK, so calculated thresholds are the same as thresholds
+of SimpleITK filters. Methods return ``None`` when ITK implementation reports an error
+or warning, then caller should use SimpleITK filter.
+
+Histogram is cached only for read only arrays (like results stored in :py:data:`.STAGE_CACHE`)
+as content of writable array could change without change of its identity.
+"""
+import itertools
+import typing
+import weakref
+from collections import OrderedDict
+from threading import RLock
+
+import numpy as np
+
+from .stage_cache import array_digest
+
+EPSILON = 2.220446049250313e-16
+_CHUNK_SIZE = 2**22
+
+#: function calculating threshold from histogram counts and bin edges
+HistogramThresholdMethod = typing.Callable[[np.ndarray, np.ndarray], typing.Optional[float]]
+
+
+def _seq_sum(array: np.ndarray) -> float:
+    """Sum array element by element, in the same order as loops of ITK implementation"""
+    return float(np.cumsum(array)[-1]) if array.size else 0.0
+
+
+def _chunks(values: np.ndarray) -> typing.Iterator[np.ndarray]:
+    for i in range(0, values.size, _CHUNK_SIZE):
+        yield values[i : i + _CHUNK_SIZE]
+
+
+def histogram_edges(dtype: np.dtype, minimum: float, maximum: float, bins: int) -> np.ndarray:
+    """
+    Calculate edges of histogram bins in the same way as ``HistogramThresholdImageFilter`` from ITK.
+    For 8 bit data histogram covers whole range of type, otherwise range from minimum to maximum
+    of data (with small margin on upper end). Bins width is calculated in single precision.
+
+    :param dtype: type of data
+    :param minimum: minimum of data
+    :param maximum: maximum of data
+    :param bins: number of bins
+    :return: array of ``bins + 1`` edges of bins
+    """
+    if np.issubdtype(dtype, np.integer) and dtype.itemsize == 1:
+        lower, upper = np.iinfo(dtype).min - 0.5, np.iinfo(dtype).max + 0.5
+    else:
+        lower, upper = float(minimum), float(maximum) + ((float(maximum) - float(minimum)) / bins) / 100.0
+    interval = np.float32(np.float32(np.float32(upper) - np.float32(lower)) / np.float32(bins))
+    edges = lower + (np.arange(bins + 1, dtype=np.float32) * interval).astype(np.float64)
+    edges[-1] = upper
+    return edges
+
+
+def _bin_indices(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """
+    Index of bin for each value. Bins are half open ``[edges[i], edges[i + 1])``.
+    Values outside histogram get index ``-1`` or ``len(edges) - 1``.
+    """
+    values = values.astype(np.float64, copy=False)
+    bins = edges.size - 1
+    interval = (edges[-2] - edges[0]) / (bins - 1)
+    index = np.floor((values - edges[0]) / interval).astype(np.intp)
+    np.clip(index, 0, bins - 1, out=index)
+    # correction of rounding errors of uniform approximation
+    index -= values < edges[index]
+    index += values >= edges[index + 1]
+    index[values < edges[0]] = -1
+    index[values >= edges[-1]] = bins
+    return index
+
+
+def _bin_counts(index: np.ndarray, bins: int, weights: typing.Optional[np.ndarray] = None) -> np.ndarray:
+    valid = (index >= 0) & (index < bins)
+    if weights is not None:
+        weights = weights[valid]
+    return np.bincount(index[valid], weights=weights, minlength=bins).astype(np.float64)
+
+
+class ChannelHistogram:
+    """
+    Histogram information of channel limited to mask.
+    For integer data up to 16 bits counts of each value are stored, so histogram for any number of bins
+    is calculated without access to data. For other data, histograms are calculated from data
+    and stored for each number of bins.
+
+    :param data: channel
+    :param mask: mask limiting histogram to voxels with value 1 (like SimpleITK filters used by PartSeg)
+    """
+
+    def __init__(self, data: np.ndarray, mask: typing.Optional[np.ndarray]):
+        self.dtype = data.dtype
+        self.data_min = data.min()
+        self.data_max = data.max()
+        self.binary_mask = mask is None or mask.dtype == bool or mask.max() <= 1
+        values = self._values(data, mask)
+        self.count = values.size
+        self.minimum = values.min() if values.size else self.data_min
+        self.maximum = values.max() if values.size else self.data_max
+        self._histograms: typing.Dict[int, typing.Tuple[np.ndarray, np.ndarray]] = {}
+        self.values: typing.Optional[np.ndarray] = None
+        self.value_counts: typing.Optional[np.ndarray] = None
+        if np.issubdtype(self.dtype, np.integer) and self.dtype.itemsize <= 2 and values.size:
+            counts = np.zeros(int(self.maximum) - int(self.minimum) + 1, dtype=np.int64)
+            for chunk in _chunks(values):
+                counts += np.bincount(chunk.astype(np.intp) - int(self.minimum), minlength=counts.size)
+            present = np.nonzero(counts)[0]
+            self.values = (present + int(self.minimum)).astype(self.dtype)
+            self.value_counts = counts[present]
+
+    @staticmethod
+    def _values(data: np.ndarray, mask: typing.Optional[np.ndarray]) -> np.ndarray:
+        if mask is None:
+            return data.reshape(-1)
+        return data[mask == 1]
+
+    def histogram(
+        self, bins: int, data: np.ndarray, mask: typing.Optional[np.ndarray]
+    ) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        Histogram with given number of bins.
+
+        :param bins: number of bins
+        :param data: channel for which this object was created (used when histogram is not calculated yet)
+        :param mask: mask for which this object was created
+        :return: counts in bins and edges of bins
+        """
+        if bins not in self._histograms:
+            edges = histogram_edges(self.dtype, self.minimum, self.maximum, bins)
+            if self.values is not None:
+                counts = _bin_counts(_bin_indices(self.values, edges), bins, self.value_counts)
+            else:
+                counts = np.zeros(bins, dtype=np.float64)
+                for chunk in _chunks(self._values(data, mask)):
+                    counts += _bin_counts(_bin_indices(chunk, edges), bins)
+            self._histograms[bins] = counts, edges
+        return self._histograms[bins]
+
+    def nearest_value(self, threshold, upper: bool):
+        """
+        Nearest value of data above threshold (if ``upper``) or not above threshold.
+        Return ``None`` if there is no such value or it could not be calculated from stored value counts.
+        """
+        if self.values is None or not self.binary_mask:
+            return None
+        position = np.searchsorted(self.values, threshold, side="right")
+        if upper:
+            return self.values[position] if position < self.values.size else None
+        return self.values[position - 1] if position > 0 else None
+
+
+class HistogramCache:
+    """
+    Cache of :py:class:`ChannelHistogram` for pairs of channel and mask.
+    Entries for channel are dropped when channel is garbage collected.
+
+    :param size: maximum number of stored histograms
+    """
+
+    def __init__(self, size: int = 16):
+        self.size = size
+        self._data: "OrderedDict[typing.Tuple[str, str], ChannelHistogram]" = OrderedDict()
+        self._tokens: typing.Dict[int, str] = {}
+        self._counter = itertools.count()
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _token(self, array: np.ndarray) -> str:
+        with self._lock:
+            if id(array) not in self._tokens:
+                self._tokens[id(array)] = f"array_{next(self._counter)}"
+                weakref.finalize(array, self._drop, id(array))
+            return self._tokens[id(array)]
+
+    def _mask_token(self, mask: typing.Optional[np.ndarray]) -> str:
+        if mask is None:
+            return "none"
+        if mask.flags.writeable:
+            return array_digest(mask)
+        return self._token(mask)
+
+    def get(self, data: np.ndarray, mask: typing.Optional[np.ndarray]) -> ChannelHistogram:
+        """Get histogram of channel limited to mask. Histogram is stored only if ``data`` is read only."""
+        if data.flags.writeable or self.size == 0:
+            return ChannelHistogram(data, mask)
+        key = self._token(data), self._mask_token(mask)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        histogram = ChannelHistogram(data, mask)
+        with self._lock:
+            self._data[key] = histogram
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+        return histogram
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _drop(self, array_id: int):
+        with self._lock:
+            token = self._tokens.pop(array_id, None)
+            for key in [x for x in self._data if token in x]:
+                del self._data[key]
+
+
+#: cache of histograms shared by all threshold methods
+HISTOGRAM_CACHE = HistogramCache()
+
+
+def _bin_center(edges: np.ndarray, index: int) -> float:
+    return (edges[index] + edges[index + 1]) / 2.0
+
+
+def _bin_of_value(edges: np.ndarray, value: float) -> typing.Optional[int]:
+    index = int(np.searchsorted(edges, value, side="right")) - 1
+    return index if 0 <= index < edges.size - 1 else None
+
+
+def _normalized_cumulative(counts: np.ndarray):
+    norm = counts / counts.sum()
+    cumulative = np.cumsum(norm)
+    first = int(np.argmax(np.abs(cumulative) >= EPSILON))
+    last = counts.size - 1 - int(np.argmax(np.abs(1.0 - cumulative[::-1]) >= EPSILON))
+    return norm, cumulative, 1.0 - cumulative, first, last
+
+
+def otsu(counts: np.ndarray, edges: np.ndarray) -> typing.Optional[float]:
+    norm = counts / counts.sum()
+    class_probability = np.cumsum(norm)
+    class_mean = np.cumsum(norm * np.arange(counts.size))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (class_mean[-1] * class_probability - class_mean) ** 2 / (
+            class_probability * (1 - class_probability)
+        )
+    variance[~np.isfinite(variance)] = -1
+    return edges[int(np.argmax(variance)) + 1]
+
+
+def li(counts: np.ndarray, edges: np.ndarray) -> typing.Optional[float]:
+    centers = (edges[:-1] + edges[1:]) / 2
+    # Li method does not support negative values, so histogram is shifted
+    shift = min(edges[0], 0)
+    centers_shifted = centers - shift
+    weighted = centers_shifted * counts
+    new_threshold = _seq_sum(weighted) / counts.sum()
+    for _ in range(10000):
+        old_threshold = new_threshold
+        index = _bin_of_value(edges, int(old_threshold + shift + 0.5))
+        if index is None:
+            return None
+        num_back = counts[: index + 1].sum()
+        num_obj = counts[index + 1 :].sum()
+        mean_back = _seq_sum(weighted[: index + 1]) / num_back if num_back else 0.0
+        mean_obj = _seq_sum(weighted[index + 1 :]) / num_obj if num_obj else 0.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            temp = (mean_back - mean_obj) / (np.log(mean_back) - np.log(mean_obj))
+        if not np.isfinite(temp):
+            return None
+        new_threshold = int(temp - 0.5) if temp < -EPSILON else int(temp + 0.5)
+        if abs(new_threshold - old_threshold) <= 0.5:
+            return _bin_center(edges, index)
+    return None
+
+
+def shanbhag(counts: np.ndarray, edges: np.ndarray) -> typing.Optional[float]:
+    norm, cumulative, cumulative_rev, first, last = _normalized_cumulative(counts)
+    threshold, min_entropy = 0, np.inf
+    with np.errstate(divide="ignore"):
+        for it in range(first, last + 1):
+            term = 0.5 / cumulative[it]
+            entropy_back = -_seq_sum(norm[1 : it + 1] * np.log(1.0 - term * cumulative[:it])) * term
+            term = 0.5 / cumulative_rev[it]
+            entropy_obj = -_seq_sum(norm[it + 1 :] * np.log(1.0 - term * cumulative_rev[it + 1 :])) * term
+            entropy = abs(entropy_back - entropy_obj)
+            if entropy < min_entropy:
+                min_entropy, threshold = entropy, it
+    return _bin_center(edges, threshold)
+
+
+def triangle(counts: np.ndarray, edges: np.ndarray) -> typing.Optional[float]:
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1]
+    max_index = int(np.argmax(counts))
+    max_value = counts[max_index]
+    one_percent = int(np.argmax(cumulative > total * 0.01))
+    ninety_nine_percent = int(np.argmax(cumulative > total * 0.99))
+    if abs(max_index - one_percent) > abs(max_index - ninety_nine_percent):
+        # left side is longer
+        slope = max_value / (max_index - one_percent)
+        line = slope * np.arange(max_index - one_percent)
+        index = one_percent + int(np.argmax(line - counts[one_percent:max_index]))
+    elif ninety_nine_percent > max_index:
+        slope = -max_value / (ninety_nine_percent - max_index)
+        line = slope * np.arange(ninety_nine_percent - max_index) + max_value
+        index = max_index + int(np.argmax(line - counts[max_index:ninety_nine_percent]))
+    else:
+        return None
+    if index + 1 >= counts.size:
+        return None
+    return _bin_center(edges, index + 1)
+
+
+def yen(counts: np.ndarray, edges: np.ndarray) -> typing.Optional[float]:
+    norm = counts / counts.sum()
+    cumulative = np.cumsum(norm)
+    cumulative_sq = np.cumsum(norm**2)
+    cumulative_sq_rev = np.zeros_like(cumulative_sq)
+    cumulative_sq_rev[:-1] = np.cumsum((norm**2)[:0:-1])[::-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        product = cumulative_sq * cumulative_sq_rev
+        prob = cumulative * (1.0 - cumulative)
+        criterion = -1.0 * np.where(product > 0.0, np.log(product), 0.0) + 2 * np.where(prob > 0.0, np.log(prob), 0.0)
+    return _bin_center(edges, int(np.argmax(criterion)))
+
+
+def huang(counts: np.ndarray, edges: np.ndarray) -> typing.Optional[float]:
+    centers = (edges[:-1] + edges[1:]) / 2
+    non_zero = np.nonzero(counts)[0]
+    first, last = int(non_zero[0]), int(non_zero[-1])
+    if first == last:
+        return _bin_center(edges, first)
+    weighted = centers * counts
+    if first == 0:
+        # ITK does not include first bin in weighted sum if it is the first non empty bin
+        weighted[0] = 0
+    cumulative = np.cumsum(counts)
+    cumulative_weighted = np.cumsum(weighted)
+    size = last - first
+    mu = 1.0 / (1.0 + np.arange(1, size + 1) / float(size))
+    smu = np.zeros(size + 1)
+    smu[1:] = -mu * np.log(mu) - (1.0 - mu) * np.log(1.0 - mu)
+    indices = np.arange(counts.size)
+    threshold, best_entropy = 0, np.inf
+    for it in range(first, last):
+        mu_back = _bin_of_value(edges, np.floor(cumulative_weighted[it] / cumulative[it] + 0.5))
+        mu_obj = _bin_of_value(
+            edges,
+            np.floor((cumulative_weighted[last] - cumulative_weighted[it]) / (cumulative[last] - cumulative[it]) + 0.5),
+        )
+        if mu_back is None or mu_obj is None or not first <= mu_back <= last or not first <= mu_obj <= last:
+            return None
+        entropy = _seq_sum(
+            np.concatenate(
+                [
+                    smu[np.abs(indices[first : it + 1] - mu_back)] * counts[first : it + 1],
+                    smu[np.abs(indices[it + 1 : last + 1] - mu_obj)] * counts[it + 1 : last + 1],
+                ]
+            )
+        )
+        if best_entropy > entropy:
+            best_entropy, threshold = entropy, it
+    return _bin_center(edges, threshold)
+
+
+def _is_bimodal(counts: np.ndarray) -> bool:
+    return np.count_nonzero((counts[:-2] < counts[1:-1]) & (counts[2:] < counts[1:-1])) == 2
+
+
+def intermodes(counts: np.ndarray, edges: np.ndarray) -> typing.Optional[float]:
+    smoothed = counts.astype(np.float64)
+    iteration = 0
+    while not _is_bimodal(smoothed):
+        previous = np.concatenate([[0.0], smoothed[:-1]])
+        following = np.concatenate([smoothed[1:], [0.0]])
+        smoothed = (previous + smoothed + following) / 3
+        iteration += 1
+        if iteration > 10000:
+            return None
+    modes = np.nonzero((smoothed[:-2] < smoothed[1:-1]) & (smoothed[2:] < smoothed[1:-1]))[0] + 1
+    return _bin_center(edges, int(np.floor(modes.sum() / 2.0)))
+
+
+def iso_data(counts: np.ndarray, edges: np.ndarray) -> typing.Optional[float]:
+    indices = np.arange(counts.size)
+    cumulative = np.cumsum(counts)
+    cumulative_weighted = np.cumsum(counts * indices)
+    total, total_weighted = cumulative[-1], cumulative_weighted[-1]
+    for it in np.nonzero(counts)[0]:
+        if it > counts.size - 2:
+            break
+        low, high = cumulative[it], total - cumulative[it]
+        if low > 0 and high > 0:
+            middle = (cumulative_weighted[it] / low + (total_weighted - cumulative_weighted[it]) / high) / 2
+            if middle <= it:
+                return _bin_center(edges, int(it))
+    return None
+
+
+def kittler_illingworth(counts: np.ndarray, edges: np.ndarray) -> typing.Optional[float]:
+    centers = (edges[:-1] + edges[1:]) / 2
+    cum_a = np.cumsum(counts)
+    cum_b = np.cumsum(centers * counts)
+    cum_c = np.cumsum(centers * centers * counts)
+    a_end, b_end, c_end = cum_a[-1], cum_b[-1], cum_c[-1]
+    threshold = _bin_of_value(edges, b_end / a_end)
+    previous = -2
+    for _ in range(10000):
+        if threshold is None:
+            return None
+        if threshold == previous:
+            return _bin_center(edges, threshold)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mu = cum_b[threshold] / cum_a[threshold]
+            nu = (b_end - cum_b[threshold]) / (a_end - cum_a[threshold])
+            p = cum_a[threshold] / a_end
+            q = (a_end - cum_a[threshold]) / a_end
+            sigma2 = cum_c[threshold] / cum_a[threshold] - mu * mu
+            tau2 = (c_end - cum_c[threshold]) / (a_end - cum_a[threshold]) - nu * nu
+        if not sigma2 > 0 or not tau2 > 0:
+            return None
+        w0 = 1.0 / sigma2 - 1.0 / tau2
+        w1 = mu / sigma2 - nu / tau2
+        w2 = mu * mu / sigma2 - nu * nu / tau2 + np.log10((sigma2 * q * q) / (tau2 * p * p))
+        sqterm = w1 * w1 - w0 * w2
+        if sqterm < 0:
+            return None
+        previous = threshold
+        with np.errstate(divide="ignore", invalid="ignore"):
+            temp = (w1 + np.sqrt(sqterm)) / w0
+        if not np.isnan(temp):
+            threshold = _bin_of_value(edges, temp)
+    return None
+
+
+def moments(counts: np.ndarray, edges: np.ndarray) -> typing.Optional[float]:
+    norm = counts / counts.sum()
+    indices = np.arange(counts.size, dtype=np.float64)
+    m0 = 1.0
+    m1 = _seq_sum(indices * norm)
+    m2 = _seq_sum(indices * indices * norm)
+    m3 = _seq_sum(indices * indices * indices * norm)
+    cd = m0 * m2 - m1 * m1
+    c0 = (-m2 * m2 + m1 * m3) / cd
+    c1 = (m0 * -m3 + m2 * m1) / cd
+    with np.errstate(invalid="ignore"):
+        z0 = 0.5 * (-c1 - np.sqrt(c1 * c1 - 4 * c0))
+        z1 = 0.5 * (-c1 + np.sqrt(c1 * c1 - 4 * c0))
+    p0 = (z1 - m1) / (z1 - z0)
+    above = np.nonzero(np.cumsum(norm) > p0)[0]
+    if above.size == 0:
+        return None
+    return _bin_center(edges, int(above[0]))
+
+
+def calculate_histogram_threshold(
+    method: HistogramThresholdMethod,
+    data: np.ndarray,
+    mask: typing.Optional[np.ndarray],
+    bins: int,
+    upper: bool,
+    apply_mask: bool = True,
+    cache: typing.Optional[HistogramCache] = None,
+) -> typing.Optional[typing.Tuple[np.ndarray, typing.Any]]:
+    """
+    Calculate threshold mask using histogram based method.
+
+    :param method: threshold method
+    :param data: channel
+    :param mask: mask limiting result (voxels with non zero value)
+    :param bins: number of histogram bins
+    :param upper: if result contains voxels above threshold, otherwise voxels not above threshold
+    :param apply_mask: if histogram is limited to mask (voxels with value 1)
+    :param cache: cache of histograms, :py:data:`HISTOGRAM_CACHE` by default
+    :return: threshold mask and threshold value (extreme value of data in result) or None
+        if threshold could not be calculated from histogram
+    """
+    if data.dtype.kind not in "iuf" or data.dtype == np.float16:
+        return None
+    if cache is None:
+        cache = HISTOGRAM_CACHE
+    if mask is not None and mask.dtype not in (np.uint8, bool):
+        mask = mask > 0
+    histogram_mask = mask if apply_mask else None
+    histogram = cache.get(data, histogram_mask)
+    if histogram.count == 0 or histogram.minimum == histogram.maximum:
+        return None
+    counts, edges = histogram.histogram(bins, data, histogram_mask)
+    threshold = method(counts, edges)
+    if threshold is None:
+        return None
+    threshold = np.array(threshold).astype(data.dtype)
+    result = (data > threshold) if upper else (data <= threshold)
+    if mask is not None:
+        result &= mask != 0
+    threshold_value = histogram.nearest_value(threshold, upper) if apply_mask or mask is None else None
+    if threshold_value is None:
+        if not np.any(result):
+            threshold_value = np.min(-data) if upper else np.max(-data)
+        elif upper:
+            threshold_value = np.min(data, where=result, initial=histogram.data_max)
+        else:
+            threshold_value = np.max(data, where=result, initial=histogram.data_min)
+    return result.astype(np.uint8), threshold_value
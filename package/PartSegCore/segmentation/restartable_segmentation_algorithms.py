@@ -23,16 +23,31 @@ from ..utils import bisect
 from .algorithm_base import ROIExtractionAlgorithm, ROIExtractionResult, SegmentationLimitException
 from .mu_mid_point import BaseMuMid, MuMidSelection
 from .noise_filtering import NoiseFilterSelection
+from .stage_cache import STAGE_CACHE, array_digest, stage_key
 from .threshold import BaseThreshold, DoubleThresholdSelection, ThresholdSelection
 from .watershed import BaseWatershed, FlowMethodSelection, calculate_distances_array, get_neigh
 
 REQUIRE_MASK_STR = "Need mask"
+_CHUNK_SIZE = 2**22
 
 
 def blank_operator(_x, _y):
     raise NotImplementedError()
 
 
+def apply_lut(lut: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """
+    Map labels using lookup table (``result[i] = lut[labels[i]]``).
+    Array is processed in chunks to limit size of temporary index array.
+    """
+    result = np.empty(labels.shape, dtype=lut.dtype)
+    flat_labels = labels.reshape(-1)
+    flat_result = result.reshape(-1)
+    for i in range(0, flat_labels.size, _CHUNK_SIZE):
+        np.take(lut, flat_labels[i : i + _CHUNK_SIZE], out=flat_result[i : i + _CHUNK_SIZE])
+    return result
+
+
 class RestartableAlgorithm(ROIExtractionAlgorithm, ABC):
     """
     Base class for restartable segmentation algorithm. The idea is to store two copies
@@ -161,6 +176,9 @@ class ThresholdBaseAlgorithm(RestartableAlgorithm, ABC):
     """
     Base class for most threshold Algorithm implemented in PartSeg analysis.
     Created for reduce code repetition.
+
+    Results of noise filtering, thresholding and connected components are stored in
+    :py:data:`.STAGE_CACHE`, so they are shared between algorithm instances.
     """
 
     __argument_class__ = ThresholdBaseAlgorithmParameters
@@ -168,6 +186,8 @@ class ThresholdBaseAlgorithm(RestartableAlgorithm, ABC):
     new_parameters: ThresholdBaseAlgorithmParametersAnnot
 
     threshold_operator = staticmethod(blank_operator)
+    #: attributes set by :py:meth:`_threshold` which are stored in cache together with threshold mask
+    threshold_state_attributes: typing.Tuple[str, ...] = ("threshold_info",)
 
     def __init__(self, **kwargs):
         super().__init__()
@@ -177,6 +197,7 @@ class ThresholdBaseAlgorithm(RestartableAlgorithm, ABC):
         self.components_num = 0
         self.threshold_info = None
         self.old_threshold_info = None
+        self._stage_keys: typing.Dict[str, str] = {}
 
     def get_additional_layers(
         self, full_segmentation: typing.Optional[np.ndarray] = None
@@ -195,14 +216,16 @@ class ThresholdBaseAlgorithm(RestartableAlgorithm, ABC):
             "no size filtering": AdditionalLayerDescription(data=full_segmentation, layer_type="labels"),
         }
 
-    def prepare_result(self, roi: np.ndarray) -> ROIExtractionResult:
+    def prepare_result(self, roi: np.ndarray, sizes: typing.Optional[np.ndarray] = None) -> ROIExtractionResult:
         """
         Collect data for result.
 
         :param roi: array with segmentation
+        :param sizes: sizes of components of ``roi`` (indexed by component number), calculated if not provided
         :return: algorithm result description
         """
-        sizes = np.bincount(roi.flat)
+        if sizes is None:
+            sizes = np.bincount(roi.flat)
         annotation = {i: {"component": i, "voxels": size} for i, size in enumerate(sizes[1:], 1) if size > 0}
         return ROIExtractionResult(
             roi=roi,
@@ -245,16 +268,30 @@ class ThresholdBaseAlgorithm(RestartableAlgorithm, ABC):
             restarted = True
         if restarted or self.parameters["noise_filtering"] != self.new_parameters.noise_filtering:
             self.parameters["noise_filtering"] = deepcopy(self.new_parameters.noise_filtering)
-            noise_filtering_parameters = self.new_parameters.noise_filtering
-            self.cleaned_image = NoiseFilterSelection[noise_filtering_parameters.name].noise_filter(
-                self.channel, self.image.spacing, noise_filtering_parameters.values
+            self.cleaned_image = self._cached_stage(
+                "noise_filtering",
+                self._noise_filter,
+                STAGE_CACHE.image_token(self.image),
+                # spacing could be changed in place (Image.set_spacing)
+                list(self.image.spacing),
+                self.new_parameters.channel,
+                self.new_parameters.noise_filtering,
             )
             restarted = True
         if restarted or self.new_parameters.threshold != self.parameters["threshold"]:
             if self.parameters["threshold"] is None:
                 restarted = True
             self.parameters["threshold"] = deepcopy(self.new_parameters.threshold)
-            self.threshold_image = self._threshold(self.cleaned_image)
+            self.threshold_image, threshold_state = self._cached_stage(
+                "threshold",
+                self._threshold_stage,
+                self._stage_keys["noise_filtering"],
+                array_digest(self.mask),
+                f"{type(self)._threshold.__qualname__}.{self.threshold_operator.__name__}",
+                self.new_parameters.threshold,
+            )
+            for name, value in threshold_state.items():
+                setattr(self, name, value)
             if (
                 isinstance(self.threshold_info, (list, tuple))
                 and (self.old_threshold_info is None or self.old_threshold_info[0] != self.threshold_info[0])
@@ -264,11 +301,12 @@ class ThresholdBaseAlgorithm(RestartableAlgorithm, ABC):
                 return self._lack_of_components()
         if restarted or self.new_parameters.side_connection != self.parameters["side_connection"]:
             self.parameters["side_connection"] = self.new_parameters.side_connection
-            connect = SimpleITK.ConnectedComponent(
-                SimpleITK.GetImageFromArray(self.threshold_image), not self.new_parameters.side_connection
+            self.segmentation, self._sizes_array = self._cached_stage(
+                "components",
+                self._connected_components,
+                self._stage_keys["threshold"],
+                self.new_parameters.side_connection,
             )
-            self.segmentation = SimpleITK.GetArrayFromImage(SimpleITK.RelabelComponent(connect))
-            self._sizes_array = np.bincount(self.segmentation.flat)
             if len(self._sizes_array) < 2:
                 return self._lack_of_components()
             restarted = True
@@ -276,8 +314,7 @@ class ThresholdBaseAlgorithm(RestartableAlgorithm, ABC):
             self.parameters["minimum_size"] = self.new_parameters.minimum_size
             minimum_size = self.new_parameters.minimum_size
             ind = bisect(self._sizes_array[1:], minimum_size, operator.gt)
-            finally_segment = np.copy(self.segmentation)
-            finally_segment[finally_segment > ind] = 0
+            finally_segment = self._size_filter(ind)
             self.components_num = ind
             if ind == 0:
                 info_text = (
@@ -285,9 +322,48 @@ class ThresholdBaseAlgorithm(RestartableAlgorithm, ABC):
                 )
             else:
                 info_text = ""
-            res = self.prepare_result(finally_segment)
+            res = self.prepare_result(finally_segment, self._sizes_array[: ind + 1])
             return dataclasses.replace(res, info_text=info_text)
 
+    def _size_filter(self, components_num: int) -> np.ndarray:
+        """
+        Remove components smaller than the ``components_num`` biggest ones.
+        Components are sorted by size (see :py:meth:`_connected_components`),
+        so it is done with lookup table without recalculation of components sizes.
+        """
+        lut = np.arange(len(self._sizes_array), dtype=self.segmentation.dtype)
+        lut[components_num + 1 :] = 0
+        return apply_lut(lut, self.segmentation)
+
+    def _cached_stage(self, name: str, fun: typing.Callable[[], typing.Any], *key_parts):
+        """
+        Get result of stage from :py:data:`.STAGE_CACHE` or calculate it using ``fun``.
+
+        :param name: name of stage, key of stage is stored in :py:attr:`_stage_keys` under this name
+        :param fun: function calculating stage
+        :param key_parts: image identity, keys of previous stages and parameters of stage
+        """
+        key = stage_key(name, *key_parts)
+        self._stage_keys[name] = key
+        return STAGE_CACHE.get_or_calculate(key, STAGE_CACHE.image_token(self.image), fun)
+
+    def _noise_filter(self) -> np.ndarray:
+        noise_filtering_parameters = self.new_parameters.noise_filtering
+        return NoiseFilterSelection[noise_filtering_parameters.name].noise_filter(
+            self.channel, self.image.spacing, noise_filtering_parameters.values
+        )
+
+    def _threshold_stage(self) -> typing.Tuple[np.ndarray, typing.Dict[str, typing.Any]]:
+        threshold_image = self._threshold(self.cleaned_image)
+        return threshold_image, {name: getattr(self, name) for name in self.threshold_state_attributes}
+
+    def _connected_components(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        connect = SimpleITK.ConnectedComponent(
+            SimpleITK.GetImageFromArray(self.threshold_image), not self.new_parameters.side_connection
+        )
+        segmentation = SimpleITK.GetArrayFromImage(SimpleITK.RelabelComponent(connect))
+        return segmentation, np.bincount(segmentation.flat)
+
     def clean(self):
         super().clean()
         self.parameters: typing.Dict[str, typing.Optional[typing.Any]] = defaultdict(lambda: None)
@@ -381,6 +457,8 @@ class RangeThresholdAlgorithm(ThresholdBaseAlgorithm):
 
 
 class TwoLevelThresholdBaseAlgorithm(ThresholdBaseAlgorithm, ABC):
+    threshold_state_attributes = ("threshold_info", "sprawl_area")
+
     def __init__(self):
         super().__init__()
         self.sprawl_area = None
@@ -0,0 +1,175 @@
+"""
+This module contains cache of intermediate results of segmentation algorithms
+(like denoised channel, threshold mask or connected components).
+
+Results are identified by key build from image identity and parameters of all stages
+needed to calculate it (see :py:func:`stage_key`). Cache is shared between algorithm instances
+(:py:data:`STAGE_CACHE`), so switching between profiles or images does not repeat calculation
+of common stages. Least recently used results are dropped when memory limit is exceeded
+and all results for image are dropped when image is garbage collected.
+"""
+import hashlib
+import itertools
+import json
+import weakref
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+import numpy as np
+
+from PartSegCore.json_hooks import PartSegEncoder
+from PartSegImage import Image
+
+#: default memory limit of :py:data:`STAGE_CACHE` in bytes
+DEFAULT_MEMORY_LIMIT = 2**30
+
+
+def stage_key(*parts: Any) -> str:
+    """
+    Calculate key of stage result from its parts (image token, parameters, keys of previous stages).
+    Parts need to be serializable with :py:class:`.PartSegEncoder`.
+    """
+    return hashlib.sha256(json.dumps(parts, cls=PartSegEncoder, sort_keys=True).encode()).hexdigest()
+
+
+def array_digest(array: Optional[np.ndarray]) -> str:
+    """Digest of array content, used to identify masks"""
+    if array is None:
+        return "none"
+    digest = hashlib.blake2b(np.ascontiguousarray(array).data, digest_size=16)
+    digest.update(f"{array.dtype.str}{array.shape}".encode())
+    return digest.hexdigest()
+
+
+def _value_size(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_value_size(x) for x in value)
+    if isinstance(value, dict):
+        return sum(_value_size(x) for x in value.values())
+    return 0
+
+
+def _freeze(value: Any):
+    """Mark arrays as read only, so cached results could not be changed by one of its users"""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (list, tuple)):
+        for el in value:
+            _freeze(el)
+    elif isinstance(value, dict):
+        for el in value.values():
+            _freeze(el)
+
+
+class StageCache:
+    """
+    Memory bounded LRU cache of results of segmentation stages.
+
+    :param memory_limit: limit of memory (in bytes) of stored arrays, 0 disables cache
+    """
+
+    def __init__(self, memory_limit: int = DEFAULT_MEMORY_LIMIT):
+        self._memory_limit = memory_limit
+        self._data: "OrderedDict[str, Tuple[Any, int, str]]" = OrderedDict()
+        self._image_keys: Dict[str, Set[str]] = {}
+        self._image_tokens: "weakref.WeakKeyDictionary[Image, str]" = weakref.WeakKeyDictionary()
+        self._counter = itertools.count()
+        self._lock = RLock()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def memory_limit(self) -> int:
+        return self._memory_limit
+
+    @memory_limit.setter
+    def memory_limit(self, value: int):
+        with self._lock:
+            self._memory_limit = value
+            self._evict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def image_token(self, image: Image) -> str:
+        """
+        Identifier of image used as part of stage keys.
+        Results connected with image are dropped when image is garbage collected.
+        """
+        with self._lock:
+            token = self._image_tokens.get(image)
+            if token is None:
+                token = f"image_{next(self._counter)}"
+                self._image_tokens[image] = token
+                self._image_keys[token] = set()
+                weakref.finalize(image, self._drop_image, token)
+            return token
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get stored result or None"""
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key][0]
+
+    def put(self, key: str, value: Any, image_token: str):
+        """
+        Store result of stage calculated for image identified by ``image_token``.
+        Arrays in ``value`` are marked as read only.
+        """
+        size = _value_size(value)
+        with self._lock:
+            if size > self._memory_limit or image_token not in self._image_keys:
+                return
+            _freeze(value)
+            self._remove(key)
+            self._data[key] = value, size, image_token
+            self._image_keys[image_token].add(key)
+            self.memory += size
+            self._evict()
+
+    def get_or_calculate(self, key: str, image_token: str, fun: Callable[[], Any]) -> Any:
+        """Get stored result or calculate it with ``fun`` and store"""
+        value = self.get(key)
+        if value is None:
+            value = fun()
+            self.put(key, value, image_token)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            for keys in self._image_keys.values():
+                keys.clear()
+            self.memory = 0
+
+    def _remove(self, key: str):
+        if key not in self._data:
+            return
+        _, size, image_token = self._data.pop(key)
+        self.memory -= size
+        self._image_keys[image_token].discard(key)
+
+    def _evict(self):
+        while self._data and self.memory > self._memory_limit:
+            self._remove(next(iter(self._data)))
+
+    def _drop_image(self, image_token: str):
+        with self._lock:
+            for key in list(self._image_keys.get(image_token, ())):
+                self._remove(key)
+            self._image_keys.pop(image_token, None)
+
+
+#: cache shared by all segmentation algorithms
+STAGE_CACHE = StageCache()
@@ -10,6 +10,7 @@ from pydantic import Field
 from PartSegCore.utils import BaseModel
 
 from ..algorithm_describe_base import AlgorithmDescribeBase, AlgorithmSelection
+from . import histogram_threshold
 from .algorithm_base import SegmentationLimitException
 
 
@@ -61,6 +62,8 @@ class ManualThreshold(BaseThreshold):
 
 class SitkThreshold(BaseThreshold, ABC):
     __argument_class__ = SimpleITKThresholdParams128
+    #: NumPy implementation of method working on cached histogram, SimpleITK filter is used if None
+    histogram_method: typing.Optional[histogram_threshold.HistogramThresholdMethod] = None
 
     @classmethod
     @update_argument("arguments")
@@ -69,6 +72,12 @@ class SitkThreshold(BaseThreshold, ABC):
     ):
         if mask is not None and mask.dtype != np.uint8:
             mask = (mask > 0).astype(np.uint8)
+        if cls.histogram_method is not None:
+            calculated = histogram_threshold.calculate_histogram_threshold(
+                cls.histogram_method, data, mask, arguments.bins, operator(1, 0), arguments.apply_mask
+            )
+            if calculated is not None:
+                return calculated
         ob, bg, th_op = (0, 1, np.min) if operator(1, 0) else (1, 0, np.max)
         image_sitk = sitk.GetImageFromArray(data)
         if arguments.apply_mask and mask is not None:
@@ -88,6 +97,8 @@ class SitkThreshold(BaseThreshold, ABC):
 
 
 class OtsuThreshold(SitkThreshold):
+    histogram_method = staticmethod(histogram_threshold.otsu)
+
     @classmethod
     def get_name(cls):
         return "Otsu"
@@ -99,6 +110,7 @@ class OtsuThreshold(SitkThreshold):
 
 class LiThreshold(SitkThreshold):
     __argument_class__ = SimpleITKThresholdParams256
+    histogram_method = staticmethod(histogram_threshold.li)
 
     @classmethod
     def get_name(cls):
@@ -135,6 +147,7 @@ class RenyiEntropyThreshold(SitkThreshold):
 
 class ShanbhagThreshold(SitkThreshold):
     __argument_class__ = SimpleITKThresholdParams256
+    histogram_method = staticmethod(histogram_threshold.shanbhag)
 
     @classmethod
     def get_name(cls):
@@ -147,6 +160,7 @@ class ShanbhagThreshold(SitkThreshold):
 
 class TriangleThreshold(SitkThreshold):
     __argument_class__ = SimpleITKThresholdParams256
+    histogram_method = staticmethod(histogram_threshold.triangle)
 
     @classmethod
     def get_name(cls):
@@ -159,6 +173,7 @@ class TriangleThreshold(SitkThreshold):
 
 class YenThreshold(SitkThreshold):
     __argument_class__ = SimpleITKThresholdParams256
+    histogram_method = staticmethod(histogram_threshold.yen)
 
     @classmethod
     def get_name(cls):
@@ -171,6 +186,7 @@ class YenThreshold(SitkThreshold):
 
 class HuangThreshold(SitkThreshold):
     __argument_class__ = SimpleITKThresholdParams256
+    histogram_method = staticmethod(histogram_threshold.huang)
 
     @classmethod
     def get_name(cls):
@@ -183,6 +199,7 @@ class HuangThreshold(SitkThreshold):
 
 class IntermodesThreshold(SitkThreshold):
     __argument_class__ = SimpleITKThresholdParams256
+    histogram_method = staticmethod(histogram_threshold.intermodes)
 
     @classmethod
     def get_name(cls):
@@ -200,6 +217,7 @@ class IntermodesThreshold(SitkThreshold):
 
 class IsoDataThreshold(SitkThreshold):
     __argument_class__ = SimpleITKThresholdParams256
+    histogram_method = staticmethod(histogram_threshold.iso_data)
 
     @classmethod
     def get_name(cls):
@@ -212,6 +230,7 @@ class IsoDataThreshold(SitkThreshold):
 
 class KittlerIllingworthThreshold(SitkThreshold):
     __argument_class__ = SimpleITKThresholdParams256
+    histogram_method = staticmethod(histogram_threshold.kittler_illingworth)
 
     @classmethod
     def get_name(cls):
@@ -229,6 +248,7 @@ class KittlerIllingworthThreshold(SitkThreshold):
 
 class MomentsThreshold(SitkThreshold):
     __argument_class__ = SimpleITKThresholdParams256
+    histogram_method = staticmethod(histogram_threshold.moments)
 
     @classmethod
     def get_name(cls):
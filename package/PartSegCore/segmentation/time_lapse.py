@@ -0,0 +1,192 @@
+"""
+This module contains driver which allows to use segmentation algorithms which do not support time data
+(see :py:meth:`.ROIExtractionAlgorithm.support_time`) on time-lapse images.
+Each time point is segmented separately (optionally in parallel) and results are merged in one ROI.
+"""
+import typing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from copy import deepcopy
+
+import numpy as np
+
+from PartSegImage import Image
+
+from ..algorithm_describe_base import ROIExtractionProfile
+from ..project_info import AdditionalLayerDescription
+from .algorithm_base import ROIExtractionAlgorithm, ROIExtractionResult
+from .threshold import DoubleThresholdSelection, ThresholdSelection
+
+
+def _empty_fun(_a1, _a2):
+    pass
+
+
+def get_frame(image: Image, time: int) -> Image:
+    """Get single time point of image as view on image data"""
+    slices = [slice(None)] * len(image.array_axis_order)
+    slices[image.time_pos] = slice(time, time + 1)
+    return image.cut_image(slices, frame=0, view=True)
+
+
+def segment_frame(
+    algorithm_class: typing.Type[ROIExtractionAlgorithm],
+    parameters: typing.Any,
+    image: Image,
+    mask: typing.Optional[np.ndarray],
+) -> typing.Tuple[ROIExtractionResult, typing.Any]:
+    """
+    Segment single time point.
+
+    :return: result of segmentation and threshold information of algorithm (if present)
+    """
+    algorithm = algorithm_class()
+    algorithm.set_image(image)
+    algorithm.set_mask(mask)
+    algorithm.set_parameters(deepcopy(parameters))
+    result = algorithm.calculation_run(_empty_fun)
+    return result, getattr(algorithm, "threshold_info", None)
+
+
+def fixed_threshold_parameters(parameters: typing.Any, threshold_info: typing.Any) -> typing.Any:
+    """
+    Replace threshold of algorithm parameters with manual threshold
+    of value calculated by algorithm (``threshold_info``).
+
+    :raises ValueError: if parameters do not contain supported threshold
+    """
+    threshold = getattr(parameters, "threshold", None)
+    if isinstance(threshold, ThresholdSelection) and np.isscalar(threshold_info):
+        new_threshold = _manual_threshold(threshold_info)
+    elif isinstance(threshold, DoubleThresholdSelection) and len(threshold_info) == 2:
+        new_threshold = DoubleThresholdSelection(
+            name="Base/Core",
+            values={
+                "core_threshold": _manual_threshold(threshold_info[0]),
+                "base_threshold": _manual_threshold(threshold_info[1]),
+            },
+        )
+    else:
+        raise ValueError("Reuse of threshold is supported only for threshold based algorithms")
+    return parameters.copy(update={"threshold": new_threshold})
+
+
+def _manual_threshold(value) -> ThresholdSelection:
+    return ThresholdSelection(name="Manual", values={"threshold": float(value)})
+
+
+def get_frame_masks(image: Image, mask: typing.Optional[np.ndarray]) -> typing.List[typing.Optional[np.ndarray]]:
+    """Split mask on time points. Mask without time axis is used for all time points."""
+    if mask is None:
+        return [None] * image.times
+    try:
+        mask = image.fit_array_to_image(mask)
+    except ValueError:
+        return [mask] * image.times
+    return [np.take(mask, [t], axis=image.time_pos) for t in range(image.times)]
+
+
+def _create_executor(workers: int, use_processes: bool) -> Executor:
+    if use_processes:
+        return ProcessPoolExecutor(workers)
+    return ThreadPoolExecutor(workers)
+
+
+def segment_time_lapse(
+    algorithm_class: typing.Type[ROIExtractionAlgorithm],
+    parameters: typing.Any,
+    image: Image,
+    mask: typing.Optional[np.ndarray] = None,
+    workers: int = 1,
+    use_processes: bool = False,
+    reuse_threshold: bool = False,
+    reference_time: int = 0,
+    report_fun: typing.Callable[[str, int], typing.Any] = _empty_fun,
+) -> ROIExtractionResult:
+    """
+    Segment each time point of image with algorithm and merge results.
+    Components of all time points are numbered consecutively, so each component has unique number.
+    Annotation of each component contains its ``time``.
+
+    :param algorithm_class: segmentation algorithm
+    :param parameters: parameters of algorithm
+    :param image: time-lapse image
+    :param mask: mask limiting segmentation area, with or without time axis
+    :param workers: number of time points segmented in parallel
+    :param use_processes: use process pool instead of thread pool
+    :param reuse_threshold: calculate threshold on ``reference_time`` point and use it for all time points
+        (see :py:func:`fixed_threshold_parameters`)
+    :param reference_time: time point used to calculate threshold
+    :param report_fun: function used to trace progress (number of segmented time points)
+    """
+    frames = [get_frame(image, t) for t in range(image.times)]
+    masks = get_frame_masks(image, mask)
+    report_fun("max", image.times)
+    if reuse_threshold:
+        _, threshold_info = segment_frame(algorithm_class, parameters, frames[reference_time], masks[reference_time])
+        parameters = fixed_threshold_parameters(parameters, threshold_info)
+    if workers > 1 and image.times > 1:
+        with _create_executor(min(workers, image.times), use_processes) as executor:
+            futures = [
+                executor.submit(segment_frame, algorithm_class, parameters, frame, frame_mask)
+                for frame, frame_mask in zip(frames, masks)
+            ]
+            results = []
+            for i, future in enumerate(futures, 1):
+                results.append(future.result()[0])
+                report_fun("step", i)
+    else:
+        results = []
+        for i, (frame, frame_mask) in enumerate(zip(frames, masks), 1):
+            results.append(segment_frame(algorithm_class, parameters, frame, frame_mask)[0])
+            report_fun("step", i)
+    return merge_time_results(results, frames, parameters, algorithm_class.get_name())
+
+
+def merge_time_results(
+    results: typing.List[ROIExtractionResult], frames: typing.List[Image], parameters: typing.Any, algorithm_name: str
+) -> ROIExtractionResult:
+    """
+    Merge results of segmentation of each time point of image.
+
+    :param results: results for consecutive time points
+    :param frames: consecutive time points of image (see :py:func:`get_frame`)
+    :param parameters: parameters of algorithm
+    :param algorithm_name: name of algorithm
+    """
+    time_pos = frames[0].time_pos
+
+    def stack(arrays: typing.List[np.ndarray], relabel: bool) -> np.ndarray:
+        arrays = [np.take(frame.fit_array_to_image(x), 0, axis=time_pos) for frame, x in zip(frames, arrays)]
+        if relabel:
+            arrays = [np.where(x > 0, x.astype(dtype) + offset, 0).astype(dtype) for x, offset in zip(arrays, offsets)]
+        return np.stack(arrays, axis=time_pos)
+
+    offsets = np.cumsum([0] + [int(x.roi.max()) for x in results[:-1]])
+    dtype = np.min_scalar_type(int(offsets[-1]) + int(results[-1].roi.max()))
+    roi = stack([x.roi for x in results], True)
+    annotation = {}
+    for t, (result, offset) in enumerate(zip(results, offsets)):
+        for num, value in result.roi_annotation.items():
+            annotation[int(num + offset)] = {**value, "time": t}
+    alternative_representation = {
+        name: stack([x.alternative_representation[name] for x in results], True)
+        for name in results[0].alternative_representation
+        if all(name in x.alternative_representation for x in results)
+    }
+    additional_layers = {}
+    for name, layer in results[0].additional_layers.items():
+        layers = [x.additional_layers.get(name) for x in results]
+        if layer.data is None or any(x is None or x.data is None or x.data.shape != layer.data.shape for x in layers):
+            continue
+        additional_layers[name] = AdditionalLayerDescription(
+            data=stack([x.data for x in layers], False), layer_type=layer.layer_type, name=layer.name
+        )
+    info_text = "\n".join(f"Time {t}: {x.info_text}" for t, x in enumerate(results) if x.info_text)
+    return ROIExtractionResult(
+        roi=roi,
+        parameters=ROIExtractionProfile(name="", algorithm=algorithm_name, values=parameters),
+        additional_layers=additional_layers,
+        info_text=info_text,
+        roi_annotation=annotation,
+        alternative_representation=alternative_representation,
+    )
@@ -1,8 +1,11 @@
+import os
 import re
 import typing
 import warnings
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
+from copy import copy
 
 import numpy as np
 
@@ -15,6 +18,7 @@ _DEF = object()
 FRAME_THICKNESS = 2
 
 DEFAULT_SCALE_FACTOR = 10**9
+RANGE_CHUNK_SIZE = 2**22  #: number of array elements reduced at once by :py:func:`calculate_range`
 
 
 def minimal_dtype(val: int):
@@ -65,6 +69,66 @@ def reduce_array(
     return translate[array]
 
 
+def _split_on_chunks(array: np.ndarray, chunk_size: int) -> typing.List[np.ndarray]:
+    """split array on views along first non trivial axis, each with about chunk_size elements"""
+    if array.size <= chunk_size:
+        return [array]
+    axis = next(i for i, size in enumerate(array.shape) if size > 1)
+    step = max(1, chunk_size * array.shape[axis] // array.size)
+    prefix = (slice(None),) * axis
+    return [array[prefix + (slice(i, i + step),)] for i in range(0, array.shape[axis], step)]
+
+
+def _min_max(array: np.ndarray) -> typing.Tuple[typing.Any, typing.Any]:
+    return np.min(array), np.max(array)
+
+
+def calculate_range(array: np.ndarray, workers: typing.Optional[int] = None) -> typing.Tuple[typing.Any, typing.Any]:
+    """
+    Calculate minimum and maximum of array with single pass over data.
+    Array is reduced in chunks, so maximum is calculated when chunk is still in cache
+    and memory mapped data is read from disc only once.
+
+    :param array: array to reduce
+    :param workers: number of threads used for reduction, if None then number of cpu is used
+    :return: minimum and maximum of array
+    """
+    chunks = _split_on_chunks(array, RANGE_CHUNK_SIZE)
+    if len(chunks) == 1:
+        return _min_max(array)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            result = list(executor.map(_min_max, chunks))
+    else:
+        result = [_min_max(x) for x in chunks]
+    min_li, max_li = zip(*result)
+    return np.min(min_li), np.max(max_li)
+
+
+class _LazyRanges:
+    """
+    Brightness ranges of channels calculated on first access.
+    Object is shared between image and images derived from it (like crops), so ranges are calculated
+    once and derived images do not need to process data. Channel arrays are kept only until calculation.
+    """
+
+    def __init__(self, channel_arrays: typing.List[np.ndarray]):
+        self._channel_arrays: typing.Optional[typing.List[np.ndarray]] = channel_arrays
+        self._value: typing.Optional[typing.List[typing.Tuple[typing.Any, typing.Any]]] = None
+
+    def get(self) -> typing.List[typing.Tuple[typing.Any, typing.Any]]:
+        if self._value is None:
+            self._value = [calculate_range(x) for x in self._channel_arrays]
+            self._channel_arrays = None
+        return self._value
+
+    def __getstate__(self):
+        # do not serialize data of parent image together with derived image
+        return {"_channel_arrays": None, "_value": self.get()}
+
+
 class Image:
     """
     Base class for Images used in PartSeg
@@ -74,7 +138,7 @@ class Image:
     :param file_path: path to image on disc
     :param mask: mask array in shape z,y,x
     :param default_coloring: default colormap - not used yet
-    :param ranges: default ranges for channels
+    :param ranges: default ranges for channels. If not provided, then are calculated on first access
     :param channel_names: labels for channels
     :param axes_order: allow to create Image object form data with different axes order, or missed axes
 
@@ -130,11 +194,8 @@ class Image:
                 "Data should have same number of dimensions "
                 f"like length of axes_order (axis :{len(axes_order)}, ndim: {ndim}"
             )
-        if not isinstance(image_spacing, tuple):
-            image_spacing = tuple(image_spacing)
         self._channel_arrays = self._split_data_on_channels(data, axes_order)
-        self._image_spacing = (1.0,) * (3 - len(image_spacing)) + image_spacing
-        self._image_spacing = tuple(el if el > 0 else 10**-6 for el in self._image_spacing)
+        self._image_spacing = self._prepare_spacing(image_spacing)
 
         self._shift = tuple(shift) if shift is not None else (0,) * len(self._image_spacing)
         self.name = name
@@ -145,12 +206,8 @@ class Image:
             self.default_coloring = [np.array(x) for x in default_coloring]
 
         self._channel_names = self._prepare_channel_names(channel_names, self.channels)
-        if ranges is None:
-            self.ranges = list(
-                zip((np.min(c) for c in self._channel_arrays), (np.max(c) for c in self._channel_arrays))
-            )
-        else:
-            self.ranges = ranges
+        self._ranges = ranges
+        self._lazy_ranges = _LazyRanges(self._channel_arrays)
         self._mask_array = self._prepare_mask(mask, data, axes_order)
         if self._mask_array is not None:
             self._mask_array = self.fit_mask_to_image(self._mask_array)
@@ -172,6 +229,11 @@ class Image:
 
         return mask
 
+    @staticmethod
+    def _prepare_spacing(image_spacing: Spacing) -> Spacing:
+        image_spacing = (1.0,) * (3 - len(image_spacing)) + tuple(image_spacing)
+        return tuple(el if el > 0 else 10**-6 for el in image_spacing)
+
     @staticmethod
     def _prepare_channel_names(channel_names, channels_num) -> typing.List[str]:
         default_channel_names = [f"channel {i + 1}" for i in range(channels_num)]
@@ -255,6 +317,26 @@ class Image:
 
         return self.substitute(data=data, ranges=self.ranges + image.ranges, channel_names=channel_names)
 
+    @property
+    def ranges(self) -> typing.List[typing.Tuple[typing.Any, typing.Any]]:
+        """
+        brightness ranges for each channel. Calculated on first access if not provided in constructor.
+        Images derived from this image (see :py:meth:`cut_image`, :py:meth:`substitute`) inherit ranges.
+        """
+        if self._ranges is None:
+            self._ranges = self._lazy_ranges.get()
+        return self._ranges
+
+    @ranges.setter
+    def ranges(self, value: typing.List[typing.Tuple[typing.Any, typing.Any]]):
+        self._ranges = value
+
+    def _inherit_ranges(self, image: "Image") -> "Image":
+        """Set ranges of derived image to ranges of this image without calculating them"""
+        image._ranges = self._ranges
+        image._lazy_ranges = self._lazy_ranges
+        return image
+
     @property
     def channel_names(self) -> typing.List[str]:
         return self._channel_names[:]
@@ -333,16 +415,33 @@ class Image:
         default_coloring=None,
         ranges=None,
         channel_names=None,
+        view: bool = False,
     ) -> "Image":
-        """Create copy of image with substitution of not None elements"""
-        data = self._channel_arrays if data is None else data
+        """
+        Create copy of image with substitution of not None elements
+
+        :param bool view: if data and mask are not substituted, then share them with this image instead of copying.
+        """
+        if view and data is None and mask is _DEF:
+            res = self._view(self._channel_arrays, self._mask_array)
+            if image_spacing is not None:
+                res._image_spacing = self._prepare_spacing(image_spacing)
+            if file_path is not None:
+                res.file_path = file_path
+            if default_coloring is not None:
+                res.default_coloring = [np.array(x) for x in default_coloring]
+            if ranges is not None:
+                res.ranges = ranges
+            if channel_names is not None:
+                res._channel_names = self._prepare_channel_names(channel_names, self.channels)
+            return res
+        data = self._image_data_normalize(self._channel_arrays) if data is None else data
         image_spacing = self._image_spacing if image_spacing is None else image_spacing
         file_path = self.file_path if file_path is None else file_path
         mask = self._mask_array if mask is _DEF else mask
         default_coloring = self.default_coloring if default_coloring is None else default_coloring
-        ranges = self.ranges if ranges is None else ranges
         channel_names = self.channel_names if channel_names is None else channel_names
-        return self.__class__(
+        res = self.__class__(
             data=data,
             image_spacing=image_spacing,
             file_path=file_path,
@@ -352,6 +451,18 @@ class Image:
             channel_names=channel_names,
             axes_order=self.axis_order,
         )
+        return res if ranges is not None else self._inherit_ranges(res)
+
+    def _view(self, channel_arrays: typing.List[np.ndarray], mask: typing.Optional[np.ndarray]) -> "Image":
+        """
+        Create image sharing metadata with this image with given (already fitted) channel arrays and mask.
+        Ranges are inherited like in copy (see :py:meth:`cut_image`).
+        Skip all checks and processing done in constructor.
+        """
+        res = copy(self)
+        res._channel_arrays = channel_arrays
+        res._mask_array = mask
+        return self._inherit_ranges(res)
 
     def set_mask(self, mask: typing.Optional[np.ndarray], axes: typing.Optional[str] = None):
         """
@@ -672,14 +783,14 @@ class Image:
         cut_area = self.fit_array_to_image(cut_area)
         new_cut = tuple(self._roi_to_slices(cut_area))
         catted_cut_area = cut_area[new_cut]
-        new_image = [x[new_cut] for x in self._channel_arrays]
-        for el in new_image:
-            el[catted_cut_area == 0] = 0
+        # np.where instead of in place zeroing to not modify (possibly read only) parent arrays
+        new_image = [np.where(catted_cut_area, x[new_cut], 0).astype(x.dtype, copy=False) for x in self._channel_arrays]
         if replace_mask:
             new_mask = catted_cut_area
         elif self._mask_array is not None:
-            new_mask = self._mask_array[new_cut]
-            new_mask[catted_cut_area == 0] = 0
+            new_mask = np.where(catted_cut_area, self._mask_array[new_cut], 0).astype(
+                self._mask_array.dtype, copy=False
+            )
         important_axis = "XY" if self.is_2d else "XYZ"
         new_image = [
             self._frame_array(x, self.calc_index_to_frame(self.array_axis_order, important_axis), frame)
@@ -695,6 +806,7 @@ class Image:
         replace_mask=False,
         frame: int = FRAME_THICKNESS,
         zero_out_cut_area: bool = True,
+        view: bool = False,
     ) -> "Image":
         """
         Create new image base on mask or list of slices
@@ -703,8 +815,12 @@ class Image:
         :param typing.Union[np.ndarray, typing.Iterable[slice]] cut_area: area to cut. Defined with slices or mask
         :param int frame: additional frame around cut_area
         :param bool zero_out_cut_area:
+        :param bool view: if true, then returned image shares data with this image (no copy is done).
+            Mask is not relabeled in such case. Cannot be used together with zeroing cut area.
         :return: Image
         """
+        if view:
+            return self._cut_image_view(cut_area, replace_mask, frame, zero_out_cut_area)
         if isinstance(cut_area, np.ndarray):
             if zero_out_cut_area:
                 new_image, new_mask = self._cut_with_roi(cut_area, replace_mask, frame)
@@ -716,17 +832,34 @@ class Image:
         else:
             new_image, new_mask = self._cut_image_slices(cut_area, frame)
 
-        return self.__class__(
-            data=self._image_data_normalize(new_image),
-            image_spacing=self._image_spacing,
-            file_path=None,
-            mask=new_mask,
-            default_coloring=self.default_coloring,
-            ranges=self.ranges,
-            channel_names=self.channel_names,
-            axes_order=self.axis_order,
+        return self._inherit_ranges(
+            self.__class__(
+                data=self._image_data_normalize(new_image),
+                image_spacing=self._image_spacing,
+                file_path=None,
+                mask=new_mask,
+                default_coloring=self.default_coloring,
+                channel_names=self.channel_names,
+                axes_order=self.axis_order,
+            )
         )
 
+    def _cut_image_view(
+        self, cut_area: typing.Union[np.ndarray, typing.Iterable[slice]], replace_mask, frame: int, zero_out_cut_area
+    ) -> "Image":
+        if isinstance(cut_area, np.ndarray):
+            if zero_out_cut_area:
+                raise ValueError("View of image cannot be created if cut area need to be zeroed")
+            new_cut = self._roi_to_slices(cut_area)
+            new_image, new_mask = self._cut_image_slices(new_cut, frame)
+            if replace_mask:
+                new_mask = self.fit_array_to_image(cut_area)[tuple(self._frame_cut_area(new_cut, frame))]
+        else:
+            new_image, new_mask = self._cut_image_slices(cut_area, frame)
+        res = self._view(new_image, new_mask)
+        res.file_path = None
+        return res
+
     def get_imagej_colors(self):
         # TODO review
         if self.default_coloring is None:
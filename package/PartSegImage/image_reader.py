@@ -45,6 +45,7 @@ class BaseImageReader:
     def __init__(self, callback_function=None):
         self.default_spacing = 10**-6, 10**-6, 10**-6
         self.spacing = self.default_spacing
+        self.memory_map = False
         if callback_function is None:
             self.callback_function = lambda x, y: 0
         else:
@@ -80,6 +81,7 @@ class BaseImageReader:
         mask_path=None,
         callback_function: typing.Optional[typing.Callable] = None,
         default_spacing: typing.Tuple[float, float, float] = None,
+        memory_map: bool = False,
     ) -> Image:
         """
         read image file with optional mask file
@@ -89,12 +91,15 @@ class BaseImageReader:
         :param callback_function: function for provide information about progress in reading file (for progressbar)
         :param default_spacing: used if file do not contains information about spacing
             (or metadata format is not supported)
+        :param memory_map: if possible do not load image data to memory but map it from file.
+            Currently supported only for uncompressed, contiguous TIFF files
         :return: image
         """
         # TODO add generic description of callback function
         instance = cls(callback_function)
         if default_spacing is not None:
             instance.set_default_spacing(default_spacing)
+        instance.memory_map = memory_map
         return instance.read(image_path, mask_path)
 
     @classmethod
@@ -119,7 +124,8 @@ class BaseImageReader:
             while i < len(axes_li):
                 name = axes_li[i]
                 if name not in final_mapping_dict and array.shape[i] == 1:
-                    array = array.take(0, i)
+                    # indexing instead of take to keep view on memory mapped data
+                    array = array[(slice(None),) * i + (0,)]
                     axes_li.pop(i)
                 else:
                     i += 1
@@ -160,6 +166,7 @@ class BaseImageReaderBuffer(BaseImageReader):
         mask_path=None,
         callback_function: typing.Optional[typing.Callable] = None,
         default_spacing: typing.Tuple[float, float, float] = None,
+        memory_map: bool = False,
     ) -> Image:
         """
         read image file with optional mask file
@@ -169,12 +176,15 @@ class BaseImageReaderBuffer(BaseImageReader):
         :param callback_function: function for provide information about progress in reading file (for progressbar)
         :param default_spacing: used if file do not contains information about spacing
             (or metadata format is not supported)
+        :param memory_map: if possible do not load image data to memory but map it from file.
+            Currently supported only for uncompressed, contiguous TIFF files
         :return: image
         """
         # TODO add generic description of callback function
         instance = cls(callback_function)
         if default_spacing is not None:
             instance.set_default_spacing(default_spacing)
+        instance.memory_map = memory_map
         return instance.read(image_path, mask_path)
 
 
@@ -196,7 +206,9 @@ class GenericImageReader(BaseImageReaderBuffer):
         if ext == ".obsep":
             assert not isinstance(image_path, BytesIO)  # nosec
             return ObsepImageReader.read_image(image_path, mask_path, self.callback_function, self.default_spacing)
-        return TiffImageReader.read_image(image_path, mask_path, self.callback_function, self.default_spacing)
+        return TiffImageReader.read_image(
+            image_path, mask_path, self.callback_function, self.default_spacing, memory_map=self.memory_map
+        )
 
 
 class OifImagReader(BaseImageReader):
@@ -376,11 +388,15 @@ class TiffImageReader(BaseImageReaderBuffer):
                 mask_data = None
                 self.callback_function("max", total_pages_num)
 
-            image_file.report_func = report_func
-            try:
-                image_data = image_file.asarray()
-            except ValueError as e:  # pragma: no cover
-                raise TiffFileException(*e.args)
+            image_data = self._memory_map_data(image_file, image_path) if self.memory_map else None
+            if image_data is None:
+                image_file.report_func = report_func
+                try:
+                    image_data = image_file.asarray()
+                except ValueError as e:  # pragma: no cover
+                    raise TiffFileException(*e.args)
+            else:
+                self.callback_function("step", total_pages_num)
             image_data = self.update_array_shape(image_data, axes)
 
         if not isinstance(image_path, (str, Path)):
@@ -398,6 +414,24 @@ class TiffImageReader(BaseImageReaderBuffer):
             name=self.name,
         )
 
+    @staticmethod
+    def _memory_map_data(image_file: TiffFile, image_path) -> typing.Optional[np.ndarray]:
+        """
+        Map image data from file without reading it to memory.
+
+        :return: read only memory mapped array or None if data cannot be mapped
+            (buffer input, compressed or not contiguous data)
+        """
+        if not isinstance(image_path, (str, Path)):
+            return None
+        series = image_file.series[0]
+        offset = series.dataoffset
+        if offset is None:
+            return None
+        return np.memmap(
+            image_path, dtype=image_file.byteorder + series.dtype.char, mode="r", offset=offset, shape=series.shape
+        )
+
     @staticmethod
     def verify_mask(mask_file, image_file):
         """
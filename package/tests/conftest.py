@@ -6,12 +6,21 @@ import signal
 from copy import deepcopy
 from pathlib import Path
 from queue import Empty
+from typing import List, Optional, Sequence
 
 import numpy as np
 import pytest
 
 from PartSegCore.algorithm_describe_base import ROIExtractionProfile
 from PartSegCore.analysis import ProjectTuple
+from PartSegCore.analysis.calculation_plan import (
+    Calculation,
+    CalculationPlan,
+    CalculationTree,
+    MaskCreate,
+    MeasurementCalculate,
+    RootType,
+)
 from PartSegCore.analysis.measurement_base import AreaType, MeasurementEntry, PerComponent
 from PartSegCore.analysis.measurement_calculation import ComponentsNumber, MeasurementProfile, Volume
 from PartSegCore.image_operations import RadiusType
@@ -19,7 +28,8 @@ from PartSegCore.mask.io_functions import MaskProjectTuple
 from PartSegCore.mask_create import MaskProperty
 from PartSegCore.roi_info import ROIInfo
 from PartSegCore.segmentation.restartable_segmentation_algorithms import LowerThresholdAlgorithm
-from PartSegImage import Image
+from PartSegCore.universal_const import Units
+from PartSegImage import Image, ImageWriter
 
 
 @pytest.fixture(scope="module")
@@ -228,6 +238,114 @@ def measurement_profiles():
     )
 
 
+class BatchBuilder:
+    """
+    Builder of calculation plans and input files for batch processing tests.
+
+    :param directory: directory in which images and measurement file are placed
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    @staticmethod
+    def segmentation(name: str = "test", threshold: int = 50, minimum_size: int = 20) -> ROIExtractionProfile:
+        parameters = {
+            "channel": 0,
+            "minimum_size": minimum_size,
+            "threshold": {"name": "Manual", "values": {"threshold": threshold}},
+            "noise_filtering": {"name": "None", "values": {}},
+            "side_connection": False,
+        }
+        return ROIExtractionProfile(name=name, algorithm=LowerThresholdAlgorithm.get_name(), values=parameters)
+
+    @staticmethod
+    def mask_create(name: str, radius: int = 1) -> MaskCreate:
+        mask_property = MaskProperty(
+            dilate=RadiusType.R2D,
+            dilate_radius=radius,
+            fill_holes=RadiusType.NO,
+            max_holes_size=0,
+            save_components=False,
+            clip_to_mask=False,
+        )
+        return MaskCreate(name=name, mask_property=mask_property)
+
+    @staticmethod
+    def measurement(mask: bool = False) -> MeasurementCalculate:
+        chosen_fields = [
+            MeasurementEntry(
+                name="ROI Volume",
+                calculation_tree=Volume.get_starting_leaf().replace_(area=AreaType.ROI, per_component=PerComponent.No),
+            ),
+        ]
+        if mask:
+            chosen_fields.append(
+                MeasurementEntry(
+                    name="Mask Volume",
+                    calculation_tree=Volume.get_starting_leaf().replace_(
+                        area=AreaType.Mask, per_component=PerComponent.No
+                    ),
+                )
+            )
+        profile = MeasurementProfile(name="measure", chosen_fields=chosen_fields, name_prefix="")
+        return MeasurementCalculate(channel=-1, units=Units.nm, measurement_profile=profile, name_prefix="")
+
+    def plan(
+        self, name: str = "test", minimum_size: int = 20, children: Optional[List[CalculationTree]] = None
+    ) -> CalculationPlan:
+        """
+        :param children: children of plan root. If not provided, then plan
+            contains single segmentation followed by measurement.
+        """
+        if children is None:
+            segmentation = self.segmentation(minimum_size=minimum_size)
+            children = [CalculationTree(segmentation, [CalculationTree(self.measurement(), [])])]
+        return CalculationPlan(tree=CalculationTree(RootType.Image, children), name=name)
+
+    def images(self, names: Sequence[str], mask: bool = False) -> List[str]:
+        """
+        Write images with objects of different size to directory.
+
+        :param names: paths of images relative to directory
+        :param mask: if also write mask for each image with ``_mask`` suffix
+        :return: absolute paths of images
+        """
+        res = []
+        for i, name in enumerate(names):
+            data = np.zeros((5, 30, 30), dtype=np.uint8)
+            data[1:-1, 5:20, 5 : 20 + i] = 60
+            data[1:-1, 10:15, 10:15] = 100
+            file_path = self.directory / name
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            ImageWriter.save(Image(data, (1e-6,) * 3, axes_order="ZYX"), str(file_path))
+            if mask:
+                mask_data = np.zeros(data.shape, dtype=np.uint8)
+                mask_data[:, :, :12] = 1
+                ImageWriter.save_mask(
+                    Image(data, (1e-6,) * 3, axes_order="ZYX", mask=mask_data),
+                    str(file_path.with_name(f"{file_path.stem}_mask{file_path.suffix}")),
+                )
+            res.append(str(file_path))
+        return res
+
+    def calculation(self, file_list: List[str], plan: Optional[CalculationPlan] = None) -> Calculation:
+        return Calculation(
+            file_list,
+            base_prefix=str(self.directory),
+            result_prefix=str(self.directory),
+            measurement_file_path=str(self.directory / "test.xlsx"),
+            sheet_name="Sheet1",
+            calculation_plan=self.plan() if plan is None else plan,
+            voxel_size=(1e-6,) * 3,
+        )
+
+
+@pytest.fixture
+def batch_builder(tmp_path):
+    return BatchBuilder(tmp_path)
+
+
 def pytest_collection_modifyitems(session, config, items):
     image_tests = [x for x in items if "PartSegImage" in str(x.fspath)]
     core_tests = [x for x in items if "PartSegCore" in str(x.fspath)]
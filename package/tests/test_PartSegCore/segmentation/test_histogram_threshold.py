@@ -0,0 +1,156 @@
+import gc
+import operator
+
+import numpy as np
+import pytest
+
+from PartSegCore.segmentation import histogram_threshold as ht
+from PartSegCore.segmentation.algorithm_base import SegmentationLimitException
+from PartSegCore.segmentation.threshold import SitkThreshold, threshold_dict
+
+histogram_methods = [x for x in threshold_dict.values() if getattr(x, "histogram_method", None) is not None]
+
+
+def sitk_calculate_mask(method, data, mask, arguments, op, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(method, "histogram_method", None)
+        return method.calculate_mask(data=data, mask=mask, arguments=arguments, operator=op)
+
+
+def random_data(dtype, seed):
+    rng = np.random.default_rng(seed)
+    data = np.zeros((10, 40, 40))
+    data[2:-2, 5:30, 5:30] = rng.normal(100, 20, size=(6, 25, 25))
+    data[3:-3, 10:20, 10:20] += rng.normal(200, 30, size=(4, 10, 10))
+    data += rng.normal(10, 5, size=data.shape)
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        data = np.clip(data, info.min, info.max)
+    return data.astype(dtype)
+
+
+@pytest.mark.parametrize("method", histogram_methods, ids=lambda x: x.get_name())
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.int16, np.float32, np.float64])
+@pytest.mark.parametrize("op", [operator.lt, operator.gt])
+@pytest.mark.parametrize("apply_mask", [True, False])
+def test_same_as_sitk(method, dtype, op, apply_mask, monkeypatch):
+    data = random_data(dtype, 5)
+    mask = np.zeros(data.shape, dtype=np.uint8)
+    mask[1:-1, 2:35, 2:35] = 1
+    arguments = method.__argument_class__(apply_mask=apply_mask, bins=128)
+    try:
+        expected = sitk_calculate_mask(method, data, mask, arguments, op, monkeypatch)
+    except SegmentationLimitException:
+        expected = None
+    if expected is None:
+        with pytest.raises(SegmentationLimitException):
+            method.calculate_mask(data=data, mask=mask, arguments=arguments, operator=op)
+        return
+    result, threshold = method.calculate_mask(data=data, mask=mask, arguments=arguments, operator=op)
+    assert result.dtype == np.uint8
+    assert np.array_equal(result, expected[0])
+    assert threshold == expected[1]
+
+
+@pytest.mark.parametrize("method", histogram_methods, ids=lambda x: x.get_name())
+@pytest.mark.parametrize("bins", [8, 256, 1000])
+def test_same_as_sitk_without_mask(method, bins, monkeypatch):
+    data = random_data(np.int16, 7) - 50
+    arguments = method.__argument_class__(apply_mask=True, bins=bins)
+    try:
+        expected = sitk_calculate_mask(method, data, None, arguments, operator.gt, monkeypatch)
+    except SegmentationLimitException:
+        pytest.skip("SimpleITK filter fails for this data")
+    result, threshold = method.calculate_mask(data=data, mask=None, arguments=arguments, operator=operator.gt)
+    assert np.array_equal(result, expected[0])
+    assert threshold == expected[1]
+
+
+def test_histogram_edges():
+    edges = ht.histogram_edges(np.dtype(np.uint8), 10, 20, 256)
+    assert edges[0] == -0.5
+    assert edges[-1] == 255.5
+    assert edges.size == 257
+    edges = ht.histogram_edges(np.dtype(np.uint16), 10, 20, 10)
+    assert edges[0] == 10
+    assert edges[-1] > 20
+
+
+def test_bin_indices():
+    edges = np.array([0, 1, 2, 3, 4], dtype=np.float64)
+    values = np.array([-1, 0, 0.5, 1, 3.99, 4, 5])
+    assert list(ht._bin_indices(values, edges)) == [-1, 0, 0, 1, 3, 4, 4]
+
+
+def test_channel_histogram_value_counts():
+    data = np.array([[1, 1, 3], [7, 7, 7]], dtype=np.uint16)
+    mask = np.array([[1, 0, 1], [1, 1, 0]], dtype=np.uint8)
+    histogram = ht.ChannelHistogram(data, mask)
+    assert histogram.count == 4
+    assert list(histogram.values) == [1, 3, 7]
+    assert list(histogram.value_counts) == [1, 1, 2]
+    assert histogram.nearest_value(3, True) == 7
+    assert histogram.nearest_value(3, False) == 3
+    assert histogram.nearest_value(7, True) is None
+    counts, _ = histogram.histogram(8, data, mask)
+    assert counts.sum() == 4
+
+
+def test_degenerate_data_fallback():
+    data = np.ones((5, 5), dtype=np.uint16)
+    assert ht.calculate_histogram_threshold(ht.otsu, data, None, 128, True) is None
+    mask = np.zeros(data.shape, dtype=np.uint8)
+    data[0, 0] = 5
+    assert ht.calculate_histogram_threshold(ht.otsu, data, mask, 128, True) is None
+    assert ht.calculate_histogram_threshold(ht.otsu, data.astype(np.float16), None, 128, True) is None
+    assert ht.calculate_histogram_threshold(ht.otsu, data, None, 128, True) is not None
+
+
+class TestHistogramCache:
+    def test_read_only_data(self):
+        cache = ht.HistogramCache()
+        data = random_data(np.uint16, 1)
+        data.flags.writeable = False
+        histogram = cache.get(data, None)
+        assert cache.get(data, None) is histogram
+        assert len(cache) == 1
+        mask = np.zeros(data.shape, dtype=np.uint8)
+        mask[2:-2] = 1
+        histogram2 = cache.get(data, mask)
+        assert histogram2 is not histogram
+        assert cache.get(data, mask.copy()) is histogram2
+        assert len(cache) == 2
+        del data, histogram, histogram2
+        gc.collect()
+        assert len(cache) == 0
+
+    def test_writable_data(self):
+        cache = ht.HistogramCache()
+        data = random_data(np.uint16, 1)
+        assert cache.get(data, None) is not cache.get(data, None)
+        assert len(cache) == 0
+
+    def test_size_limit(self):
+        cache = ht.HistogramCache(size=2)
+        arrays = [random_data(np.uint8, i) for i in range(3)]
+        for array in arrays:
+            array.flags.writeable = False
+            cache.get(array, None)
+        assert len(cache) == 2
+
+    def test_threshold_uses_cache(self, monkeypatch):
+        cache = ht.HistogramCache()
+        monkeypatch.setattr(ht, "HISTOGRAM_CACHE", cache)
+        data = random_data(np.uint16, 3)
+        data.flags.writeable = False
+        for method in histogram_methods:
+            arguments = method.get_default_values()
+            try:
+                method.calculate_mask(data=data, mask=None, arguments=arguments, operator=operator.gt)
+            except SegmentationLimitException:  # pragma: no cover
+                pass
+        assert len(cache) == 1
+
+
+def test_sitk_threshold_base_has_no_histogram_method():
+    assert SitkThreshold.histogram_method is None
@@ -0,0 +1,192 @@
+import gc
+
+import numpy as np
+import pytest
+
+from PartSegCore.algorithm_describe_base import ROIExtractionProfile
+from PartSegCore.analysis.calculate_pipeline import calculate_segmentation_step
+from PartSegCore.segmentation import restartable_segmentation_algorithms as rsa
+from PartSegCore.segmentation.noise_filtering import DimensionType, NoiseFilterSelection
+from PartSegCore.segmentation.stage_cache import StageCache, array_digest, stage_key
+from PartSegImage import Image
+
+
+def empty(*_):
+    pass
+
+
+@pytest.fixture
+def image():
+    data = np.zeros((10, 40, 40), dtype=np.uint16)
+    data[2:-2, 5:20, 5:20] = 60
+    data[2:-2, 25:35, 25:35] = 80
+    data[3:-3, 10:15, 10:15] = 100
+    return Image(data, (1, 1, 1), axes_order="ZYX")
+
+
+@pytest.fixture
+def stage_cache(monkeypatch):
+    cache = StageCache()
+    monkeypatch.setattr(rsa, "STAGE_CACHE", cache)
+    return cache
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    res = []
+    for name in ["_noise_filter", "_threshold_stage", "_connected_components"]:
+        original = getattr(rsa.ThresholdBaseAlgorithm, name)
+
+        def wrap(self, _original=original, _name=name):
+            res.append(_name)
+            return _original(self)
+
+        monkeypatch.setattr(rsa.ThresholdBaseAlgorithm, name, wrap)
+    return res
+
+
+def lower_threshold_parameters(threshold, minimum_size=10):
+    parameters = rsa.LowerThresholdAlgorithm.get_default_values()
+    parameters.threshold.values.threshold = threshold
+    parameters.noise_filtering = NoiseFilterSelection(
+        name="Gauss", values=NoiseFilterSelection["Gauss"].get_default_values()
+    )
+    parameters.minimum_size = minimum_size
+    return parameters
+
+
+def run_algorithm(algorithm_class, image, parameters, mask=None):
+    algorithm = algorithm_class()
+    algorithm.set_image(image)
+    algorithm.set_mask(mask)
+    algorithm.set_parameters(parameters)
+    return algorithm, algorithm.calculation_run(empty)
+
+
+def test_stage_key():
+    assert stage_key("a", {"b": 1, "c": 2}) == stage_key("a", {"c": 2, "b": 1})
+    assert stage_key("a", 1) != stage_key("a", 2)
+    data = np.zeros((5, 5), dtype=np.uint8)
+    assert array_digest(data) == array_digest(data.copy())
+    assert array_digest(data) != array_digest(data.astype(np.uint16))
+    assert array_digest(None) == "none"
+
+
+def test_stage_cache(image):
+    cache = StageCache(memory_limit=250)
+    token = cache.image_token(image)
+    assert cache.image_token(image) == token
+    arr1, arr2 = np.zeros(100, dtype=np.uint8), np.zeros(100, dtype=np.uint8)
+    cache.put("a", arr1, token)
+    cache.put("b", (arr2, {"info": 1}), token)
+    assert not arr1.flags.writeable
+    assert cache.memory == 200
+    assert cache.get("a") is arr1
+    cache.put("c", np.zeros(100, dtype=np.uint8), token)
+    assert "b" not in cache
+    assert len(cache) == 2
+    cache.put("d", np.zeros(300, dtype=np.uint8), token)
+    assert "d" not in cache
+    assert cache.get_or_calculate("e", token, lambda: 1) == 1
+    assert cache.get_or_calculate("e", token, lambda: 2) == 1
+    cache.memory_limit = 100
+    assert cache.memory == 100
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_stage_cache_image_collected():
+    cache = StageCache()
+    image = Image(np.zeros((5, 5, 5), dtype=np.uint8), (1, 1, 1), axes_order="ZYX")
+    cache.put("a", np.zeros(10), cache.image_token(image))
+    assert len(cache) == 1
+    del image
+    gc.collect()
+    assert len(cache) == 0
+    assert cache.memory == 0
+
+
+def test_shared_between_instances(image, stage_cache, calls):
+    _, result1 = run_algorithm(rsa.LowerThresholdAlgorithm, image, lower_threshold_parameters(50))
+    assert calls == ["_noise_filter", "_threshold_stage", "_connected_components"]
+    calls.clear()
+    _, result2 = run_algorithm(rsa.LowerThresholdAlgorithm, image, lower_threshold_parameters(70))
+    assert calls == ["_threshold_stage", "_connected_components"]
+    calls.clear()
+    _, result3 = run_algorithm(rsa.LowerThresholdAlgorithm, image, lower_threshold_parameters(50, 20))
+    assert calls == []
+    assert np.array_equal(result1.roi, result3.roi)
+    assert not np.array_equal(result1.roi, result2.roi)
+    assert stage_cache.hits > 0
+
+    _, result4 = run_algorithm(rsa.UpperThresholdAlgorithm, image, lower_threshold_parameters(50))
+    assert calls == ["_threshold_stage", "_connected_components"]
+    assert not np.array_equal(result1.roi, result4.roi)
+    calls.clear()
+    mask = np.zeros(image.get_channel(0).shape, dtype=np.uint8)
+    mask[..., :20] = 1
+    run_algorithm(rsa.LowerThresholdAlgorithm, image, lower_threshold_parameters(50), mask)
+    assert calls == ["_threshold_stage", "_connected_components"]
+
+
+def test_spacing_change(image, stage_cache, calls):
+    parameters = lower_threshold_parameters(50)
+    parameters.noise_filtering.values.dimension_type = DimensionType.Layer
+    algorithm1, _ = run_algorithm(rsa.LowerThresholdAlgorithm, image, parameters)
+    image.set_spacing((1e-6, 3e-6, 3e-6))
+    calls.clear()
+    algorithm2, _ = run_algorithm(rsa.LowerThresholdAlgorithm, image, parameters)
+    assert calls == ["_noise_filter", "_threshold_stage", "_connected_components"]
+    image2 = image.substitute(image_spacing=(1e-6, 3e-6, 3e-6))
+    algorithm3, _ = run_algorithm(rsa.LowerThresholdAlgorithm, image2, parameters)
+    assert np.array_equal(algorithm2.cleaned_image, algorithm3.cleaned_image)
+    assert not np.array_equal(algorithm1.cleaned_image, algorithm2.cleaned_image)
+
+
+def test_two_level_threshold(image, stage_cache, calls):
+    parameters = rsa.LowerThresholdFlowAlgorithm.get_default_values()
+    parameters.threshold.values.core_threshold.values.threshold = 90
+    parameters.threshold.values.base_threshold.values.threshold = 50
+    parameters.minimum_size = 10
+    algorithm1, result1 = run_algorithm(rsa.LowerThresholdFlowAlgorithm, image, parameters)
+    calls.clear()
+    algorithm2, result2 = run_algorithm(rsa.LowerThresholdFlowAlgorithm, image, parameters)
+    assert calls == []
+    assert np.array_equal(result1.roi, result2.roi)
+    assert algorithm2.sprawl_area is algorithm1.sprawl_area
+    assert algorithm2.threshold_info == algorithm1.threshold_info
+
+
+def test_calculate_segmentation_step(image, stage_cache, calls):
+    profile1 = ROIExtractionProfile(name="1", algorithm="Lower threshold", values=lower_threshold_parameters(50))
+    profile2 = ROIExtractionProfile(name="2", algorithm="Lower threshold", values=lower_threshold_parameters(70))
+    result1, _ = calculate_segmentation_step(profile1, image, None)
+    calculate_segmentation_step(profile2, image, None)
+    calls.clear()
+    result3, _ = calculate_segmentation_step(profile1, image, None)
+    calculate_segmentation_step(profile2, image, None)
+    assert calls == []
+    assert np.array_equal(result1.roi, result3.roi)
+
+
+def test_minimum_size_change(image, stage_cache, calls):
+    algorithm, result1 = run_algorithm(rsa.LowerThresholdAlgorithm, image, lower_threshold_parameters(50))
+    assert len(result1.roi_annotation) == 2
+    calls.clear()
+    algorithm.set_parameters(lower_threshold_parameters(50, 1000))
+    result2 = algorithm.calculation_run(empty)
+    assert calls == []
+    assert result2.roi.dtype == algorithm.segmentation.dtype
+    assert np.array_equal(result2.roi, np.where(algorithm.segmentation > 1, 0, algorithm.segmentation))
+    sizes = np.bincount(result2.roi.flat)
+    assert result2.roi_annotation == {1: {"component": 1, "voxels": sizes[1]}}
+    assert result2.roi.flags.writeable
+
+
+def test_apply_lut(monkeypatch):
+    monkeypatch.setattr(rsa, "_CHUNK_SIZE", 7)
+    labels = np.arange(60, dtype=np.uint16).reshape(3, 4, 5) % 5
+    lut = np.array([0, 1, 2, 0, 0], dtype=np.uint16)
+    result = rsa.apply_lut(lut, labels)
+    assert result.shape == labels.shape
+    assert np.array_equal(result, lut[labels])
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from PartSegCore.algorithm_describe_base import ROIExtractionProfile
+from PartSegCore.analysis.batch_processing.batch_backend import CalculationProcess
+from PartSegCore.analysis.calculate_pipeline import calculate_segmentation_step
+from PartSegCore.segmentation.restartable_segmentation_algorithms import (
+    LowerThresholdAlgorithm,
+    LowerThresholdFlowAlgorithm,
+)
+from PartSegCore.segmentation.threshold import DoubleThresholdSelection, ThresholdSelection
+from PartSegCore.segmentation.time_lapse import (
+    fixed_threshold_parameters,
+    get_frame,
+    get_frame_masks,
+    segment_frame,
+    segment_time_lapse,
+)
+from PartSegImage import Image
+
+
+@pytest.fixture
+def time_image():
+    data = np.zeros((3, 6, 30, 30), dtype=np.uint16)
+    for t in range(3):
+        data[t, 1:-1, 2:10, 2 : 10 + t] = 50 + 20 * t
+        data[t, 1:-1, 15:25, 15:25] = 70 + 20 * t
+    data[2, 1:-1, 2:5, 25:28] = 100
+    return Image(data, (1, 1, 1), axes_order="TZYX")
+
+
+def parameters(threshold=40, minimum_size=10):
+    values = LowerThresholdAlgorithm.get_default_values()
+    values.threshold = ThresholdSelection(name="Manual", values={"threshold": threshold})
+    values.minimum_size = minimum_size
+    return values
+
+
+def test_get_frame(time_image):
+    frame = get_frame(time_image, 1)
+    assert frame.times == 1
+    assert np.shares_memory(frame.get_channel(0), time_image.get_channel(0))
+    assert np.array_equal(frame.get_channel(0)[0], time_image.get_channel(0)[1])
+
+
+def test_get_frame_masks(time_image):
+    assert get_frame_masks(time_image, None) == [None] * 3
+    mask = np.ones((6, 30, 30), dtype=np.uint8)
+    assert all(x is mask for x in get_frame_masks(time_image, mask))
+    mask = np.zeros((3, 6, 30, 30), dtype=np.uint8)
+    mask[1] = 1
+    masks = get_frame_masks(time_image, mask)
+    assert [x.shape for x in masks] == [(1, 6, 30, 30)] * 3
+    assert [x.max() for x in masks] == [0, 1, 0]
+
+
+@pytest.mark.parametrize("workers,use_processes", [(1, False), (2, False), (2, True)])
+def test_segment_time_lapse(time_image, workers, use_processes):
+    report = []
+    result = segment_time_lapse(
+        LowerThresholdAlgorithm,
+        parameters(),
+        time_image,
+        workers=workers,
+        use_processes=use_processes,
+        report_fun=lambda *args: report.append(args),
+    )
+    assert report[0] == ("max", 3)
+    assert report[-1] == ("step", 3)
+    assert result.roi.shape == (3, 6, 30, 30)
+    assert result.roi.max() == 7
+    assert [len(np.unique(result.roi[t])) - 1 for t in range(3)] == [2, 2, 3]
+    assert set(result.roi_annotation) == set(range(1, 8))
+    assert [result.roi_annotation[i]["time"] for i in range(1, 8)] == [0, 0, 1, 1, 2, 2, 2]
+    for t in range(3):
+        frame_result, _ = segment_frame(LowerThresholdAlgorithm, parameters(), get_frame(time_image, t), None)
+        assert np.array_equal(result.roi[t] > 0, frame_result.roi > 0)
+    assert result.additional_layers["denoised image"].data.shape == (3, 6, 30, 30)
+    assert result.roi_info.bound_info[5].lower[0] == 2
+    assert result.parameters.algorithm == LowerThresholdAlgorithm.get_name()
+
+
+def test_segment_time_lapse_mask(time_image):
+    mask = np.zeros((6, 30, 30), dtype=np.uint8)
+    mask[:, :, :12] = 1
+    result = segment_time_lapse(LowerThresholdAlgorithm, parameters(), time_image, mask)
+    assert result.roi.max() == 3
+    assert np.all(result.roi[..., 12:] == 0)
+
+
+def test_reuse_threshold(time_image):
+    values = parameters()
+    values.threshold = ThresholdSelection(name="Otsu", values=ThresholdSelection["Otsu"].get_default_values())
+    result = segment_time_lapse(LowerThresholdAlgorithm, values, time_image, reuse_threshold=True, reference_time=2)
+    assert result.parameters.values.threshold.name == "Manual"
+    threshold = result.parameters.values.threshold.values.threshold
+    _, threshold_info = segment_frame(LowerThresholdAlgorithm, values, get_frame(time_image, 2), None)
+    assert threshold == threshold_info
+    assert np.array_equal(result.roi > 0, time_image.get_channel(0) > threshold)
+
+
+def test_fixed_threshold_parameters():
+    values = fixed_threshold_parameters(parameters(), np.uint16(30))
+    assert values.threshold.values.threshold == 30
+    flow_values = fixed_threshold_parameters(LowerThresholdFlowAlgorithm.get_default_values(), (40, 20))
+    assert isinstance(flow_values.threshold, DoubleThresholdSelection)
+    assert flow_values.threshold.values.core_threshold.values.threshold == 40
+    assert flow_values.threshold.values.base_threshold.values.threshold == 20
+    with pytest.raises(ValueError, match="threshold based"):
+        fixed_threshold_parameters({"a": 1}, 10)
+
+
+def test_calculate_segmentation_step(time_image):
+    profile = ROIExtractionProfile(name="", algorithm=LowerThresholdAlgorithm.get_name(), values=parameters())
+    result, text = calculate_segmentation_step(profile, time_image, None, workers=2)
+    assert result.roi.shape == (3, 6, 30, 30)
+    assert result.roi.max() == 7
+    assert text == ""
+
+
+def test_batch_segmentation(time_image):
+    process = CalculationProcess()
+    process.image = time_image
+    profile = ROIExtractionProfile(name="", algorithm=LowerThresholdAlgorithm.get_name(), values=parameters())
+    roi_info, additional_layers = process._calculate_segmentation(profile)
+    assert roi_info.roi.shape == (3, 6, 30, 30)
+    assert len(roi_info.bound_info) == 7
+    assert "denoised image" in additional_layers
@@ -1,5 +1,6 @@
 # pylint: disable=R0201
 
+import json
 import os
 import shutil
 import sys
@@ -7,6 +8,7 @@ import time
 import warnings
 from glob import glob
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -15,7 +17,10 @@ from PartSegCore.analysis.batch_processing import batch_backend
 from PartSegCore.analysis.batch_processing.batch_backend import (
     CalculationManager,
     CalculationProcess,
+    DataWriter,
     ResponseData,
+    ResultStore,
+    SheetData,
     do_calculation,
 )
 from PartSegCore.analysis.calculation_plan import (
@@ -664,3 +669,103 @@ class MockCalculationProcess(CalculationProcess):
         if os.path.basename(calculation.file_path) == "stack1_component1.tif":
             time.sleep(0.5)
         return super().do_calculation(calculation)
+
+
+class TestFileData:
+    def test_sheet_data_new_rows(self):
+        sheet = SheetData("test", [("a", "b")])
+        sheet.add_data(["x", 1], None)
+        sheet.add_data(["y", 2], None)
+        rows = sheet.get_new_rows()
+        assert [x[0] for x in rows] == [0, 1]
+        assert sheet.get_new_rows() == []
+        sheet.add_data(["z", 3], None)
+        rows2 = sheet.get_new_rows()
+        assert rows2[0][0] == 2
+        df = sheet.create_data_frame(rows2 + rows)
+        assert list(df["name"]["units"]) == ["x", "y", "z"]
+
+    def test_result_store(self):
+        store = ResultStore()
+        store.append([("a", [(0, [1])]), ("b", [(0, [2])])])
+        store.append([("a", [(1, [3])])])
+        assert store.read() == {"a": [(0, [1]), (1, [3])], "b": [(0, [2])]}
+        store.close()
+        assert not os.path.exists(store.path)
+
+    @staticmethod
+    def prepare_calculation(file_path, image):
+        plan = TestCalculationProcess.create_calculation_plan()
+        calc = Calculation(
+            [],
+            base_prefix=os.path.dirname(file_path),
+            result_prefix=os.path.dirname(file_path),
+            measurement_file_path=file_path,
+            sheet_name="Sheet1",
+            calculation_plan=plan,
+            voxel_size=(1, 1, 1),
+        )
+        measurement = plan.get_measurements()[0]
+        roi = (image.get_channel(0) > 0).astype(np.uint8)
+        image.set_mask(np.ones(roi.shape[1:], dtype=np.uint8))
+        result = measurement.measurement_profile.calculate(image, 0, roi, measurement.units)
+        result.set_filename(image.file_path)
+        return calc, result
+
+    def test_incremental_write(self, tmp_path, image, monkeypatch):
+        calc, result = self.prepare_calculation(str(tmp_path / "test.xlsx"), image)
+        writer = DataWriter()
+        writer.add_data_part(calc)
+        file_data = writer.file_dict[calc.measurement_file_path]
+        file_data.write_threshold = 3
+        append_list = []
+        monkeypatch.setattr(file_data.result_store, "append", append_list.append)
+        for i in range(7):
+            writer.add_result(ResponseData(f"file_{i}.tif", [result]), calc, ind=6 - i)
+        for _ in range(20):
+            if writer.writing_finished():
+                break
+            time.sleep(0.1)  # pragma: no cover
+        assert [len(x[0][1]) for x in append_list] == [3, 3]
+        assert not os.path.exists(calc.measurement_file_path)
+        monkeypatch.undo()
+        for chunk in append_list:
+            file_data.result_store.append(chunk)
+        writer.calculation_finished(calc)
+        writer.finish()
+        file_data.write_thread.join(5)
+        assert not os.path.exists(file_data.result_store.path)
+        df = pd.read_excel(calc.measurement_file_path, index_col=0, header=[0, 1], engine=ENGINE)
+        assert df.shape == (7, 4)
+        assert list(df["name"]["units"]) == [f"file_{i}.tif" for i in reversed(range(7))]
+
+    def test_arrow_not_available(self, tmp_path, image, monkeypatch):
+        monkeypatch.setattr(batch_backend, "arrow_output_available", lambda: False)
+        calc, _ = self.prepare_calculation(str(tmp_path / "test.parquet"), image)
+        with pytest.raises(ImportError, match="pyarrow"):
+            DataWriter().add_data_part(calc)
+
+    @pytest.mark.parametrize("ext", [".parquet", ".feather"])
+    def test_arrow_write(self, tmp_path, image, ext):
+        pyarrow = pytest.importorskip("pyarrow")
+        calc, result = self.prepare_calculation(str(tmp_path / f"test{ext}"), image)
+        writer = DataWriter()
+        writer.add_data_part(calc)
+        for i in range(5):
+            writer.add_result(ResponseData(f"file_{i}.tif", [result]), calc, ind=i)
+        writer.add_calculation_error(calc, "file_5.tif", ValueError("test"))
+        writer.calculation_finished(calc)
+        writer.finish()
+        writer.file_dict[calc.measurement_file_path].write_thread.join(5)
+        file_path = str(tmp_path / f"test_Sheet1{ext}")
+        table = (pyarrow.parquet.read_table if ext == ".parquet" else pyarrow.feather.read_table)(file_path)
+        df = table.to_pandas()
+        assert df.shape == (5, 4)
+        assert list(df["name"]) == [f"file_{i}.tif" for i in range(5)]
+        assert df["Segmentation Components Number"].dtype.kind == "i"
+        assert df["Segmentation Volume"].dtype.kind == "f"
+        metadata = json.loads(table.schema.metadata[b"PartSeg"])
+        assert metadata["sheet_name"] == "Sheet1"
+        assert metadata["units"]["Segmentation Components Number"] == "count"
+        assert metadata["calculation_plan"]["__values__"]["name"] == "test"
+        assert os.path.exists(tmp_path / f"test_Errors{ext}")
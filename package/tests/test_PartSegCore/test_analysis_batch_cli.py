@@ -0,0 +1,105 @@
+import json
+import os
+from threading import Thread
+
+import pandas as pd
+import pytest
+
+from PartSegCore.analysis import batch
+from PartSegCore.analysis.batch_processing.batch_journal import journal_path
+from PartSegCore.analysis.batch_processing.remote_backend import RemoteWorkerServer
+from PartSegCore.json_hooks import PartSegEncoder
+from PartSegCore.universal_const import Units
+
+
+@pytest.fixture
+def plan_path(tmp_path, batch_builder):
+    path = tmp_path / "plans.json"
+    plans = {"test": batch_builder.plan("test"), "test2": batch_builder.plan("test2", 10)}
+    with open(path, "w", encoding="utf-8") as f_p:
+        json.dump(plans, f_p, cls=PartSegEncoder)
+    return str(path)
+
+
+@pytest.fixture
+def images(batch_builder):
+    return batch_builder.images(["data/img_0.tif", "data/img_1.tif", "data/sub/img_2.tif"])
+
+
+def test_load_plan(plan_path):
+    assert batch.load_plan(plan_path, "test2").name == "test2"
+    with pytest.raises(ValueError, match="multiple plans"):
+        batch.load_plan(plan_path)
+    with pytest.raises(ValueError, match="There is no plan aaa"):
+        batch.load_plan(plan_path, "aaa")
+
+
+def test_collect_files(tmp_path, images):
+    assert batch.collect_files([str(tmp_path / "data" / "*.tif")]) == images[:2]
+    assert batch.collect_files([str(tmp_path / "data" / "**" / "*.tif")]) == sorted(images)
+    list_path = tmp_path / "list.txt"
+    list_path.write_text(f"{images[2]}\n\n{images[0]}\n{tmp_path / 'missing.tif'}\n")
+    assert batch.collect_files([images[0]], str(list_path)) == [images[0], images[2]]
+
+
+def test_create_calculation(tmp_path, plan_path, images, batch_builder):
+    args = batch.create_parser().parse_args(
+        [plan_path, *images, "-o", str(tmp_path / "res.xlsx"), "--voxel-size", "2", "1", "1", "--units", "um"]
+    )
+    assert args.units == Units.µm
+    calculation = batch.create_calculation(args, batch_builder.plan(), images)
+    assert calculation.voxel_size == (2e-6, 1e-6, 1e-6)
+    assert calculation.base_prefix == str(tmp_path / "data")
+    assert calculation.result_prefix == str(tmp_path)
+
+
+def test_main(tmp_path, plan_path, images, capsys):
+    output = str(tmp_path / "res.xlsx")
+    pattern = str(tmp_path / "data" / "**" / "*.tif")
+    assert (
+        batch.main(
+            [plan_path, pattern, "-o", output, "--plan-name", "test", "-j", "2", "--journal", "--prefetch-depth", "1"]
+        )
+        == 0
+    )
+    out = capsys.readouterr().out
+    assert "Processed 3/3 files" in out
+    df = pd.read_excel(output, index_col=0, header=[0, 1])
+    assert df.shape == (3, 2)
+    assert os.path.exists(journal_path(output))
+
+    assert batch.main([plan_path, pattern, "-o", output, "--plan-name", "test", "--resume"]) == 0
+    assert pd.read_excel(output, index_col=0, header=[0, 1]).equals(df)
+
+
+def test_main_errors(tmp_path, plan_path, images, capsys):
+    output = str(tmp_path / "res.xlsx")
+    (tmp_path / "broken.tif").write_bytes(b"aaa")
+    files = [images[0], str(tmp_path / "broken.tif")]
+    assert batch.main([plan_path, *files, "-o", output, "--plan-name", "test"]) == 1
+    assert "broken.tif" in capsys.readouterr().err
+    with pytest.raises(SystemExit) as exc:
+        batch.main([plan_path, str(tmp_path / "*.czi"), "-o", output, "--plan-name", "test"])
+    assert exc.value.code == 2
+
+
+def test_main_remote(tmp_path, plan_path, images, monkeypatch):
+    monkeypatch.setenv("PARTSEG_BATCH_AUTHKEY", "test_key")
+    server = RemoteWorkerServer(("127.0.0.1", 0), workers=2)
+
+    def serve_once():
+        with server.listener.accept() as connection:
+            server.serve_connection(connection)
+        server.close()
+
+    thread = Thread(target=serve_once)
+    thread.start()
+    output = str(tmp_path / "res.xlsx")
+    address = f"127.0.0.1:{server.address[1]}"
+    assert batch.main([plan_path, *images, "-o", output, "--plan-name", "test", "--remote", address]) == 0
+    thread.join(5)
+    assert not thread.is_alive()
+    assert pd.read_excel(output, index_col=0, header=[0, 1]).shape == (3, 2)
+    with pytest.raises(SystemExit) as exc:
+        batch.main([plan_path, *images, "-o", output, "--plan-name", "test", "--remote", address])
+    assert exc.value.code == 2
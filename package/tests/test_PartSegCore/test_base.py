@@ -3,7 +3,8 @@
 import numpy as np
 import pytest
 
-from PartSegCore.image_operations import gaussian, median
+from PartSegCore import image_operations
+from PartSegCore.image_operations import TilingParameters, bilateral, gaussian, get_tiling, median, set_tiling
 
 
 class TestImageOperation:
@@ -24,3 +25,31 @@ class TestImageOperation:
         data[slices] = 1
         res = method(data, 2, per_layer)
         assert not np.all(res == data)
+
+    @pytest.mark.parametrize("shape", [(30, 33), (4, 30, 33), (2, 2, 30, 33)])
+    @pytest.mark.parametrize(
+        "method,radius", [(gaussian, 1), (gaussian, 30), (gaussian, [1, 4, 9]), (median, 2), (bilateral, 1)]
+    )
+    @pytest.mark.parametrize("per_layer", [True, False])
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_tiled_filter(self, shape, method, radius, per_layer, workers):
+        if isinstance(radius, list) and len(shape) != 3:
+            pytest.skip("radius per axis")
+        data = (np.random.default_rng(0).random(shape) * 1000).astype(np.uint16)
+        set_tiling(None)
+        expected = method(data, radius, per_layer)
+        set_tiling(TilingParameters(tile_size=11, workers=workers, min_size=0))
+        try:
+            res = method(data, radius, per_layer)
+        finally:
+            set_tiling(TilingParameters())
+        assert res.dtype == expected.dtype
+        assert np.array_equal(res, expected)
+
+    def test_tiling_min_size(self, monkeypatch):
+        def fail(*_):
+            raise AssertionError("tiled")
+
+        monkeypatch.setattr(image_operations, "_tiled_image_operation", fail)
+        assert get_tiling() == TilingParameters()
+        gaussian(np.zeros((10, 10), dtype=np.uint8), 1)
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import time
+
+import pandas as pd
+import pytest
+
+from PartSegCore.analysis.batch_processing.batch_backend import CalculationManager, ResponseData
+from PartSegCore.analysis.batch_processing.batch_journal import BatchJournal, journal_path
+from PartSegCore.analysis.calculation_plan import Calculation
+
+
+def copy_calculation(calculation: Calculation, **kwargs) -> Calculation:
+    arguments = {
+        name: getattr(calculation, name)
+        for name in [
+            "file_list",
+            "base_prefix",
+            "result_prefix",
+            "measurement_file_path",
+            "sheet_name",
+            "calculation_plan",
+            "voxel_size",
+        ]
+    }
+    arguments.update(kwargs)
+    return Calculation(**arguments)
+
+
+@pytest.fixture
+def calculation(batch_builder):
+    return batch_builder.calculation(batch_builder.images([f"img_{i}.tif" for i in range(4)]))
+
+
+def run_calculation(calculation, resume=False, manager=None):
+    if manager is None:
+        manager = CalculationManager(journal=True)
+        manager.add_calculation(calculation, resume=resume)
+    errors = []
+    for _ in range(600):
+        errors.extend(manager.get_results().errors)
+        if not manager.has_work:
+            break
+        time.sleep(0.05)
+    else:  # pragma: no cover
+        manager.kill_jobs()
+        pytest.fail("jobs hanged")
+    manager.writer.finish()
+    for file_data in manager.writer.file_dict.values():
+        file_data.write_thread.join(5)
+    return manager, errors
+
+
+class TestBatchJournal:
+    def test_start_resume(self, tmp_path, calculation):
+        journal = BatchJournal(str(tmp_path / "journal.sqlite"))
+        assert journal.resume(calculation) == {}
+        response = ResponseData(calculation.file_list[1], [])
+        journal.record_result(calculation, 1, [response])
+        journal.record_error(calculation, 2, "test error")
+        assert journal.resume(calculation) == {calculation.file_list[1]: [response]}
+        journal.start(calculation)
+        assert journal.resume(calculation) == {}
+        journal.close()
+
+    def test_different_plan(self, tmp_path, calculation, batch_builder):
+        journal = BatchJournal(str(tmp_path / "journal.sqlite"))
+        journal.start(calculation)
+        calculation2 = copy_calculation(calculation, calculation_plan=batch_builder.plan(minimum_size=10))
+        with pytest.raises(ValueError, match="different calculation plan"):
+            journal.resume(calculation2)
+        calculation3 = copy_calculation(calculation2, sheet_name="Sheet2")
+        assert journal.resume(calculation3) == {}
+
+
+class TestResume:
+    def test_resume_calculation(self, calculation):
+        manager, errors = run_calculation(calculation)
+        assert errors == []
+        assert os.path.exists(journal_path(calculation.measurement_file_path))
+        df = pd.read_excel(calculation.measurement_file_path, index_col=0, header=[0, 1])
+        assert df.shape == (4, 2)
+        assert manager.journal_dict == {}
+        os.remove(calculation.measurement_file_path)
+
+        with sqlite3.connect(journal_path(calculation.measurement_file_path)) as connection:
+            connection.execute("DELETE FROM result WHERE file_path = ?", (calculation.file_list[2],))
+        calculation2 = copy_calculation(calculation)
+        manager2 = CalculationManager(journal=True)
+        manager2.add_calculation(calculation2, resume=True)
+        assert manager2.calculation_done == 3
+        assert manager2.batch_manager.work_task == 1
+        manager2.kill_jobs()
+
+        manager3, errors = run_calculation(copy_calculation(calculation), resume=True)
+        assert errors == []
+        assert manager3.calculation_done == 4
+        df2 = pd.read_excel(calculation.measurement_file_path, index_col=0, header=[0, 1])
+        assert df2.equals(df)
+
+
+class TestJournalClose:
+    def test_close_after_finish(self, calculation):
+        manager = CalculationManager(journal=True)
+        manager.add_calculation(calculation)
+        journal = manager.journal_dict[calculation.measurement_file_path]
+        _, errors = run_calculation(calculation, manager=manager)
+        assert errors == []
+        assert manager.journal_dict == {}
+        with pytest.raises(sqlite3.ProgrammingError):
+            journal.connection.execute("SELECT 1")
+
+    def test_close_on_kill(self, calculation):
+        manager = CalculationManager(journal=True)
+        manager.add_calculation(calculation)
+        journal = manager.journal_dict[calculation.measurement_file_path]
+        manager.kill_jobs()
+        assert manager.journal_dict == {}
+        with pytest.raises(sqlite3.ProgrammingError):
+            journal.connection.execute("SELECT 1")
+
+    def test_keep_open_for_unfinished_calculation(self, calculation):
+        manager = CalculationManager(journal=True)
+        calculation2 = copy_calculation(calculation, sheet_name="Sheet2")
+        manager.counter_dict[calculation2.uuid] = 0
+        manager.calculation_dict[calculation2.uuid] = calculation2
+        manager.journal_dict[calculation.measurement_file_path] = journal = BatchJournal(
+            journal_path(calculation.measurement_file_path)
+        )
+        manager._close_journal(calculation)
+        assert manager.journal_dict == {calculation.measurement_file_path: journal}
+        manager.counter_dict[calculation2.uuid] = len(calculation2.file_list)
+        manager._close_journal(calculation)
+        assert manager.journal_dict == {}
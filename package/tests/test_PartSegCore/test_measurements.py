@@ -10,15 +10,18 @@ from unittest.mock import MagicMock
 
 import numpy as np
 import pytest
+from scipy.spatial.distance import cdist
 from sympy import symbols
 
 from PartSegCore.algorithm_describe_base import ROIExtractionProfile
-from PartSegCore.analysis import load_metadata
+from PartSegCore.analysis import load_metadata, measurement_calculation
 from PartSegCore.analysis.measurement_base import AreaType, Leaf, MeasurementEntry, Node, PerComponent
 from PartSegCore.analysis.measurement_calculation import (
     HARALIC_FEATURES,
     MEASUREMENT_DICT,
+    AreaGeometry,
     ColocalizationMeasurement,
+    ComponentBoundingBox,
     ComponentsInfo,
     ComponentsNumber,
     CorrelationEnum,
@@ -30,6 +33,7 @@ from PartSegCore.analysis.measurement_calculation import (
     Haralick,
     MaximumPixelBrightness,
     MeanPixelBrightness,
+    MeasurementCache,
     MeasurementProfile,
     MeasurementResult,
     MedianPixelBrightness,
@@ -48,6 +52,10 @@ from PartSegCore.analysis.measurement_calculation import (
     ThirdPrincipalAxisLength,
     Volume,
     Voxels,
+    get_border,
+    hash_fun_call_name,
+    hull_diameter,
+    measurement_cache_key,
 )
 from PartSegCore.autofit import density_mass_center
 from PartSegCore.roi_info import ROIInfo
@@ -208,6 +216,36 @@ class TestDiameter:
         mask = image.get_channel(0)[0] > 80
         assert Diameter.calculate_property(mask, image.spacing, 1) == 0
 
+    @pytest.mark.parametrize("relative_error", [0.01, 0.1])
+    def test_approximate(self, cube_image, relative_error):
+        mask1 = cube_image.get_channel(0)[0] > 40
+        exact = np.sqrt(2 * (50 * 59) ** 2 + (100 * 29) ** 2)
+        assert isclose(
+            Diameter.calculate_property(mask1, cube_image.spacing, 1, relative_error=relative_error),
+            exact,
+            rel_tol=relative_error,
+        )
+
+    @pytest.mark.parametrize("ndim", [2, 3])
+    def test_hull_diameter(self, ndim):
+        points = np.random.default_rng(0).normal(size=(500, ndim))
+        expected = np.sqrt(np.max(cdist(points, points, "sqeuclidean")))
+        assert isclose(hull_diameter(points), expected)
+        assert isclose(hull_diameter(points, 0.05), expected, rel_tol=0.05)
+
+    def test_hull_diameter_degenerated(self):
+        assert hull_diameter(np.zeros((0, 3))) == 0
+        assert hull_diameter(np.ones((5, 3))) == 0
+        points = np.zeros((10, 3))
+        points[:, 1] = np.arange(10)
+        assert hull_diameter(points) == 9
+        points[:, 2] = np.arange(10)
+        assert isclose(hull_diameter(points), 9 * np.sqrt(2))
+        points = np.random.default_rng(0).normal(size=(20, 3))
+        points[:, 0] = 1
+        expected = np.sqrt(np.max(cdist(points, points, "sqeuclidean")))
+        assert isclose(hull_diameter(points), expected)
+
 
 class TestPixelBrightnessSum:
     def test_parameters(self):
@@ -934,6 +972,51 @@ class TestDistanceMaskSegmentation:
             np.sqrt(np.sum(((mask_mid - area_mid) * (100, 50, 50)) ** 2)),
         )
 
+    def test_border_border_brute_force(self):
+        rng = np.random.default_rng(0)
+        mask = np.zeros((10, 30, 30), dtype=np.uint8)
+        mask[1:-1, 1:-1, 1:-1] = 1
+        area = (rng.random(mask.shape) > 0.995).astype(np.uint8)
+        voxel_size = (3, 1, 2)
+        res = DistanceMaskROI.calculate_property(
+            area.astype(float), area, mask, voxel_size, 1, DistancePoint.Border, DistancePoint.Border
+        )
+        mask_pos = (np.transpose(np.nonzero(get_border(mask))) + 0.5) * voxel_size
+        area_pos = (np.transpose(np.nonzero(get_border(area))) + 0.5) * voxel_size
+        assert isclose(res, np.min(cdist(mask_pos, area_pos)))
+
+    def test_mask_tree_shared(self, monkeypatch):
+        data = np.zeros((10, 30, 30), dtype=np.uint16)
+        roi = np.zeros(data.shape, dtype=np.uint8)
+        roi[2:-2, 2:10, 2:10] = 1
+        roi[2:-2, 12:20, 2:10] = 2
+        roi[2:-2, 2:10, 12:28] = 3
+        image = Image(data, image_spacing=(10**-8,) * 3, axes_order="ZYX", mask=np.ones(data.shape, dtype=np.uint8))
+        profile = MeasurementProfile(
+            name="test",
+            chosen_fields=[
+                MeasurementEntry(
+                    name="distance",
+                    calculation_tree=DistanceMaskROI.get_starting_leaf().replace_(
+                        per_component=PerComponent.Yes, parameters=DistanceMaskROI.get_default_values()
+                    ),
+                )
+            ],
+        )
+        expected = profile.calculate(image=image, channel_num=0, roi=roi, result_units=Units.nm)
+        trees = []
+        tree_fun = AreaGeometry.border_tree
+
+        def border_tree(self, scale):
+            if ("border_tree", tuple(scale)) not in self._cache:
+                trees.append(1)
+            return tree_fun(self, scale)
+
+        monkeypatch.setattr(AreaGeometry, "border_tree", border_tree)
+        result = profile.calculate(image=image, channel_num=0, roi=roi, result_units=Units.nm)
+        assert np.allclose(result["distance"][0], expected["distance"][0])
+        assert len(trees) == 1
+
     def test_two_components_border(self, two_comp_img):
         mask = np.zeros(two_comp_img.shape[1:], dtype=np.uint8)
         mask[2:-2, 2:-2, 2:-2] = 1
@@ -2428,3 +2511,253 @@ def test_per_mask_component():
     assert df["Mask component"][1] == df["Mask component"][2] == 1
     assert df["Mask component"][3] == df["Mask component"][4] == 2
     assert df["Volume (nm**3)"][1] == df["Volume (nm**3)"][2] == df["Volume (nm**3)"][3] == df["Volume (nm**3)"][4]
+
+
+@pytest.mark.parametrize(
+    "method",
+    [
+        Volume,
+        Voxels,
+        PixelBrightnessSum,
+        MaximumPixelBrightness,
+        MinimumPixelBrightness,
+        MeanPixelBrightness,
+        MedianPixelBrightness,
+        StandardDeviationOfPixelBrightness,
+        ComponentBoundingBox,
+    ],
+)
+@pytest.mark.parametrize(
+    "area,per_component",
+    [
+        (AreaType.ROI, PerComponent.Yes),
+        (AreaType.ROI, PerComponent.Mean),
+        (AreaType.ROI, PerComponent.Per_Mask_component),
+        (AreaType.Mask, PerComponent.Yes),
+        (AreaType.Mask_without_ROI, PerComponent.Yes),
+    ],
+)
+def test_components_property_same_as_per_component(monkeypatch, method, area, per_component):
+    if method is ComponentBoundingBox and (area != AreaType.ROI or per_component != PerComponent.Yes):
+        pytest.skip("Bounding box is defined only for ROI components")
+    data = np.random.default_rng(0).integers(0, 1000, size=(10, 30, 30)).astype(np.uint16)
+    roi = np.zeros(data.shape, dtype=np.uint8)
+    roi[2:-2, 2:10, 2:10] = 1
+    roi[2:-2, 12:20, 2:10] = 2
+    roi[2:-2, 2:10, 12:28] = 4
+    roi[3:5, 22:28, 22:28] = 5
+    mask = np.zeros(data.shape, dtype=np.uint8)
+    mask[1:-1, 1:21, 1:-1] = 1
+    mask[1:-1, 21:29, 1:-1] = 2
+    image = Image(data, image_spacing=(10**-8,) * 3, axes_order="ZYX", mask=mask)
+    profile = MeasurementProfile(
+        name="test",
+        chosen_fields=[
+            MeasurementEntry(
+                name="value",
+                calculation_tree=method.get_starting_leaf().replace_(area=area, per_component=per_component),
+            )
+        ],
+    )
+    batch_result = profile.calculate(image=image, channel_num=0, roi=roi, result_units=Units.nm)["value"][0]
+    monkeypatch.setattr(method, "calculate_components_property", classmethod(lambda cls, **_: None))
+    result = profile.calculate(image=image, channel_num=0, roi=roi, result_units=Units.nm)["value"][0]
+    if method is ComponentBoundingBox:
+        assert batch_result == result
+    else:
+        assert np.allclose(batch_result, result)
+
+
+def test_area_geometry_shared(monkeypatch):
+    data = np.zeros((10, 30, 30), dtype=np.uint16)
+    data[2:-2, 5:25, 5:25] = 10
+    roi = (data > 0).astype(np.uint8)
+    image = Image(data, image_spacing=(10**-8,) * 3, axes_order="ZYX", mask=(data > 0).astype(np.uint8))
+    profile = MeasurementProfile(
+        name="test",
+        chosen_fields=[
+            MeasurementEntry(
+                name=name,
+                calculation_tree=method.get_starting_leaf().replace_(area=AreaType.ROI, per_component=PerComponent.No),
+            )
+            for name, method in [("diameter", Diameter), ("sphericity", Sphericity), ("axis", FirstPrincipalAxisLength)]
+        ]
+        + [
+            MeasurementEntry(
+                name="distance",
+                calculation_tree=DistanceMaskROI.get_starting_leaf().replace_(
+                    area=AreaType.ROI,
+                    per_component=PerComponent.No,
+                    parameters=DistanceMaskROI.__argument_class__(
+                        distance_from_mask=DistancePoint.Border, distance_to_roi=DistancePoint.Border
+                    ),
+                ),
+            )
+        ],
+    )
+    expected = profile.calculate(image=image, channel_num=0, roi=roi, result_units=Units.nm)
+    calls = []
+    border_fun = AreaGeometry.border.fget
+    monkeypatch.setattr(AreaGeometry, "border", property(lambda self: calls.append(1) or border_fun(self)))
+    result = profile.calculate(image=image, channel_num=0, roi=roi, result_units=Units.nm)
+    for name in ["diameter", "sphericity", "axis", "distance"]:
+        assert isclose(result[name][0], expected[name][0])
+    # border of ROI and of mask is calculated only once
+    assert len(calls) == 2
+
+
+class TestMeasurementCache:
+    def test_key(self):
+        key1 = measurement_cache_key(Volume, {"b": 1, "a": [1, 2]}, AreaType.ROI, PerComponent.No, Channel(0), -1)
+        key2 = measurement_cache_key(Volume, {"a": (1, 2), "b": 1}, AreaType.ROI, PerComponent.No, Channel(0), -1)
+        assert key1 == key2
+        assert hash(key1) == hash(key2)
+        assert key1.method.endswith("Volume")
+        assert key1 != measurement_cache_key(Volume, {"b": 1}, AreaType.ROI, PerComponent.No, Channel(0), -1)
+        assert key1 != measurement_cache_key(
+            Voxels, {"b": 1, "a": [1, 2]}, AreaType.ROI, PerComponent.No, Channel(0), -1
+        )
+
+    def test_key_profile(self):
+        profile1 = ROIExtractionProfile(
+            name="test",
+            algorithm=LowerThresholdAlgorithm.get_name(),
+            values=LowerThresholdAlgorithm.get_default_values(),
+        )
+        profile2 = ROIExtractionProfile(
+            name="test",
+            algorithm=LowerThresholdAlgorithm.get_name(),
+            values=LowerThresholdAlgorithm.get_default_values(),
+        )
+        key1 = measurement_cache_key(DistanceROIROI, profile1, AreaType.ROI, PerComponent.No, Channel(-1), -1)
+        assert key1 == measurement_cache_key(DistanceROIROI, profile2, AreaType.ROI, PerComponent.No, Channel(-1), -1)
+        profile2.values.minimum_size = 5
+        assert key1 != measurement_cache_key(DistanceROIROI, profile2, AreaType.ROI, PerComponent.No, Channel(-1), -1)
+
+    def test_hash_fun_call_name_deprecated(self):
+        with pytest.warns(FutureWarning, match="measurement_cache_key"):
+            key = hash_fun_call_name(Volume, {}, AreaType.ROI, PerComponent.No, Channel(-1), -1)
+        assert isinstance(key, str)
+        assert key.startswith(f"{Volume.__module__}.Volume: {{}} # ")
+
+    def test_bounded(self):
+        cache = MeasurementCache(max_size=2)
+        assert cache.get_or_calculate("a", lambda: 1) == 1
+        assert cache.get_or_calculate("b", lambda: 2) == 2
+        assert cache.get_or_calculate("a", lambda: 3) == 1
+        cache["c"] = 3
+        assert "b" not in cache
+        assert set(cache) == {"a", "c"}
+        info = cache.cache_info()
+        assert (info.hits, info.misses, info.max_size, info.current_size) == (1, 2, 2, 2)
+        cache.clear()
+        assert cache.cache_info() == (0, 0, 2, 0)
+        with pytest.raises(ValueError):
+            MeasurementCache(max_size=0)
+
+    def test_profile_statistics(self):
+        data = np.zeros((10, 30, 30), dtype=np.uint16)
+        data[2:-2, 5:25, 5:25] = 10
+        roi = (data > 0).astype(np.uint8)
+        image = Image(data, image_spacing=(10**-8,) * 3, axes_order="ZYX")
+        leaf = Volume.get_starting_leaf().replace_(area=AreaType.ROI, per_component=PerComponent.No)
+        profile = MeasurementProfile(
+            name="test",
+            chosen_fields=[
+                MeasurementEntry(name="volume", calculation_tree=leaf),
+                MeasurementEntry(name="volume2", calculation_tree=leaf),
+                MeasurementEntry(
+                    name="sphericity",
+                    calculation_tree=Sphericity.get_starting_leaf().replace_(
+                        area=AreaType.ROI, per_component=PerComponent.No
+                    ),
+                ),
+            ],
+        )
+        cache = MeasurementCache()
+        result = profile.calculate(image=image, channel_num=0, roi=roi, result_units=Units.nm, cache=cache)
+        assert result["volume"][0] == result["volume2"][0]
+        # volume2 reuse value of volume
+        assert cache.hits >= 1
+        assert cache.misses >= 3
+
+    def test_reuse_between_images(self):
+        leaf = Volume.get_starting_leaf().replace_(area=AreaType.ROI, per_component=PerComponent.No)
+        profile = MeasurementProfile(
+            name="test", chosen_fields=[MeasurementEntry(name="volume", calculation_tree=leaf)]
+        )
+        cache = MeasurementCache()
+        volumes = []
+        for size in (5, 10):
+            data = np.zeros((20, 20, 20), dtype=np.uint16)
+            data[2 : 2 + size, 2 : 2 + size, 2 : 2 + size] = 10
+            image = Image(data, image_spacing=(10**-8,) * 3, axes_order="ZYX")
+            roi = (data > 0).astype(np.uint8)
+            result = profile.calculate(image=image, channel_num=0, roi=roi, result_units=Units.nm, cache=cache)
+            volumes.append(result["volume"][0])
+        assert volumes[0] == pytest.approx(5**3 * 10**3)
+        assert volumes[1] == pytest.approx(10**3 * 10**3)
+        assert cache.hits == 0
+
+
+@pytest.mark.parametrize("workers", [2, None])
+def test_workers_same_result(workers):
+    data = np.random.default_rng(0).integers(0, 1000, size=(10, 30, 30)).astype(np.uint16)
+    roi = np.zeros(data.shape, dtype=np.uint8)
+    roi[2:-2, 2:10, 2:10] = 1
+    roi[2:-2, 12:20, 2:10] = 2
+    roi[2:-2, 2:10, 12:28] = 3
+    roi[3:5, 22:28, 22:28] = 4
+    image = Image(data, image_spacing=(10**-8,) * 3, axes_order="ZYX")
+    profile = MeasurementProfile(
+        name="test",
+        chosen_fields=[
+            MeasurementEntry(
+                name=method.get_name(),
+                calculation_tree=method.get_starting_leaf().replace_(
+                    area=AreaType.ROI, per_component=PerComponent.Yes, parameters=method.get_default_values()
+                ),
+            )
+            for method in [Diameter, Sphericity, Surface, FirstPrincipalAxisLength, Volume]
+        ],
+    )
+    expected = profile.calculate(image=image, channel_num=0, roi=roi, result_units=Units.nm)
+    result = profile.calculate(image=image, channel_num=0, roi=roi, result_units=Units.nm, workers=workers)
+    assert list(result.keys()) == list(expected.keys())
+    for key in expected.keys():
+        assert np.allclose(result[key][0], expected[key][0])
+
+
+def test_rim_distance_map_shared(monkeypatch):
+    data = np.zeros((10, 30, 30), dtype=np.uint16)
+    mask = np.zeros(data.shape, dtype=np.uint8)
+    mask[1:-1, 1:-1, 1:-1] = 1
+    roi = np.zeros(data.shape, dtype=np.uint8)
+    roi[2:-2, 2:10, 2:10] = 1
+    roi[2:-2, 12:20, 2:10] = 2
+    image = Image(data, image_spacing=(10**-7,) * 3, axes_order="ZYX", mask=mask)
+    chosen_fields = []
+    for distance in [100, 200, 300]:
+        for method in [RimVolume, RimPixelBrightnessSum]:
+            chosen_fields.append(
+                MeasurementEntry(
+                    name=f"{method.get_name()} {distance}",
+                    calculation_tree=method.get_starting_leaf().replace_(
+                        per_component=PerComponent.Yes,
+                        parameters=method.__argument_class__(distance=distance, units=Units.nm),
+                    ),
+                )
+            )
+    profile = MeasurementProfile(name="test", chosen_fields=chosen_fields)
+    calls = []
+    distance_fun = measurement_calculation.distance_from_background
+    monkeypatch.setattr(
+        measurement_calculation,
+        "distance_from_background",
+        lambda *args, **kwargs: calls.append(1) or distance_fun(*args, **kwargs),
+    )
+    result = profile.calculate(image=image, channel_num=0, roi=roi, result_units=Units.nm)
+    assert len(calls) == 1
+    assert result["rim volume 100"][0] == [0, 0]
+    # voxels of components on first two layers from mask border
+    assert result["rim volume 200"][0] == [(6 * 8 * 8 - 4 * 7 * 7) * 10**6, (6 * 8 * 8 - 4 * 8 * 7) * 10**6]
@@ -0,0 +1,72 @@
+import uuid
+
+import numpy as np
+import tifffile
+
+from PartSegCore.analysis.batch_processing.memory_scheduler import (
+    MemoryScheduler,
+    estimate_file_memory,
+    measure_peak_memory,
+)
+
+
+def test_estimate_file_memory(tmp_path):
+    tifffile.imwrite(tmp_path / "test.tif", np.zeros((5, 30, 40), dtype=np.uint16))
+    assert estimate_file_memory(str(tmp_path / "test.tif")) == 5 * 30 * 40 * 2
+    (tmp_path / "test.txt").write_bytes(b"a" * 100)
+    assert estimate_file_memory(str(tmp_path / "test.txt")) == 100
+    assert estimate_file_memory(str(tmp_path / "missing.tif")) == 0
+
+
+def test_measure_peak_memory():
+    res, peak = measure_peak_memory(lambda x: float(np.ones(x).sum()), 10**6)
+    assert res == 10**6
+    assert peak >= 8 * 10**6
+
+
+class TestMemoryScheduler:
+    def test_no_budget(self):
+        scheduler = MemoryScheduler()
+        work = uuid.uuid4()
+        for i in range(5):
+            scheduler.add_task(i, work, f"task{i}", 10**12)
+        assert scheduler.admit() == [(i, f"task{i}", False) for i in range(5)]
+
+    def test_budget(self):
+        scheduler = MemoryScheduler(budget=100, default_multiplier=2, calibration_tasks=1)
+        work = uuid.uuid4()
+        for i in range(7):
+            scheduler.add_task(i, work, i, 20)
+        assert scheduler.admit() == [(0, 0, True), (1, 1, False)]
+        assert scheduler.used_memory == 80
+        assert scheduler.admit() == []
+        scheduler.task_finished(0, 20)
+        assert scheduler.multipliers[work] == 1
+        assert [x[0] for x in scheduler.admit()] == [2, 3, 4, 5]
+        scheduler.task_finished(1, 60)
+        assert scheduler.multipliers[work] == 3
+        assert scheduler.admit() == []
+        for i in range(2, 6):
+            scheduler.task_finished(i)
+        assert [x[0] for x in scheduler.admit()] == [6]
+
+    def test_too_small_budget(self):
+        scheduler = MemoryScheduler(budget=10)
+        work = uuid.uuid4()
+        scheduler.add_task(0, work, 0, 100)
+        scheduler.add_task(1, work, 1, 100)
+        assert [x[0] for x in scheduler.admit()] == [0]
+        assert scheduler.admit() == []
+        scheduler.task_finished(0)
+        assert [x[0] for x in scheduler.admit()] == [1]
+
+    def test_remove_work(self):
+        scheduler = MemoryScheduler(budget=10)
+        work1, work2 = uuid.uuid4(), uuid.uuid4()
+        scheduler.add_task(0, work1, 0, 100)
+        scheduler.add_task(1, work1, 1, 100)
+        scheduler.add_task(2, work2, 2, 100)
+        assert [x[0] for x in scheduler.admit()] == [0]
+        assert scheduler.remove_work(work1) == [(1, 1)]
+        scheduler.task_finished(0)
+        assert [x[0] for x in scheduler.admit()] == [2]
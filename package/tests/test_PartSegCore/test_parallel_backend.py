@@ -0,0 +1,236 @@
+import sys
+import time
+import uuid
+from queue import Queue
+from typing import NamedTuple
+
+import numpy as np
+import pytest
+
+from PartSegCore.analysis.batch_processing import parallel_backend
+from PartSegCore.analysis.batch_processing.parallel_backend import (
+    BatchManager,
+    BatchWorker,
+    SharedMemoryPayload,
+    SubprocessOrder,
+    shared_memory_supported,
+)
+
+if sys.version_info >= (3, 8):
+    from multiprocessing import shared_memory
+else:  # pragma: no cover
+    shared_memory = None
+
+requires_shared_memory = pytest.mark.skipif(
+    not shared_memory_supported(), reason="shared memory transfer not supported"
+)
+
+
+class GlobalData(NamedTuple):
+    uuid: uuid.UUID
+    multiplier: int
+
+
+def multiply(data, global_data: GlobalData):
+    return data * global_data.multiplier
+
+
+def sleep_multiply(data, global_data: GlobalData):
+    time.sleep(0.5)
+    return data * global_data.multiplier
+
+
+def create_array(data, global_data: GlobalData):
+    return {"data": data, "array": np.full((100, 100), data * global_data.multiplier, dtype=np.uint16)}
+
+
+def shm_exists(name):
+    try:
+        shared_memory.SharedMemory(name=name).close()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def collect_results(manager: BatchManager, timeout=30):
+    res = []
+    end = time.time() + timeout
+    while manager.has_work:
+        res.extend(manager.get_result())
+        if time.time() > end:  # pragma: no cover
+            manager.kill_jobs()
+            pytest.fail("jobs hanged")
+        time.sleep(0.05)
+    return res
+
+
+class TestBatchManager:
+    def test_add_work(self):
+        manager = BatchManager()
+        manager.set_number_of_process(2)
+        data1 = GlobalData(uuid.uuid4(), 2)
+        data2 = GlobalData(uuid.uuid4(), 3)
+        manager.add_work(list(range(10)), data1, multiply)
+        manager.add_work(list(range(5)), data2, multiply)
+        res = collect_results(manager)
+        assert sorted(x[1] for x in res if x[0] == data1.uuid) == [x * 2 for x in range(10)]
+        assert sorted(x[1] for x in res if x[0] == data2.uuid) == [x * 3 for x in range(5)]
+        for _ in range(50):
+            if manager.finished:
+                break
+            time.sleep(0.1)
+        assert manager.finished
+        assert not manager.order_queues
+
+    def test_cancel_work(self):
+        manager = BatchManager()
+        data = GlobalData(uuid.uuid4(), 2)
+        manager.add_work(list(range(10)), data, multiply)
+        manager.cancel_work(data)
+        res = collect_results(manager)
+        assert len(res) == 10
+        assert all(x[1] == (-1, [SubprocessOrder.cancel_job]) for x in res)
+        assert data.uuid in manager.canceled_works
+
+    def test_kill_jobs(self):
+        manager = BatchManager(memory_budget=10**6)
+        manager.set_number_of_process(2)
+        data1 = GlobalData(uuid.uuid4(), 2)
+        manager.add_work(list(range(6)), data1, sleep_multiply, sizes=[10**5] * 6)
+        task_queue = manager.task_queue
+        manager.kill_jobs()
+        assert manager.task_queue is not task_queue
+        assert manager.process_list == []
+        assert manager.number_off_process == 0
+        assert not manager.scheduler.in_progress
+        assert not manager.scheduler.pending
+        res = collect_results(manager)
+        assert len(res) == 6
+        assert all(x[1] == (-1, [SubprocessOrder.cancel_job]) for x in res)
+        data2 = GlobalData(uuid.uuid4(), 3)
+        manager.add_work(list(range(4)), data2, multiply)
+        res = collect_results(manager)
+        assert sorted(x[1] for x in res) == [0, 3, 6, 9]
+
+    def test_shared_memory_not_available(self, monkeypatch):
+        monkeypatch.setattr(parallel_backend, "shared_memory", None)
+        assert not shared_memory_supported()
+        manager = BatchManager(shared_memory_min_size=1000)
+        assert manager.shared_memory_min_size is None
+
+    def test_memory_budget(self):
+        manager = BatchManager(memory_budget=10**6)
+        manager.set_number_of_process(2)
+        data = GlobalData(uuid.uuid4(), 3)
+        manager.add_work(list(range(6)), data, create_array, sizes=[10**5] * 6)
+        assert len(manager.scheduler.in_progress) == 2
+        res = collect_results(manager)
+        assert sorted(x[1]["data"] for x in res) == list(range(6))
+        assert data.uuid in manager.scheduler.multipliers
+        assert not manager.scheduler.in_progress
+
+    @requires_shared_memory
+    def test_shared_memory_transfer(self):
+        manager = BatchManager(shared_memory_min_size=1000)
+        data = GlobalData(uuid.uuid4(), 3)
+        manager.add_work(list(range(4)), data, create_array)
+        res = collect_results(manager)
+        assert len(res) == 4
+        for _, result in res:
+            assert result["array"].shape == (100, 100)
+            assert np.all(result["array"] == result["data"] * 3)
+
+    @requires_shared_memory
+    def test_shared_memory_cancel_cleanup(self):
+        manager = BatchManager(shared_memory_min_size=1000)
+        data = GlobalData(uuid.uuid4(), 3)
+        payload = SharedMemoryPayload.pack(create_array(1, data), 1000)
+        manager.canceled_works.add(data.uuid)
+        assert manager._unpack_result(data.uuid, payload) == (data.uuid, (-1, [SubprocessOrder.cancel_job]))
+        assert not shm_exists(payload.buffers[0][0])
+
+
+class TestBatchWorker:
+    @staticmethod
+    def create_worker(calculation_dict=None):
+        return BatchWorker(Queue(), Queue(), Queue(), calculation_dict if calculation_dict is not None else {})
+
+    def test_calculate_task(self):
+        data = GlobalData(uuid.uuid4(), 3)
+        worker = self.create_worker({data.uuid: (data, multiply)})
+        worker.calculate_task((5, data.uuid, 0, False))
+        assert worker.result_queue.get_nowait() == (data.uuid, 15, 0, None)
+        worker.calculate_task((5, data.uuid, 1, True))
+        res = worker.result_queue.get_nowait()
+        assert res[:3] == (data.uuid, 15, 1)
+        assert isinstance(res[3], int)
+        worker.calculate_task((5, uuid.uuid4(), 2, False))
+        assert worker.result_queue.get_nowait()[1] == (-1, [SubprocessOrder.cancel_job])
+
+    def test_orders(self):
+        data = GlobalData(uuid.uuid4(), 3)
+        worker = self.create_worker()
+        worker.order_queue.put((SubprocessOrder.add_job, (data.uuid, (data, multiply))))
+        assert worker.wait_for_calculation(data.uuid)
+        assert data.uuid in worker.calculation_dict
+        worker.order_queue.put((SubprocessOrder.cancel_job, data.uuid))
+        assert worker.process_pending_orders()
+        assert data.uuid not in worker.calculation_dict
+        assert worker.wait_for_calculation(data.uuid)
+        worker.order_queue.put(SubprocessOrder.kill)
+        assert not worker.wait_for_calculation(uuid.uuid4())
+
+    def test_run(self):
+        data = GlobalData(uuid.uuid4(), 3)
+        worker = self.create_worker()
+        worker.task_queue.put((1, data.uuid, 0, False))
+        worker.order_queue.put((SubprocessOrder.add_job, (data.uuid, (data, multiply))))
+        worker.order_queue.put(SubprocessOrder.kill)
+        worker.run()
+        assert worker.task_queue.get_nowait() == (1, data.uuid, 0, False)
+        assert worker.result_queue.empty()
+
+    def test_read_ahead(self):
+        prefetched = []
+
+        def fun(data, global_data):
+            return data
+
+        fun.prefetch = lambda data, global_data, memory_limit: prefetched.append((data, memory_limit))
+        data = GlobalData(uuid.uuid4(), 3)
+        worker = BatchWorker(Queue(), Queue(), Queue(), {data.uuid: (data, fun)}, prefetch_depth=2, prefetch_memory=10)
+        for i in range(4):
+            worker.task_queue.put((i, data.uuid, i, False))
+        worker.task_queue.put((5, uuid.uuid4(), 5, False))
+        assert worker.next_task()[0] == 0
+        worker.read_ahead()
+        assert prefetched == [(1, 10), (2, 10)]
+        assert worker.next_task()[0] == 1
+        worker.read_ahead()
+        worker.read_ahead()
+        assert prefetched == [(1, 10), (2, 10), (3, 10)]
+        assert len(worker.prefetched) == 2
+        worker.return_prefetched()
+        assert [worker.task_queue.get_nowait()[0] for _ in range(3)] == [5, 2, 3]
+
+
+@requires_shared_memory
+class TestSharedMemoryPayload:
+    def test_pack_load(self):
+        data = {"small": np.arange(10), "big": np.arange(10000, dtype=np.float64), "text": "aaa"}
+        payload = SharedMemoryPayload.pack(data, 1000)
+        assert len(payload.buffers) == 1
+        assert payload.buffers[0][1] == data["big"].nbytes
+        res = payload.load()
+        assert not shm_exists(payload.buffers[0][0])
+        assert res["text"] == "aaa"
+        assert np.array_equal(res["small"], data["small"])
+        assert np.array_equal(res["big"], data["big"])
+        res["big"][0] = 5
+
+    def test_release(self):
+        payload = SharedMemoryPayload.pack([np.zeros(1000), np.ones(1000)], 100)
+        assert len(payload.buffers) == 2
+        assert all(shm_exists(name) for name, _ in payload.buffers)
+        payload.release()
+        assert not any(shm_exists(name) for name, _ in payload.buffers)
@@ -0,0 +1,104 @@
+import pytest
+
+from PartSegCore.analysis.batch_processing import batch_backend
+from PartSegCore.analysis.batch_processing.batch_backend import CalculationProcess
+from PartSegCore.analysis.batch_processing.plan_compiler import CompiledPlan, StepCache, compiled_plan_for
+from PartSegCore.analysis.calculation_plan import BaseCalculation, CalculationTree, FileCalculation, MaskSuffix
+from PartSegCore.segmentation.restartable_segmentation_algorithms import LowerThresholdAlgorithm
+
+
+@pytest.fixture
+def plan(batch_builder):
+    def segmentation(name, threshold, measurement_mask=True):
+        return CalculationTree(
+            batch_builder.segmentation(name, threshold),
+            [CalculationTree(batch_builder.measurement(measurement_mask), [])],
+        )
+
+    def branch(mask_name):
+        return CalculationTree(batch_builder.mask_create(mask_name), [segmentation("inner", 30)])
+
+    def mask_suffix():
+        return CalculationTree(MaskSuffix(name="", suffix="_mask"), [segmentation("outer", 50)])
+
+    outer = CalculationTree(
+        batch_builder.segmentation("outer", 50),
+        [branch("mask1"), branch("mask2"), CalculationTree(batch_builder.measurement(), [])],
+    )
+    children = [
+        outer,
+        segmentation("outer2", 50, False),
+        segmentation("other", 70, False),
+        mask_suffix(),
+        mask_suffix(),
+    ]
+    return batch_builder.plan(children=children)
+
+
+@pytest.fixture
+def file_calculation(batch_builder, plan):
+    (file_path,) = batch_builder.images(["img.tif"], mask=True)
+    return FileCalculation(file_path, batch_builder.calculation([file_path], plan).get_base_calculation())
+
+
+def test_compiled_plan(plan):
+    compiled = CompiledPlan(plan)
+    root = plan.execution_tree.children
+    assert compiled.shared_key(root[0]) is not None
+    assert compiled.shared_key(root[0]) == compiled.shared_key(root[1])
+    assert compiled.shared_key(root[2]) is None
+    branch1, branch2 = root[0].children[:2]
+    assert compiled.shared_key(branch1) == compiled.shared_key(branch2)
+    assert compiled.shared_key(branch1.children[0]) == compiled.shared_key(branch2.children[0])
+    assert compiled.shared_key(branch1.children[0]) != compiled.shared_key(root[0])
+    assert compiled.shared_key(root[3]) == compiled.shared_key(root[4])
+    assert compiled.shared_key(root[3].children[0]) == compiled.shared_key(root[4].children[0])
+    assert compiled.shared_key(root[3].children[0]) != compiled.shared_key(root[0])
+    assert compiled.shared_key(root[0].children[2]) is None
+
+
+def test_step_cache(plan):
+    compiled = CompiledPlan(plan)
+    cache = StepCache(compiled)
+    key = compiled.shared_key(plan.execution_tree.children[0])
+    assert cache.get(key) is None
+    cache.put(key, 1)
+    assert len(cache) == 1
+    assert cache.get(key) == 1
+    assert len(cache) == 0
+    assert cache.get(key) is None
+
+
+def test_compiled_plan_for(file_calculation):
+    calculation = file_calculation.calculation
+    compiled = compiled_plan_for(calculation)
+    assert compiled_plan_for(calculation) is compiled
+    process1, process2 = CalculationProcess(), CalculationProcess()
+    process1.do_calculation(file_calculation)
+    process2.do_calculation(FileCalculation(file_calculation.file_path, calculation))
+    assert process1.compiled_plan is process2.compiled_plan is compiled
+    other = BaseCalculation("", "", "", "", calculation.calculation_plan, calculation.voxel_size)
+    assert compiled_plan_for(other) is not compiled
+
+
+def test_calculation_reuse(file_calculation, monkeypatch):
+    calls = []
+    original = LowerThresholdAlgorithm.calculation_run
+
+    def calculation_run(self, report_fun):
+        calls.append(self.new_parameters.threshold.values.threshold)
+        return original(self, report_fun)
+
+    monkeypatch.setattr(LowerThresholdAlgorithm, "calculation_run", calculation_run)
+    process = CalculationProcess()
+    result = process.do_calculation(file_calculation)
+    assert sorted(calls) == [30, 50, 50, 70]
+    assert process.step_cache is None
+
+    calls.clear()
+    monkeypatch.setattr(batch_backend.CompiledPlan, "shared_key", lambda self, node: None)
+    expected = CalculationProcess().do_calculation(file_calculation)
+    assert len(calls) == 7
+    assert len(result[0].values) == len(expected[0].values) == 7
+    for res, exp in zip(result[0].values, expected[0].values):
+        assert res.to_dataframe().equals(exp.to_dataframe())
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from PartSegCore.analysis.batch_processing import batch_backend
+from PartSegCore.analysis.batch_processing.prefetch import Prefetcher
+from PartSegCore.analysis.calculation_plan import CalculationTree, MaskSuffix
+
+
+def slow_load(value):
+    time.sleep(0.05)
+    return value
+
+
+def test_prefetcher():
+    prefetcher = Prefetcher()
+    assert prefetcher.take("a") is None
+    assert prefetcher.prefetch("a", 10, None, slow_load, 1)
+    assert prefetcher.prefetch("b", 10, 30, slow_load, 2)
+    assert prefetcher.prefetch("b", 10, 30, slow_load, 3)
+    assert not prefetcher.prefetch("c", 20, 30, slow_load, 4)
+    assert prefetcher.memory == 20
+    assert "b" in prefetcher
+    assert prefetcher.take("b").result() == 2
+    assert len(prefetcher) == 0
+    prefetcher.prefetch("c", 20, 30, slow_load, 4)
+    prefetcher.close()
+    assert len(prefetcher) == 0
+    assert prefetcher.take("c") is None
+
+
+def test_prefetcher_error():
+    def fail():
+        raise OSError("aaa")
+
+    prefetcher = Prefetcher()
+    prefetcher.prefetch("a", 0, None, fail)
+    with pytest.raises(OSError, match="aaa"):
+        prefetcher.take("a").result()
+    prefetcher.close()
+
+
+@pytest.fixture
+def calculation(batch_builder):
+    def segmentation(mask):
+        return CalculationTree(batch_builder.segmentation(), [CalculationTree(batch_builder.measurement(mask), [])])
+
+    plan = batch_builder.plan(
+        children=[segmentation(False), CalculationTree(MaskSuffix(name="", suffix="_mask"), [segmentation(True)])]
+    )
+    file_list = batch_builder.images(["img0.tif", "img1.tif"], mask=True)
+    return batch_builder.calculation(file_list, plan).get_base_calculation()
+
+
+def test_prefetch_calculation(tmp_path, calculation, monkeypatch):
+    calls = []
+    load_projects, read_mask = batch_backend.load_projects, batch_backend.read_mask
+
+    def count_load(*args):
+        calls.append("image")
+        return load_projects(*args)
+
+    def count_mask(*args):
+        calls.append("mask")
+        return read_mask(*args)
+
+    monkeypatch.setattr(batch_backend, "load_projects", count_load)
+    monkeypatch.setattr(batch_backend, "read_mask", count_mask)
+    monkeypatch.setattr(batch_backend, "_prefetcher", Prefetcher())
+    file_info = (0, str(tmp_path / "img0.tif"))
+    expected = batch_backend.CalculationProcess().do_calculation(
+        batch_backend.FileCalculation(file_info[1], calculation)
+    )
+    assert calls == ["image", "mask"]
+    calls.clear()
+
+    assert batch_backend.do_calculation.prefetch is batch_backend.prefetch_calculation
+    batch_backend.prefetch_calculation(file_info, calculation)
+    batch_backend.prefetch_calculation((1, str(tmp_path / "img1.tif")), calculation, 1)
+    assert len(batch_backend._prefetcher) == 2
+    index, result = batch_backend.do_calculation(file_info, calculation)
+    assert index == 0
+    assert calls == ["image", "mask"]
+    assert len(batch_backend._prefetcher) == 0
+    assert len(result[0].values) == len(expected[0].values)
+    for res, exp in zip(result[0].values, expected[0].values):
+        assert res.to_dataframe().equals(exp.to_dataframe())
+    batch_backend._prefetcher.close()
@@ -0,0 +1,146 @@
+import multiprocessing
+import time
+import uuid
+from multiprocessing.connection import Listener
+from threading import Thread
+
+import pytest
+
+from PartSegCore.analysis.batch_processing.parallel_backend import SubprocessOrder
+from PartSegCore.analysis.batch_processing.remote_backend import (
+    DEFAULT_PORT,
+    RemoteBatchManager,
+    RemoteOrder,
+    RemoteWorkerServer,
+    get_authkey,
+    parse_address,
+)
+
+from .test_parallel_backend import GlobalData, collect_results, multiply
+
+AUTHKEY = b"test_key"
+
+
+def fail_on_three(data, global_data: GlobalData):
+    if data == 3:
+        raise ValueError("three")
+    return data * global_data.multiplier
+
+
+def _run_server(queue, workers):
+    server = RemoteWorkerServer(("127.0.0.1", 0), AUTHKEY, workers=workers)
+    queue.put(server.address)
+    server.serve_forever()
+
+
+@pytest.fixture
+def start_server():
+    processes = []
+
+    def _start(workers=2):
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_run_server, args=(queue, workers))
+        process.start()
+        processes.append(process)
+        return queue.get(timeout=10)
+
+    yield _start
+    for process in processes:
+        process.terminate()
+        process.join()
+
+
+def test_parse_address():
+    assert parse_address("node1:1234") == ("node1", 1234)
+    assert parse_address("node1") == ("node1", DEFAULT_PORT)
+    assert parse_address(("node1", 10)) == ("node1", 10)
+    with pytest.raises(ValueError, match="Invalid address"):
+        parse_address("node1:aaa")
+
+
+def test_get_authkey(monkeypatch):
+    monkeypatch.delenv("PARTSEG_BATCH_AUTHKEY", raising=False)
+    with pytest.raises(ValueError, match="Authentication key"):
+        get_authkey()
+    monkeypatch.setenv("PARTSEG_BATCH_AUTHKEY", "aaa")
+    assert get_authkey() == b"aaa"
+    assert get_authkey("bbb") == b"bbb"
+
+
+class TestRemoteBatchManager:
+    def test_add_work(self, start_server):
+        manager = RemoteBatchManager([start_server(), start_server(1)], AUTHKEY)
+        assert [x.number_of_workers for x in manager.nodes] == [2, 1]
+        data1 = GlobalData(uuid.uuid4(), 2)
+        data2 = GlobalData(uuid.uuid4(), 3)
+        manager.add_work(list(range(10)), data1, multiply)
+        manager.add_work(list(range(5)), data2, fail_on_three)
+        assert len(manager.pending) == 15 - 3 * manager.tasks_per_worker
+        res = collect_results(manager)
+        assert sorted(x[1] for x in res if x[0] == data1.uuid) == [x * 2 for x in range(10)]
+        res2 = [x[1] for x in res if x[0] == data2.uuid]
+        assert sorted(x for x in res2 if isinstance(x, int)) == [0, 3, 6, 12]
+        errors = [x for x in res2 if not isinstance(x, int)]
+        assert len(errors) == 1
+        assert isinstance(errors[0][1][0][0], ValueError)
+        assert all(not node.in_progress for node in manager.nodes)
+        manager.close()
+
+    def test_cancel_work(self, start_server):
+        manager = RemoteBatchManager([start_server(1)], AUTHKEY, tasks_per_worker=1)
+        data = GlobalData(uuid.uuid4(), 2)
+        manager.add_work(list(range(10)), data, multiply)
+        manager.cancel_work(data)
+        res = collect_results(manager)
+        assert len(res) == 10
+        assert all(x[1] == (-1, [SubprocessOrder.cancel_job]) for x in res)
+        manager.close()
+
+    def test_connection_error(self, start_server):
+        address = start_server()
+        with pytest.raises(ConnectionError):
+            RemoteBatchManager([address], b"wrong_key")
+        with Listener(("127.0.0.1", 0)) as listener:
+            free_address = listener.address
+        with pytest.raises(ConnectionError):
+            RemoteBatchManager([free_address], AUTHKEY)
+        manager = RemoteBatchManager([free_address, address], AUTHKEY)
+        assert len(manager.nodes) == 1
+        manager.close()
+
+    def test_node_lost(self, start_server):
+        received = []
+
+        def fake_node(listener: Listener):
+            with listener.accept() as connection:
+                connection.send((RemoteOrder.hello, 2))
+                while len(received) < 3:
+                    received.append(connection.recv())
+
+        with Listener(("127.0.0.1", 0), authkey=AUTHKEY) as listener:
+            thread = Thread(target=fake_node, args=(listener,))
+            thread.start()
+            manager = RemoteBatchManager([listener.address, start_server(1)], AUTHKEY, tasks_per_worker=1)
+            data = GlobalData(uuid.uuid4(), 2)
+            manager.add_work(list(range(6)), data, multiply)
+            thread.join(5)
+        assert received[0][0] == RemoteOrder.add_job
+        assert [x[0] for x in received[1:]] == [RemoteOrder.task, RemoteOrder.task]
+        res = collect_results(manager)
+        assert sorted(x[1] for x in res) == [x * 2 for x in range(6)]
+        assert not manager.nodes[0].alive
+        manager.close()
+
+    def test_all_nodes_lost(self, start_server):
+        manager = RemoteBatchManager([start_server(1)], AUTHKEY)
+        data = GlobalData(uuid.uuid4(), 2)
+        manager.nodes[0].close()
+        manager.add_work(list(range(3)), data, multiply)
+        res = []
+        for _ in range(100):
+            res.extend(manager.get_result())
+            if not manager.has_work:
+                break
+            time.sleep(0.05)
+        assert len(res) == 3
+        assert all(isinstance(x[1][1][0][0], ConnectionError) for x in res)
@@ -1,11 +1,13 @@
 # pylint: disable=R0201
 import os
+import pickle
 
 import numpy as np
 import pytest
 
 from PartSegImage import Image, ImageWriter, TiffImageReader
-from PartSegImage.image import FRAME_THICKNESS
+from PartSegImage import image as image_module
+from PartSegImage.image import FRAME_THICKNESS, calculate_range
 
 
 class TestImageBase:
@@ -346,6 +348,56 @@ class TestImageBase:
         shape[image.stack_pos] += 2 * FRAME_THICKNESS
         assert res.shape == tuple(shape)
 
+    def test_cut_image_keep_source_data(self):
+        image = self.image_class(np.ones((1, 10, 20, 30, 3), np.uint8), (1, 1, 1), "", axes_order="TZYXC")
+        image.set_mask(np.ones((1, 10, 20, 30), np.uint8), "TZYX")
+        roi = np.zeros((1, 10, 20, 30), np.uint8)
+        roi[0, 2:-2, 2:9, 2:-2] = 1
+        roi[0, 5, 5, 5] = 0
+        im = image.cut_image(image.reorder_axes(roi, "TZYX"))
+        assert np.count_nonzero(im.get_channel(0)) == np.count_nonzero(roi)
+        assert np.count_nonzero(im.mask) == np.count_nonzero(roi)
+        assert np.all(image.get_channel(0) == 1)
+        assert np.all(image.mask == 1)
+
+    def test_cut_image_view(self):
+        image = self.image_class(np.zeros((1, 10, 20, 30, 3), np.uint8), (1, 1, 1), "", axes_order="TZYXC")
+        mask = np.zeros((1, 10, 20, 30), np.uint8)
+        mask[0, 2:-2, 2:9, 2:-2] = 3
+        image.set_mask(mask, "TZYX")
+        cut_dict = {"Z": slice(2, 8), "Y": slice(2, 9), "X": slice(2, 28)}
+        cut_list = tuple(cut_dict.get(x, slice(None)) for x in image.array_axis_order)
+        res = image.cut_image(cut_list, frame=0, view=True)
+        assert res.shape == self.image_shape((1, 6, 7, 26, 3), axes="TZYXC")
+        assert res.spacing == image.spacing
+        assert res.channel_names == image.channel_names
+        assert res.file_path is None
+        assert np.all(res.mask == 1)
+        for i in range(3):
+            assert np.shares_memory(res.get_channel(i), image.get_channel(i))
+        assert np.shares_memory(res.mask, image.mask)
+        res2 = image.cut_image(cut_list, frame=0)
+        assert res2.shape == res.shape
+        assert not np.shares_memory(res2.get_channel(0), image.get_channel(0))
+
+        roi = image.reorder_axes(mask, "TZYX")
+        res3 = image.cut_image(roi, replace_mask=True, frame=0, zero_out_cut_area=False, view=True)
+        assert res3.shape == res.shape
+        assert np.all(res3.mask == 3)
+        with pytest.raises(ValueError, match="View of image"):
+            image.cut_image(roi, view=True)
+
+    def test_substitute_view(self):
+        image = self.image_class(np.zeros((1, 10, 20, 30, 3), np.uint8), (1, 1, 1), "", axes_order="TZYXC")
+        res = image.substitute(view=True, image_spacing=(1, 2, 3), channel_names=["a", "b", "c"])
+        assert np.shares_memory(res.get_channel(0), image.get_channel(0))
+        assert res.spacing == (1, 2, 3)
+        assert image.spacing == (1, 1, 1)
+        assert res.channel_names == ["a", "b", "c"]
+        assert image.channel_names == ["channel 1", "channel 2", "channel 3"]
+        res2 = image.substitute()
+        assert not np.shares_memory(res2.get_channel(0), image.get_channel(0))
+
     def test_get_ranges(self):
         data = np.zeros((1, 10, 20, 30, 3), np.uint8)
         data[..., :10, 0] = 2
@@ -488,3 +540,65 @@ class TestMergeImage:
         assert res_image.channels == 2
         assert isinstance(res_image, Image)
         assert isinstance(image2.merge(image1, "C"), ChangeChannelPosImage)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+@pytest.mark.parametrize("dtype", [np.uint8, np.int16, np.float32])
+def test_calculate_range(monkeypatch, workers, dtype):
+    monkeypatch.setattr(image_module, "RANGE_CHUNK_SIZE", 100)
+    data = np.random.default_rng(0).integers(-100, 100, size=(3, 20, 30)).astype(dtype)
+    assert calculate_range(data, workers) == (np.min(data), np.max(data))
+    view = data[:, 2:15, 1]
+    assert calculate_range(view, workers) == (np.min(view), np.max(view))
+    view = data[0:1, 0:1]
+    assert calculate_range(view, workers) == (np.min(view), np.max(view))
+
+
+def test_lazy_ranges():
+    data = np.zeros((1, 10, 20, 30, 3), np.uint8)
+    data[..., 0] = 7
+    image = Image(data, (1, 1, 1), axes_order="TZYXC")
+    assert image._ranges is None
+    cut = image.cut_image([slice(None), slice(0, 2), slice(0, 2), slice(0, 2)])
+    assert image._ranges is None
+    assert cut.get_ranges() == [(7, 7), (0, 0), (0, 0)]
+    assert image.get_ranges() == [(7, 7), (0, 0), (0, 0)]
+    image2 = Image(data, (1, 1, 1), axes_order="TZYXC", ranges=[(0, 10), (0, 10), (0, 10)])
+    assert image2.get_ranges() == [(0, 10), (0, 10), (0, 10)]
+    image2.ranges = [(1, 2), (1, 2), (1, 2)]
+    assert image2.get_ranges() == [(1, 2), (1, 2), (1, 2)]
+
+
+def test_derived_image_does_not_calculate_ranges(monkeypatch):
+    data = np.zeros((1, 10, 20, 30, 2), np.uint8)
+    data[0, 5, 5, 5, 0] = 7
+    image = Image(data, (1, 1, 1), axes_order="TZYXC")
+    calls = []
+
+    def calculate_range_count(array, workers=None):
+        calls.append(array.size)
+        return calculate_range(array, workers)
+
+    monkeypatch.setattr(image_module, "calculate_range", calculate_range_count)
+    cut = image.cut_image([slice(None), slice(0, 2), slice(0, 2), slice(0, 2)])
+    substituted = image.substitute(image_spacing=(2, 2, 2))
+    cut2 = cut.cut_image([slice(None), slice(0, 1), slice(0, 1), slice(0, 1)])
+    assert calls == []
+    assert cut2.get_ranges() == [(0, 7), (0, 0)]
+    assert calls == [6000, 6000]
+    assert cut.get_ranges() == substituted.get_ranges() == image.get_ranges() == [(0, 7), (0, 0)]
+    assert len(calls) == 2
+    assert pickle.loads(pickle.dumps(cut)).get_ranges() == [(0, 7), (0, 0)]
+
+
+def test_view_cut_ranges():
+    data = np.zeros((1, 10, 20, 30, 2), np.uint8)
+    data[0, 5, 5, 5, 0] = 7
+    data[0, 0, 0, 0, 1] = 3
+    image = Image(data, (1, 1, 1), axes_order="TZYXC")
+    cut_area = [slice(None), slice(0, 2), slice(0, 2), slice(0, 2)]
+    view = image.cut_image(cut_area, view=True)
+    assert view.get_ranges() == image.cut_image(cut_area).get_ranges() == [(0, 7), (0, 3)]
+    image2 = Image(data, (1, 1, 1), axes_order="TZYXC")
+    copy_cut = image2.cut_image(cut_area)
+    assert image2.cut_image(cut_area, view=True).get_ranges() == copy_cut.get_ranges()
@@ -10,7 +10,15 @@ import pytest
 import tifffile
 
 import PartSegData
-from PartSegImage import CziImageReader, GenericImageReader, Image, ObsepImageReader, OifImagReader, TiffImageReader
+from PartSegImage import (
+    CziImageReader,
+    GenericImageReader,
+    Image,
+    ImageWriter,
+    ObsepImageReader,
+    OifImagReader,
+    TiffImageReader,
+)
 
 
 class TestImageClass:
@@ -109,6 +117,35 @@ class TestImageClass:
         reader.set_default_spacing((5, 7))
         assert reader.default_spacing == (10**-6, 5, 7)
 
+    def test_tiff_memory_map(self, tmp_path):
+        data = np.random.default_rng(0).integers(0, 255, size=(1, 5, 3, 20, 30), dtype=np.uint8)
+        image = Image(data, (1, 1, 1), axes_order="TZCYX")
+        ImageWriter.save(image, tmp_path / "image.tif", compression=None)
+        image2 = TiffImageReader.read_image(tmp_path / "image.tif", memory_map=True)
+        assert isinstance(image2.get_channel(1), np.memmap)
+        assert np.all(image2.get_channel(1) == image.get_channel(1))
+        assert image2.ranges == image.ranges
+        cut = image2.cut_image([slice(None), slice(1, 3), slice(2, 10), slice(4, 8)], frame=0)
+        assert np.all(cut.get_channel(2) == image.get_channel(2)[:, 1:3, 2:10, 4:8])
+        roi = np.zeros((1, 5, 20, 30), dtype=np.uint8)
+        roi[0, 1:3, 2:10, 4:8] = 1
+        cut = image2.cut_image(roi, frame=0)
+        assert np.all(cut.get_channel(2) == image.get_channel(2)[:, 1:3, 2:10, 4:8])
+        image3 = GenericImageReader.read_image(tmp_path / "image.tif", memory_map=True)
+        assert isinstance(image3.get_channel(0), np.memmap)
+
+    def test_tiff_memory_map_fallback(self, tmp_path):
+        data = np.random.default_rng(0).integers(0, 255, size=(1, 5, 3, 20, 30), dtype=np.uint8)
+        image = Image(data, (1, 1, 1), axes_order="TZCYX")
+        ImageWriter.save(image, tmp_path / "image.tif", compression="ADOBE_DEFLATE")
+        image2 = TiffImageReader.read_image(tmp_path / "image.tif", memory_map=True)
+        assert not isinstance(image2.get_channel(1), np.memmap)
+        assert np.all(image2.get_channel(1) == image.get_channel(1))
+        with open(tmp_path / "image.tif", "rb") as f_p:
+            buffer = BytesIO(f_p.read())
+        image3 = TiffImageReader.read_image(buffer, memory_map=True)
+        assert np.all(image3.get_channel(1) == image.get_channel(1))
+
     def test_obsep_read(self, data_test_dir):
         image = ObsepImageReader.read_image(os.path.join(data_test_dir, "obsep", "test.obsep"))
         assert image.channels == 2